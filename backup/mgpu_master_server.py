@@ -4,16 +4,189 @@ Multi-Node GPU Scheduler - Master Server
 Manages cluster-wide resource allocation and job scheduling
 """
 import os
+import sys
+import pwd
+import asyncio
+import copy
+import functools
+import codecs
+import selectors
 import socket
 import threading
 import subprocess
 import json
+import queue
+import logging
+import logging.handlers
 import time
 import yaml
-from collections import deque
+import heapq
+import numpy as np
+import itertools
 import argparse
-from dataclasses import dataclass, asdict
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import uvloop  # libuv event loop: fewer syscalls per accept/recv/send than the stock selector loop
+except ImportError:
+    uvloop = None
+
+# Shared wire helpers live in the src tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mgpu_core.network.framing import (pack_message, encode_stream, send_frame, recv_frame,
+                                       send_message, read_message)
+
+logger = logging.getLogger('mgpu_master')
+
+KEEPALIVE_IDLE_TIMEOUT = 300  # Seconds an agent's keep-alive connection may sit idle
+JOB_PATH = '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'  # sudo's default secure_path
+
+def setup_logging(level: str = 'INFO') -> logging.handlers.QueueListener:
+    """Route master logs through a queue so hot paths only pay for a put; the listener thread writes them"""
+    log_queue = queue.Queue(-1)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    listener.start()
+    return listener
+
+def gpu_mask(gpu_ids) -> int:
+    """Pack GPU indices into an availability bitmask (bit g set = GPU g free)"""
+    mask = 0
+    for gpu_id in gpu_ids:
+        mask |= 1 << gpu_id
+    return mask
+
+def mask_to_gpus(mask: int) -> List[int]:
+    """Unpack a bitmask into ascending GPU indices"""
+    gpus = []
+    while mask:
+        low = mask & -mask
+        gpus.append(low.bit_length() - 1)
+        mask ^= low
+    return gpus
+
+def popcount(mask: int) -> int:
+    """Number of free GPUs in a mask"""
+    return bin(mask).count('1')
+
+def take_lowest_k(mask: int, k: int):
+    """Claim the k lowest free GPUs; returns (gpu_ids, remaining_mask)"""
+    gpus = []
+    while mask and len(gpus) < k:
+        low = mask & -mask
+        gpus.append(low.bit_length() - 1)
+        mask ^= low
+    return gpus, mask
+
+def claim_lowest_k(mask: int, k: int) -> Tuple[List[int], int]:
+    """Pick the k lowest free GPUs; returns (gpu_ids, claimed_mask)"""
+    gpus, remaining = take_lowest_k(mask, k)
+    return gpus, mask ^ remaining
+
+# Node assignment as returned by find_node_assignment: node_id -> (gpu_ids, claimed_mask)
+Placement = Dict[str, Tuple[List[int], int]]
+
+# An interactive client: (socket, framed, binary), the wire format and codec it sent its request in
+StreamClient = Tuple[socket.socket, bool, bool]
+
+def broadcast_stream(clients: List[StreamClient], message: Dict) -> Set[StreamClient]:
+    """Push one streaming message to every client, encoding it once per wire format; returns the dead clients"""
+    encoded: Dict[Tuple[bool, bool], bytes] = {}
+    dead = set()
+    for client in clients:
+        sock, framed, binary = client
+        try:
+            if (framed, binary) not in encoded:
+                encoded[framed, binary] = encode_stream(message, framed, binary)
+            sock.sendall(encoded[framed, binary])
+        except OSError:
+            dead.add(client)
+    return dead
+
+@functools.lru_cache(maxsize=1024)
+def home_for(user: str) -> str:
+    """Home directory of user, resolved through NSS once per process"""
+    try:
+        return pwd.getpwnam(user).pw_dir
+    except KeyError:
+        return os.path.expanduser(f'~{user}')
+
+@functools.lru_cache(maxsize=1024)
+def user_ids(user: str):
+    """(uid, gid, supplementary groups) of user, resolved once per process"""
+    entry = pwd.getpwnam(user)
+    return entry.pw_uid, entry.pw_gid, tuple(os.getgrouplist(user, entry.pw_gid))
+
+@functools.lru_cache(maxsize=1024)
+def shell_for(user: str) -> str:
+    """Login shell of user, resolved once per process"""
+    try:
+        return pwd.getpwnam(user).pw_shell or '/bin/sh'
+    except KeyError:
+        return '/bin/sh'
+
+def job_environment(user: str, home_dir: str, extra: Dict[str, str]) -> Dict[str, str]:
+    """Environment of a job started without sudo: what sudo's env_reset would leave, plus extra
+    
+    Nothing else is inherited from this process, which runs as root.
+    """
+    env = {'PATH': JOB_PATH, 'HOME': home_dir, 'USER': user, 'LOGNAME': user, 'SHELL': shell_for(user)}
+    if 'LANG' in os.environ:
+        env['LANG'] = os.environ['LANG']
+    env.update(extra)
+    return env
+
+def spawn_as(user: str, cwd: str, env: Dict[str, str], cmd: str, **popen_kwargs) -> subprocess.Popen:
+    """Run cmd through /bin/sh as user in its own session, without sudo or a login shell"""
+    uid, gid, groups = user_ids(user)
+    if os.geteuid() == uid:
+        # Already the target user; dropping privileges needs nothing (and non-root can't setgroups)
+        credentials = {}
+    else:
+        credentials = {'user': uid, 'group': gid, 'extra_groups': list(groups)}
+    return subprocess.Popen(['/bin/sh', '-c', cmd], cwd=cwd, env=env, start_new_session=True,
+                            **credentials, **popen_kwargs)
+
+class NodeRanking:
+    """Per-tick node ranking for assign_best_nodes, kept as NumPy arrays
+    
+    Built once from a cluster resource snapshot and shared by every job in the
+    tick; claims update the arrays in place. Nodes are ranked fill-first:
+    online nodes, then the highest binpack score
+    weight * (requested + used) / total, then node_id.
+    """
+    
+    def __init__(self, cluster_resources: Dict, binpack_weight: float = 1.0):
+        self.node_ids = list(cluster_resources.keys())
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.avail = np.array([popcount(r["available_mask"]) for r in cluster_resources.values()], dtype=np.int32)
+        total = np.array([r.get("total_gpus", r.get("gpu_count", 0)) for r in cluster_resources.values()], dtype=np.int32)
+        self.total = np.maximum(total, np.maximum(self.avail, 1))  # Agents that omit a total still score sanely
+        self.online = np.array([r["online"] for r in cluster_resources.values()], dtype=bool)
+        self.name_rank = np.argsort(np.argsort(np.array(self.node_ids, dtype=object), kind='stable'), kind='stable')
+        self.binpack_weight = binpack_weight
+    
+    def best(self, node_count: int, gpus_per_node: int) -> Optional[List[str]]:
+        """Top node_count nodes with at least gpus_per_node free GPUs"""
+        candidates = np.flatnonzero(self.avail >= gpus_per_node)
+        if len(candidates) < node_count:
+            return None
+        used = self.total[candidates] - self.avail[candidates]
+        score = self.binpack_weight * (gpus_per_node + used) / self.total[candidates]
+        order = np.lexsort((self.name_rank[candidates], -score, ~self.online[candidates]))
+        return [self.node_ids[i] for i in candidates[order[:node_count]]]
+    
+    def claim(self, node_id: str, gpu_count: int):
+        i = self.index.get(node_id)
+        if i is not None:
+            self.avail[i] -= gpu_count
 
 @dataclass
 class Node:
@@ -24,13 +197,25 @@ class Node:
     gpu_count: int
     gpu_type: str = "unknown"
     status: str = "online"  # online, offline, maintenance
-    last_heartbeat: float = 0
-    available_gpus: Optional[List[int]] = None
+    last_heartbeat_ns: int = 0  # time.monotonic_ns(); only meaningful as a delta, never send it as a wall time
+    available_mask: Optional[int] = None  # Bit g set = GPU g free
+    static_view: Dict = field(init=False, repr=False)  # Config fields of status_view, built once
     
     def __post_init__(self):
-        if self.available_gpus is None:
-            self.available_gpus = list(range(self.gpu_count))
-        self.last_heartbeat = time.time()
+        if self.available_mask is None:
+            self.available_mask = (1 << self.gpu_count) - 1
+        self.last_heartbeat_ns = time.monotonic_ns()
+        self.static_view = {'hostname': self.hostname, 'gpu_count': self.gpu_count, 'gpu_type': self.gpu_type}
+    
+    def heartbeat_age(self) -> float:
+        """Seconds since the node last reported in"""
+        return (time.monotonic_ns() - self.last_heartbeat_ns) / 1e9
+    
+    def status_view(self, now: float, now_ns: int) -> Dict:
+        """Node entry of a get_cluster_resources reply, given the request's time.time() and monotonic_ns()"""
+        age = (now_ns - self.last_heartbeat_ns) / 1e9
+        # Ages are computed on the monotonic clock; last_heartbeat is derived for older clients
+        return {**self.static_view, 'status': self.status, 'last_heartbeat_age': age, 'last_heartbeat': now - age}
 
 @dataclass  
 class DistributedJob:
@@ -47,22 +232,293 @@ class DistributedJob:
     master_node: Optional[str] = None
     interactive: bool = False
     client_conn: Optional[socket.socket] = None
+    client_framed: bool = False  # Client spoke length-prefixed frames
+    client_binary: bool = False  # Client's frames were msgpack; its replies use the same codec
+    _dict_cache: Optional[Dict] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        # Any field assignment (status, assignment, ...) invalidates the cached view
+        if name != '_dict_cache':
+            object.__setattr__(self, '_dict_cache', None)
+        object.__setattr__(self, name, value)
     
     def to_dict(self):
-        result = asdict(self)
-        # Remove non-serializable socket object and other problematic fields
-        result.pop('client_conn', None)
-        # Ensure all values are JSON serializable
-        for key, value in result.items():
-            if hasattr(value, '__dict__') and not isinstance(value, (str, int, float, bool, list, dict, type(None))):
-                result[key] = str(value)
-        return result
+        """JSON-serializable view of the job, cached until a field changes; callers must not mutate it"""
+        if self._dict_cache is None:
+            # Socket and transport fields are left out
+            self._dict_cache = {
+                'id': self.id,
+                'user': self.user,
+                'cmd': self.cmd,
+                'node_requirements': self.node_requirements,
+                'total_gpus': self.total_gpus,
+                'assigned_nodes': self.assigned_nodes,
+                'assigned_gpus': self.assigned_gpus,
+                'status': self.status,
+                'priority': self.priority,
+                'distributed_type': self.distributed_type,
+                'master_node': self.master_node,
+                'interactive': self.interactive,
+            }
+        return self._dict_cache
+
+class NodeConnectionPool:
+    """Keep-alive TCP connections to node agents, keyed by node_id"""
+    
+    def __init__(self, nodes: Dict[str, Node], max_idle_per_node: int = 4, timeout: float = 10.0):
+        self.nodes = nodes
+        self.max_idle_per_node = max_idle_per_node
+        self.timeout = timeout
+        self.idle: Dict[str, queue.Queue] = {}
+        self.lock = threading.Lock()
+    
+    def _idle_queue(self, node_id: str) -> queue.Queue:
+        with self.lock:
+            if node_id not in self.idle:
+                self.idle[node_id] = queue.Queue(maxsize=self.max_idle_per_node)
+            return self.idle[node_id]
+    
+    def get(self, node_id: str) -> socket.socket:
+        """Return an idle connection to the node, opening a new one if none is pooled"""
+        try:
+            return self._idle_queue(node_id).get_nowait()
+        except queue.Empty:
+            pass
+        node = self.nodes[node_id]
+        sock = socket.create_connection((node.ip, node.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+    
+    def put(self, node_id: str, sock: socket.socket):
+        """Return a healthy connection to the pool"""
+        try:
+            self._idle_queue(node_id).put_nowait(sock)
+        except queue.Full:
+            sock.close()
+    
+    @contextmanager
+    def lease(self, node_id: str):
+        """Borrow a connection; it is closed instead of returned if the caller fails"""
+        sock = self.get(node_id)
+        try:
+            yield sock
+        except BaseException:
+            sock.close()
+            raise
+        self.put(node_id, sock)
+    
+    def request(self, node_id: str, message: Dict) -> Dict:
+        """Send one framed request to a node agent and return its response"""
+        for attempt in range(2):
+            try:
+                with self.lease(node_id) as sock:
+                    send_frame(sock, message)
+                    response = recv_frame(sock)
+                    if response is None:
+                        raise ConnectionError("Connection closed by node agent")
+                    return response
+            except (ConnectionError, BrokenPipeError):
+                # A pooled connection may have been closed by the agent while idle; retry once on a fresh one
+                if attempt:
+                    raise
+                self.discard(node_id)
+    
+    def discard(self, node_id: str):
+        """Close all idle connections to a node"""
+        idle = self._idle_queue(node_id)
+        while True:
+            try:
+                idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+class InteractiveStream:
+    """State of one interactive job pumped by InteractiveIOLoop"""
+    
+    def __init__(self, job_id: str, proc: subprocess.Popen, client: socket.socket, framed: bool, binary: bool,
+                 on_exit):
+        self.job_id = job_id
+        self.proc = proc
+        self.fd = proc.stdout.fileno()
+        self.client = client
+        self.framed = framed
+        self.binary = binary  # msgpack frames carry raw output bytes, so skip decoding
+        self.on_exit = on_exit
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = ''  # Decoded output not yet terminated by a newline
+        self.outbuf = bytearray()  # Encoded messages not yet accepted by the client socket
+        self.client_alive = True
+        self.eof = False
+        self.completion_queued = False
+
+class InteractiveIOLoop(threading.Thread):
+    """Single selector thread that pumps every interactive job's output to its client
+    
+    Output is read in chunks of up to READ_SIZE bytes. msgpack-framed clients get
+    each chunk as raw bytes; JSON clients get one decoded message per batch of
+    complete lines. Each client has a bounded output buffer; reading
+    from the job pauses while its client is more than MAX_BUFFERED bytes behind.
+    """
+    
+    READ_SIZE = 65536
+    MAX_BUFFERED = 1024 * 1024
+    REAP_INTERVAL = 0.2
+    
+    def __init__(self):
+        super().__init__(daemon=True, name="interactive-io")
+        self.selector = selectors.DefaultSelector()
+        self.incoming = queue.Queue()
+        self.exiting: List[InteractiveStream] = []  # Streams at EOF waiting for the process to exit
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+    
+    def register(self, job_id: str, proc: subprocess.Popen, client: socket.socket, framed: bool, binary: bool,
+                 on_exit):
+        """Hand a started job over to the loop; on_exit(returncode) runs on the loop thread"""
+        os.set_blocking(proc.stdout.fileno(), False)
+        client.setblocking(False)
+        self.incoming.put(InteractiveStream(job_id, proc, client, framed, binary, on_exit))
+        try:
+            os.write(self.wake_w, b'\0')
+        except BlockingIOError:
+            pass  # Loop is already due to wake up
+    
+    def run(self):
+        while True:
+            timeout = self.REAP_INTERVAL if self.exiting else None
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self._accept_incoming()
+                    continue
+                stream, kind = key.data
+                try:
+                    if kind == 'proc':
+                        self._read(stream)
+                    else:
+                        self._flush(stream)
+                except Exception as e:
+                    logger.error(f"Error streaming output for job {stream.job_id}: {e}")
+            self._reap()
+    
+    def _accept_incoming(self):
+        try:
+            while os.read(self.wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                stream = self.incoming.get_nowait()
+            except queue.Empty:
+                break
+            self._update(stream)
+    
+    def _update(self, stream: InteractiveStream):
+        """Register exactly the events this stream currently needs"""
+        want_read = not stream.eof and len(stream.outbuf) < self.MAX_BUFFERED
+        want_write = stream.client_alive and bool(stream.outbuf)
+        for fileobj, wanted, event, kind in ((stream.fd, want_read, selectors.EVENT_READ, 'proc'),
+                                             (stream.client, want_write, selectors.EVENT_WRITE, 'client')):
+            try:
+                self.selector.get_key(fileobj)
+                registered = True
+            except KeyError:
+                registered = False
+            if wanted and not registered:
+                self.selector.register(fileobj, event, (stream, kind))
+            elif registered and not wanted:
+                self.selector.unregister(fileobj)
+    
+    def _emit(self, stream: InteractiveStream, message: Dict):
+        if stream.client_alive:
+            stream.outbuf += encode_stream(message, stream.framed, stream.binary)
+    
+    def _read(self, stream: InteractiveStream):
+        try:
+            data = os.read(stream.fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        if data and stream.binary:
+            # Forward each read as-is; the client decodes
+            self._emit(stream, {'type': 'output', 'data': data})
+            self._flush(stream)
+            return
+        if data:
+            stream.pending += stream.decoder.decode(data)
+            cut = stream.pending.rfind('\n') + 1
+            if not cut and len(stream.pending) >= self.READ_SIZE:
+                cut = len(stream.pending)  # No newline in a full buffer; send it as is
+        else:
+            stream.pending += stream.decoder.decode(b'', final=True)
+            cut = len(stream.pending)
+            stream.eof = True
+            self.exiting.append(stream)
+        if cut:
+            self._emit(stream, {'type': 'output', 'data': stream.pending[:cut]})
+            stream.pending = stream.pending[cut:]
+        self._flush(stream)
+    
+    def _flush(self, stream: InteractiveStream):
+        if stream.client_alive and stream.outbuf:
+            try:
+                sent = stream.client.send(stream.outbuf)
+                del stream.outbuf[:sent]
+            except BlockingIOError:
+                pass
+            except OSError:
+                logger.info(f"Client disconnected from job {stream.job_id}")
+                stream.client_alive = False
+                stream.outbuf.clear()  # Keep draining the job's output, but drop it
+        self._update(stream)
+    
+    def _reap(self):
+        for stream in list(self.exiting):
+            if stream.proc.poll() is None:
+                continue
+            if not stream.completion_queued:
+                stream.completion_queued = True
+                self._emit(stream, {
+                    'type': 'completion',
+                    'job_id': stream.job_id,
+                    'exit_code': stream.proc.returncode
+                })
+                self._flush(stream)
+            if stream.client_alive and stream.outbuf:
+                continue  # Let the client drain first
+            self.exiting.remove(stream)
+            self._update(stream)
+            stream.proc.stdout.close()
+            try:
+                stream.client.close()
+            except OSError:
+                pass
+            try:
+                stream.on_exit(stream.proc.returncode)
+            except Exception as e:
+                logger.error(f"Exit handler failed for job {stream.job_id}: {e}")
 
 class ClusterResourceManager:
     """Cluster resource management"""
     
     def __init__(self, config_path: str):
         self.nodes: Dict[str, Node] = {}
+        self.status_lock = threading.Lock()  # Guards node.status and the online/offline partition
+        self.online_nodes: Set[str] = set()
+        self.offline_nodes: Set[str] = set()
+        self.pool = NodeConnectionPool(self.nodes)
+        # Cluster state cache: remote node resources kept fresh by watcher threads
+        self.resource_cache: Dict[str, Dict] = {}
+        # node_id -> {job_id: [claimed GPU mask, clock tick when the agent answered start_job, or None]}
+        self.claims: Dict[str, Dict[str, list]] = {}
+        self.clock = itertools.count()  # Orders claim confirmations against poll starts
+        self.cache_lock = threading.Lock()
+        self.watch_interval = 1.0
+        self.reconcile_interval = 60.0
+        self.on_update: Optional[Callable[[], None]] = None  # Called when a node's free GPUs change
+        self.binpack_weight = 1.0
+        self.log_level = 'INFO'
         self.load_config(config_path)
         
     def load_config(self, config_path: str):
@@ -73,28 +529,66 @@ class ClusterResourceManager:
         for node_config in config['nodes']:
             node = Node(**node_config)
             self.nodes[node.node_id] = node
+            self.online_nodes.add(node.node_id)  # Node.status starts "online"
+        
+        binpack = (config.get('scheduling') or {}).get('binpack') or {}
+        self.binpack_weight = float(binpack.get('weight', 1.0))
+        self.log_level = (config.get('logging') or {}).get('level', 'INFO')
+    
+    def mark_online(self, node_id: str) -> bool:
+        """Set a node online; returns True if it was offline before"""
+        with self.status_lock:
+            node = self.nodes[node_id]
+            flipped = node.status != "online"
+            node.status = "online"
+            self.offline_nodes.discard(node_id)
+            self.online_nodes.add(node_id)
+            return flipped
+    
+    def mark_offline(self, node_id: str) -> bool:
+        """Set a node offline; returns True if it was online before"""
+        with self.status_lock:
+            node = self.nodes[node_id]
+            flipped = node.status == "online"
+            node.status = "offline"
+            self.online_nodes.discard(node_id)
+            self.offline_nodes.add(node_id)
+            return flipped
+    
+    def _probe_node(self, node: Node) -> Optional[Exception]:
+        """Open and immediately close a TCP connection to a node agent"""
+        try:
+            # Create temporary socket for connection test
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(5)  # 5 second timeout
+            sock.connect((node.ip, node.port))
+            sock.close()  # Close connection immediately
+            return None
+        except Exception as e:
+            return e
     
     def connect_to_nodes(self):
         """Check connection status of all nodes"""
         available_count = 0
-        for node_id, node in self.nodes.items():
-            try:
-                # Create temporary socket for connection test
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)  # 5 second timeout
-                sock.connect((node.ip, node.port))
-                sock.close()  # Close connection immediately
-                
-                node.status = "online"
-                available_count += 1
-                print(f"[INFO] Node {node_id} ({node.hostname}) is available")
-            except Exception as e:
-                print(f"[WARNING] Node {node_id} is not available: {e}")
-                print(f"[INFO] Node {node_id} will be managed locally (single-node mode)")
-                node.status = "offline"
+        nodes = list(self.nodes.items())
+        if nodes:
+            # Probe all nodes concurrently so offline nodes cost one timeout in total, not one each
+            with ThreadPoolExecutor(max_workers=min(64, len(nodes))) as executor:
+                futures = {executor.submit(self._probe_node, node): (node_id, node) for node_id, node in nodes}
+                for future in as_completed(futures):
+                    node_id, node = futures[future]
+                    error = future.result()
+                    if error is None:
+                        self.mark_online(node_id)
+                        available_count += 1
+                        logger.info(f"Node {node_id} ({node.hostname}) is available")
+                    else:
+                        logger.warning(f"Node {node_id} is not available: {error}")
+                        logger.info(f"Node {node_id} will be managed locally (single-node mode)")
+                        self.mark_offline(node_id)
         
         if available_count == 0:
-            print(f"[WARNING] No nodes available. Master server will run in standalone mode.")
+            logger.warning("No nodes available. Master server will run in standalone mode.")
             # Create localhost node for standalone mode with multiple virtual GPUs
             localhost_node = Node(
                 node_id="localhost",
@@ -104,42 +598,131 @@ class ClusterResourceManager:
                 gpu_count=4,  # Increased to 4 GPUs for testing
                 gpu_type="virtual"
             )
-            localhost_node.status = "online"
             self.nodes["localhost"] = localhost_node
-            print(f"[INFO] Created virtual localhost node with {localhost_node.gpu_count} GPUs for standalone mode")
+            self.mark_online("localhost")
+            logger.info(f"Created virtual localhost node with {localhost_node.gpu_count} GPUs for standalone mode")
         else:
-            print(f"[INFO] Found {available_count}/{len(self.nodes)} available nodes")
+            logger.info(f"Found {available_count}/{len(self.nodes)} available nodes")
+    
+    def _remote_node_ids(self) -> List[str]:
+        """Nodes backed by a real node agent"""
+        return [node_id for node_id in self.nodes if node_id != "localhost"]
+    
+    def refresh_node(self, node_id: str) -> bool:
+        """Query one node agent and store the result in the cache"""
+        with self.cache_lock:
+            started = next(self.clock)
+        node = self.nodes[node_id]
+        try:
+            resources = self.query_node_resources(node_id)
+        except Exception as e:
+            was_online = self.mark_offline(node_id)
+            with self.cache_lock:
+                self.resource_cache.pop(node_id, None)
+            if was_online:
+                logger.warning(f"Failed to get resources from {node_id}: {e}")
+                logger.debug(f"Node {node_id} config: {node.ip}:{node.port}")
+                logger.debug("Node communication failed, marking node offline")
+            return False
+        
+        resources['available_mask'] = gpu_mask(resources.pop('available_gpus', []))
+        changed = False
+        with self.cache_lock:
+            # GPUs handed out but not yet known to be in this report stay taken
+            claims = self.claims.get(node_id, {})
+            for job_id, (mask, confirmed) in list(claims.items()):
+                if confirmed is not None and confirmed < started:
+                    del claims[job_id]  # Polled after the agent allocated them; the report covers it
+                else:
+                    resources['available_mask'] &= ~mask
+            previous = self.resource_cache.get(node_id)
+            changed = previous is None or previous.get('available_mask') != resources['available_mask']
+            self.resource_cache[node_id] = resources
+        if self.mark_online(node_id):
+            logger.info(f"Node {node_id} is back online")
+        node.last_heartbeat_ns = time.monotonic_ns()
+        if changed and self.on_update:
+            self.on_update()
+        return True
+    
+    def reconcile(self):
+        """Refresh every remote node, including offline ones, to heal missed updates"""
+        node_ids = self._remote_node_ids()
+        if not node_ids:
+            return
+        with ThreadPoolExecutor(max_workers=min(64, len(node_ids))) as executor:
+            list(executor.map(self.refresh_node, node_ids))
+    
+    def _watch_node(self, node_id: str):
+        """Keep the cached resources of one online node fresh"""
+        while True:
+            if node_id in self.online_nodes:
+                self.refresh_node(node_id)
+            time.sleep(self.watch_interval)
+    
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Cluster state reconcile failed: {e}")
+    
+    def start_watchers(self):
+        """Fill the cluster state cache and start the per-node watcher and reconciler threads"""
+        self.reconcile()
+        for node_id in self._remote_node_ids():
+            threading.Thread(target=self._watch_node, args=(node_id,), daemon=True).start()
+        threading.Thread(target=self._reconcile_loop, daemon=True).start()
+    
+    def claim_gpus(self, node_id: str, gpu_ids: List[int], job_id: str):
+        """Remove GPUs handed to a job from the cached view, and from every poll until confirm_claim"""
+        if node_id == "localhost":
+            return  # Virtual node; never polled
+        mask = gpu_mask(gpu_ids)
+        with self.cache_lock:
+            self.claims.setdefault(node_id, {})[job_id] = [mask, None]
+            cached = self.resource_cache.get(node_id)
+            if cached:
+                cached["available_mask"] = cached.get("available_mask", 0) & ~mask
+    
+    def confirm_claim(self, node_id: str, job_id: str):
+        """The node has answered start_job for job_id; a poll started after this reflects it"""
+        with self.cache_lock:
+            claim = self.claims.get(node_id, {}).get(job_id)
+            if claim is not None:
+                claim[1] = next(self.clock)
     
     def get_cluster_resources(self) -> Dict:
-        """Query cluster-wide resources"""
-        cluster_resources = {}
-        for node_id, node in self.nodes.items():
-            if node.status == "online":
-                try:
-                    # Return virtual resources for localhost node without actual query
-                    if node_id == "localhost":
-                        cluster_resources[node_id] = {
-                            "available_gpus": list(range(node.gpu_count)),
-                            "total_gpus": node.gpu_count,
-                            "gpu_type": node.gpu_type
-                        }
-                    else:
-                        resources = self.query_node_resources(node_id)
-                        cluster_resources[node_id] = resources
-                except Exception as e:
-                    print(f"[WARNING] Failed to get resources from {node_id}: {e}")
-                    print(f"[DEBUG] Node {node_id} config: {node.ip}:{node.port}")
-                    print(f"[DEBUG] Node communication failed, checking if node is offline")
-                    node.status = "offline"
-            else:
-                # Provide default resource info for offline nodes
-                print(f"[INFO] Node {node_id} is offline, using default resource info")
-                cluster_resources[node_id] = {
-                    "available_gpus": list(range(node.gpu_count)),
-                    "total_gpus": node.gpu_count,
-                    "gpu_type": node.gpu_type,
-                    "status": "offline"
-                }
+        """Snapshot of cluster-wide resources from the cache (no network I/O)"""
+        with self.cache_lock:
+            cluster_resources = copy.deepcopy(self.resource_cache)
+        with self.status_lock:
+            localhost_online = "localhost" in self.online_nodes
+            offline_nodes = list(self.offline_nodes)
+        for resources in cluster_resources.values():
+            resources["online"] = True
+        
+        # Return virtual resources for localhost node without actual query
+        if localhost_online:
+            node = self.nodes["localhost"]
+            cluster_resources["localhost"] = {
+                "available_mask": (1 << node.gpu_count) - 1,
+                "total_gpus": node.gpu_count,
+                "gpu_type": node.gpu_type,
+                "online": True
+            }
+        
+        # Provide default resource info for offline nodes
+        for node_id in offline_nodes:
+            node = self.nodes[node_id]
+            cluster_resources[node_id] = {
+                "available_mask": (1 << node.gpu_count) - 1,
+                "total_gpus": node.gpu_count,
+                "gpu_type": node.gpu_type,
+                "status": "offline",
+                "online": False
+            }
         return cluster_resources
     
     def query_node_resources(self, node_id: str) -> Dict:
@@ -147,24 +730,8 @@ class ClusterResourceManager:
         if node_id not in self.nodes:
             raise Exception(f"Unknown node {node_id}")
         
-        node = self.nodes[node_id]
-        response_data = ""
-        sock = None
-        
         try:
-            # Create new connection (same as heartbeat method)
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5.0)
-            sock.connect((node.ip, node.port))
-            
-            request = {"cmd": "get_resources"}
-            sock.send(json.dumps(request).encode())
-            
-            response_data = sock.recv(4096).decode()
-            if not response_data.strip():
-                raise Exception("Empty response from node agent")
-            
-            response = json.loads(response_data)
+            response = self.pool.request(node_id, {"cmd": "get_resources"})
             
             # Extract actual resource information from response
             if response.get('status') == 'ok' and 'resources' in response:
@@ -178,37 +745,70 @@ class ClusterResourceManager:
         except socket.timeout:
             raise Exception(f"Timeout waiting for response from node agent")
         except json.JSONDecodeError as e:
-            raise Exception(f"Invalid JSON response from node agent: {response_data[:100]}... - {e}")
+            raise Exception(f"Invalid JSON response from node agent: {e}")
         except Exception as e:
             raise Exception(f"Communication error with node agent: {e}")
-        finally:
-            if sock:
-                try:
-                    sock.close()
-                except:
-                    pass
 
 class MultiNodeScheduler:
     """Multi-node scheduler"""
     
     def __init__(self, resource_manager: ClusterResourceManager):
         self.resource_manager = resource_manager
-        self.job_queue = deque()
+        # Priority heap of (-priority, seq, job); entries whose job is no longer in
+        # jobs_by_id are tombstones left by cancel and skipped lazily
+        self.job_queue: List[tuple] = []
+        self.jobs_by_id: Dict[str, DistributedJob] = {}  # Queued jobs only
+        self.seq = itertools.count()
         self.running_jobs: Dict[str, DistributedJob] = {}
-        self.lock = threading.Lock()
-        self.interactive_clients = {}  # job_id -> list of client sockets
+        self.lock = threading.RLock()  # Re-entrant: notify_scheduler takes it (via wakeup) inside locked sections
+        self.wakeup = threading.Condition(self.lock)  # Signalled when a scheduling tick may make progress
+        self.schedule_pending = False
+        self.interactive_clients = {}  # job_id -> list of (client socket, framed, binary)
+        self.io_loop = InteractiveIOLoop()  # Pumps output of local interactive jobs
+        self.io_loop.start()
+        resource_manager.on_update = self.notify_scheduler
     
     def submit_job(self, job: DistributedJob) -> str:
         """Submit job"""
         with self.lock:
-            self.job_queue.append(job)
+            heapq.heappush(self.job_queue, (-job.priority, next(self.seq), job))
+            self.jobs_by_id[job.id] = job
+            self.notify_scheduler()
             return job.id
     
+    def notify_scheduler(self):
+        """Request a scheduling tick now (new job, freed GPUs, node state change)"""
+        with self.wakeup:
+            self.schedule_pending = True
+            self.wakeup.notify()
+    
+    def wait_for_work(self, timeout: float):
+        """Block until notify_scheduler is called or timeout elapses"""
+        with self.wakeup:
+            if not self.schedule_pending:
+                self.wakeup.wait(timeout)
+            self.schedule_pending = False
+    
+    def _is_queued(self, job: DistributedJob) -> bool:
+        return self.jobs_by_id.get(job.id) is job
+    
+    def _queued_jobs(self) -> List[DistributedJob]:
+        """Live queued jobs in scheduling order (highest priority, then oldest); caller holds self.lock"""
+        return [job for _, _, job in sorted(self.job_queue) if self._is_queued(job)]
+    
+    def _prune_queue(self):
+        """Drop tombstones from the heap top, and rebuild once they outnumber live entries"""
+        while self.job_queue and not self._is_queued(self.job_queue[0][2]):
+            heapq.heappop(self.job_queue)
+        if len(self.job_queue) > 2 * len(self.jobs_by_id) + 64:
+            self.job_queue = [entry for entry in self.job_queue if self._is_queued(entry[2])]
+            heapq.heapify(self.job_queue)
+    
     def get_queue_status(self) -> Dict:
         """Get queue status without blocking - thread-safe snapshot"""
         # Take a quick snapshot to avoid blocking
         with self.lock:
-            queued_jobs = [job.to_dict() for job in list(self.job_queue)]
+            queued_jobs = [job.to_dict() for job in self._queued_jobs()]
             running_jobs = [job.to_dict() for job in list(self.running_jobs.values())]
             node_status = {node_id: node.status for node_id, node in self.resource_manager.nodes.items()}
         
@@ -220,76 +820,110 @@ class MultiNodeScheduler:
         }
     
     def try_schedule_jobs(self):
-        """Try to schedule jobs"""
+        """Try to schedule jobs
+        
+        The scheduler lock is only held to snapshot the queue and to commit the
+        chosen assignments; placement and job dispatch run without it.
+        """
+        # Phase 1: snapshot the queue
         with self.lock:
-            if not self.job_queue:
-                return  # No jobs to schedule
+            jobs_snapshot = self._queued_jobs()
+        if not jobs_snapshot:
+            return  # No jobs to schedule
+        
+        # Phase 2: compute assignments lock-free against a cluster state snapshot
+        cluster_resources = self.resource_manager.get_cluster_resources()
+        logger.debug(f"Attempting to schedule {len(jobs_snapshot)} jobs")
+        logger.debug(f"Available cluster resources: {cluster_resources}")
+        
+        ranking = NodeRanking(cluster_resources, self.resource_manager.binpack_weight)
+        assignments = []
+        for job in jobs_snapshot:
+            logger.debug(f"Trying to schedule job {job.id} with requirements: {job.node_requirements}")
+            placement = self.find_node_assignment(job, cluster_resources, ranking)
             
-            print(f"[DEBUG] Attempting to schedule {len(self.job_queue)} jobs")
-            cluster_resources = self.resource_manager.get_cluster_resources()
-            print(f"[DEBUG] Available cluster resources: {cluster_resources}")
+            if not placement:
+                logger.debug(f"No suitable assignment found for job {job.id}")
+                break  # Wait for resources to become available
             
-            for job in list(self.job_queue):
-                print(f"[DEBUG] Trying to schedule job {job.id} with requirements: {job.node_requirements}")
-                assignment = self.find_node_assignment(job, cluster_resources)
-                
-                if assignment:
-                    print(f"[DEBUG] Found assignment for job {job.id}: {assignment}")
-                    self.start_distributed_job(job, assignment)
-                    self.job_queue.remove(job)
-                    self.running_jobs[job.id] = job
-                    
-                    # Update cluster resources after assignment
-                    for node_id, gpu_ids in assignment.items():
-                        if node_id in cluster_resources:
-                            available_gpus = cluster_resources[node_id]["available_gpus"]
-                            for gpu_id in gpu_ids:
-                                if gpu_id in available_gpus:
-                                    available_gpus.remove(gpu_id)
-                    print(f"[INFO] Successfully scheduled job {job.id}")
-                else:
-                    print(f"[DEBUG] No suitable assignment found for job {job.id}")
-                    break  # Wait for resources to become available
+            assignment = {node_id: gpu_ids for node_id, (gpu_ids, _) in placement.items()}
+            logger.debug(f"Found assignment for job {job.id}: {assignment}")
+            assignments.append((job, assignment))
+            
+            # Update cluster resources after assignment
+            for node_id, (gpu_ids, claimed_mask) in placement.items():
+                if node_id in cluster_resources:
+                    cluster_resources[node_id]["available_mask"] &= ~claimed_mask
+                    ranking.claim(node_id, len(gpu_ids))
+        
+        # Phase 3: commit state transitions for jobs that are still queued
+        to_dispatch = []
+        with self.lock:
+            for job, assignment in assignments:
+                if not self._is_queued(job):
+                    continue  # Cancelled while we were computing
+                del self.jobs_by_id[job.id]
+                self.running_jobs[job.id] = job
+                job.assigned_nodes = list(assignment.keys())
+                job.assigned_gpus = assignment
+                job.status = "running"
+                for node_id, gpu_ids in assignment.items():
+                    self.resource_manager.claim_gpus(node_id, gpu_ids, job.id)
+                to_dispatch.append((job, assignment))
+            self._prune_queue()
+        
+        # Phase 4: dispatch outside the lock so node RPCs never block submit/status/cancel
+        for job, assignment in to_dispatch:
+            if job.status == "cancelled":
+                for node_id in assignment:
+                    self.resource_manager.confirm_claim(node_id, job.id)  # Never sent; nothing to wait for
+                continue
+            threading.Thread(target=self.start_distributed_job, args=(job, assignment), daemon=True).start()
+            logger.info(f"Successfully scheduled job {job.id}")
     
-    def find_node_assignment(self, job: DistributedJob, cluster_resources: Dict) -> Optional[Dict]:
-        """Find suitable node combination for job"""
+    def find_node_assignment(self, job: DistributedJob, cluster_resources: Dict,
+                             ranking: Optional[NodeRanking] = None) -> Optional[Placement]:
+        """Find suitable node combination for job, with the GPU mask claimed on each node"""
         requirements = job.node_requirements
         # If user specified exact GPUs per node, honor that mapping
         if 'node_gpu_ids' in requirements:
             mapping = requirements['node_gpu_ids']
-            print(f"[DEBUG] Processing node_gpu_ids mapping: {mapping}")
+            logger.debug(f"Processing node_gpu_ids mapping: {mapping}")
             
             # Verify nodes and GPU availability
+            placement = {}
             for node_id, gpu_ids in mapping.items():
-                print(f"[DEBUG] Checking node {node_id} with requested GPUs {gpu_ids}")
+                logger.debug(f"Checking node {node_id} with requested GPUs {gpu_ids}")
                 
                 if node_id not in cluster_resources:
-                    print(f"[ERROR] Node {node_id} not found in cluster resources. Available nodes: {list(cluster_resources.keys())}")
+                    logger.error(f"Node {node_id} not found in cluster resources. Available nodes: {list(cluster_resources.keys())}")
                     return None
                 
-                available = cluster_resources[node_id]['available_gpus']
-                print(f"[DEBUG] Available GPUs on {node_id}: {available}")
+                available_mask = cluster_resources[node_id]['available_mask']
+                logger.debug(f"Available GPUs on {node_id}: {mask_to_gpus(available_mask)}")
                 
-                for g in gpu_ids:
-                    if g not in available:
-                        print(f"[ERROR] GPU {g} not available on node {node_id}. Available GPUs: {available}")
-                        return None
+                required = gpu_mask(gpu_ids)
+                if (available_mask & required) != required:
+                    missing = [g for g in gpu_ids if not (available_mask >> g) & 1]
+                    logger.error(f"GPUs {missing} not available on node {node_id}. Available GPUs: {mask_to_gpus(available_mask)}")
+                    return None
                 
-                print(f"[DEBUG] Node {node_id} has all requested GPUs available")
+                logger.debug(f"Node {node_id} has all requested GPUs available")
+                placement[node_id] = (gpu_ids, required)
             
-            print(f"[INFO] All nodes and GPUs are available for job {job.id}, returning mapping: {mapping}")
-            return mapping
+            logger.info(f"All nodes and GPUs are available for job {job.id}, returning mapping: {mapping}")
+            return placement
         if "nodelist" in requirements:
             # When specific nodes are specified
             return self.assign_specific_nodes(job, requirements["nodelist"], cluster_resources)
         elif "nodes" in requirements:
             # When only node count is specified
-            return self.assign_best_nodes(job, requirements["nodes"], requirements.get("gpus_per_node", 1), cluster_resources)
+            return self.assign_best_nodes(job, requirements["nodes"], requirements.get("gpus_per_node", 1), cluster_resources, ranking)
         else:
             # Execute on single node
             return self.assign_single_node(job, cluster_resources)
     
-    def assign_specific_nodes(self, job: DistributedJob, nodelist: List[str], cluster_resources: Dict) -> Optional[Dict]:
+    def assign_specific_nodes(self, job: DistributedJob, nodelist: List[str], cluster_resources: Dict) -> Optional[Placement]:
         """Try to assign to specified nodes"""
         assignment = {}
         required_gpus_per_node = job.node_requirements.get("gpus_per_node", 1)
@@ -298,67 +932,59 @@ class MultiNodeScheduler:
             if node_id not in cluster_resources:
                 return None  # Node is offline or doesn't exist
             
-            available = cluster_resources[node_id]["available_gpus"]
-            if len(available) < required_gpus_per_node:
+            available_mask = cluster_resources[node_id]["available_mask"]
+            if popcount(available_mask) < required_gpus_per_node:
                 return None  # Insufficient GPUs
             
-            assignment[node_id] = available[:required_gpus_per_node]
+            assignment[node_id] = claim_lowest_k(available_mask, required_gpus_per_node)
         
         return assignment
     
-    def assign_best_nodes(self, job: DistributedJob, node_count: int, gpus_per_node: int, cluster_resources: Dict) -> Optional[Dict]:
+    def assign_best_nodes(self, job: DistributedJob, node_count: int, gpus_per_node: int, cluster_resources: Dict,
+                          ranking: Optional[NodeRanking] = None) -> Optional[Placement]:
         """Find optimal node combination"""
-        # Sort available nodes by GPU count, prioritizing online nodes
-        available_nodes = []
-        for node_id, resources in cluster_resources.items():
-            available_gpus = len(resources["available_gpus"])
-            if available_gpus >= gpus_per_node:
-                # Prioritize online nodes by giving them higher priority
-                priority = 1000 if resources.get("status") != "offline" else 0
-                available_nodes.append((node_id, available_gpus, priority))
+        # Rank online nodes first, then by binpack score (fill-first policy)
+        if ranking is None:
+            ranking = NodeRanking(cluster_resources, self.resource_manager.binpack_weight)
         
-        # Sort by priority first (online vs offline), then by GPU count (fill-first policy)
-        available_nodes.sort(key=lambda x: (x[2], x[1]), reverse=True)
-        
-        if len(available_nodes) < node_count:
+        best_nodes = ranking.best(node_count, gpus_per_node)
+        if best_nodes is None:
             return None  # Insufficient available nodes
         
         assignment = {}
-        for i in range(node_count):
-            node_id = available_nodes[i][0]
-            available = cluster_resources[node_id]["available_gpus"]
-            assignment[node_id] = available[:gpus_per_node]
+        for node_id in best_nodes:
+            assignment[node_id] = claim_lowest_k(cluster_resources[node_id]["available_mask"], gpus_per_node)
         
         return assignment
     
-    def assign_single_node(self, job: DistributedJob, cluster_resources: Dict) -> Optional[Dict]:
+    def assign_single_node(self, job: DistributedJob, cluster_resources: Dict) -> Optional[Placement]:
         """Assign to single node"""
         required_gpus = job.total_gpus
         
         # For cases when no nodes are available in cluster (test environment, etc.)
         if not cluster_resources:
-            print(f"Warning: No nodes available in cluster, creating mock assignment for job {job.id}")
-            return {"localhost": list(range(required_gpus))}
+            logger.warning(f"No nodes available in cluster, creating mock assignment for job {job.id}")
+            return {"localhost": (list(range(required_gpus)), (1 << required_gpus) - 1)}
         
         # Prioritize online nodes first, then offline nodes
         online_nodes = []
         offline_nodes = []
         
         for node_id, resources in cluster_resources.items():
-            available = resources["available_gpus"]
-            if len(available) >= required_gpus:
-                if resources.get("status") == "offline":
-                    offline_nodes.append((node_id, available))
+            available_mask = resources["available_mask"]
+            if popcount(available_mask) >= required_gpus:
+                if not resources["online"]:
+                    offline_nodes.append((node_id, available_mask))
                 else:
-                    online_nodes.append((node_id, available))
+                    online_nodes.append((node_id, available_mask))
         
         # Try online nodes first
-        for node_id, available in online_nodes:
-            return {node_id: available[:required_gpus]}
+        for node_id, available_mask in online_nodes:
+            return {node_id: claim_lowest_k(available_mask, required_gpus)}
         
         # If no online nodes available, try offline nodes (but this shouldn't happen for localhost)
-        for node_id, available in offline_nodes:
-            return {node_id: available[:required_gpus]}
+        for node_id, available_mask in offline_nodes:
+            return {node_id: claim_lowest_k(available_mask, required_gpus)}
         
         return None
     
@@ -368,87 +994,68 @@ class MultiNodeScheduler:
         job.assigned_gpus = assignment
         job.status = "running"
         
-        if len(assignment) == 1:
-            # Single node execution
-            node_id = list(assignment.keys())[0]
-            self.start_single_node_job(job, node_id, assignment[node_id])
-        else:
-            # Multi-node execution
-            job.master_node = list(assignment.keys())[0]  # First node becomes master
-            self.start_multi_node_job(job, assignment)
+        try:
+            if len(assignment) == 1:
+                # Single node execution
+                node_id = list(assignment.keys())[0]
+                self.start_single_node_job(job, node_id, assignment[node_id])
+            else:
+                # Multi-node execution
+                job.master_node = list(assignment.keys())[0]  # First node becomes master
+                self.start_multi_node_job(job, assignment)
+        finally:
+            # Started or refused, the agents now report these GPUs themselves
+            for node_id in assignment:
+                self.resource_manager.confirm_claim(node_id, job.id)
     
     def start_single_node_job(self, job: DistributedJob, node_id: str, gpu_ids: List[int]):
         """Execute job on single node"""
         try:
             # For localhost node, execute directly on local GPUs
             if node_id == "localhost":
-                print(f"[INFO] Starting local job {job.id} on localhost with GPUs {gpu_ids}")
-                print(f"[INFO] Command: {job.cmd}")
+                logger.info(f"Starting local job {job.id} on localhost with GPUs {gpu_ids}")
+                logger.info(f"Command: {job.cmd}")
                 
                 # Set CUDA_VISIBLE_DEVICES for GPU assignment
-                cuda_env = f"CUDA_VISIBLE_DEVICES={','.join(map(str, gpu_ids))}"
-                home_dir = os.path.expanduser(f'~{job.user}')
+                home_dir = home_for(job.user)
+                job_env = job_environment(job.user, home_dir, {
+                    'CUDA_VISIBLE_DEVICES': ','.join(map(str, gpu_ids)),
+                    'PYTHONUNBUFFERED': '1'
+                })
                 
-                # Use the user's shell with proper environment
-                full_command = f"cd {home_dir} && export {cuda_env} && export PYTHONUNBUFFERED=1 && {job.cmd}"
+                # Completion bookkeeping, shared by the interactive and batch paths
+                def finish_local_job(returncode: int):
+                    logger.info(f"Local job {job.id} completed with exit code {returncode}")
+                    
+                    # Remove from running jobs
+                    with self.lock:
+                        if job.id in self.running_jobs:
+                            del self.running_jobs[job.id]
+                    self.notify_scheduler()  # Its GPUs are free again
                 
                 # Execute job locally
                 def execute_local_job():
                     try:
-                        proc = subprocess.Popen([
-                            'sudo', '-u', job.user, 'bash', '-lc', full_command
-                        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                        universal_newlines=True, preexec_fn=os.setsid)
+                        interactive = bool(job.interactive and job.client_conn)
+                        # Batch output is never read, so don't give it a pipe that can fill up and stall the job
+                        proc = spawn_as(job.user, home_dir, job_env, job.cmd,
+                                        stdout=subprocess.PIPE if interactive else subprocess.DEVNULL,
+                                        stderr=subprocess.STDOUT)
                         
-                        print(f"[INFO] Started local job {job.id} with PID {proc.pid}")
+                        logger.info(f"Started local job {job.id} with PID {proc.pid}")
                         
-                        # Handle interactive output streaming
-                        if job.interactive and job.client_conn and proc.stdout:
-                            try:
-                                # Stream output to client
-                                while True:
-                                    output = proc.stdout.readline()
-                                    if output == '' and proc.poll() is not None:
-                                        break
-                                    if output:
-                                        output_msg = {
-                                            'type': 'output',
-                                            'data': output
-                                        }
-                                        try:
-                                            job.client_conn.send((json.dumps(output_msg) + '\n').encode())
-                                        except (BrokenPipeError, ConnectionResetError):
-                                            print(f"[INFO] Client disconnected from job {job.id}")
-                                            break
-                                
-                                # Wait for completion and send completion message
-                                proc.wait()
-                                completion_msg = {
-                                    'type': 'completion',
-                                    'job_id': job.id,
-                                    'exit_code': proc.returncode
-                                }
-                                try:
-                                    job.client_conn.send((json.dumps(completion_msg) + '\n').encode())
-                                    job.client_conn.close()
-                                except (BrokenPipeError, ConnectionResetError):
-                                    pass
-                                    
-                            except Exception as e:
-                                print(f"[ERROR] Error streaming output for job {job.id}: {e}")
-                        else:
-                            # Non-interactive mode, just wait for completion
-                            proc.wait()
-                        
-                        print(f"[INFO] Local job {job.id} completed with exit code {proc.returncode}")
+                        if interactive:
+                            # Output streaming and completion are handled by the shared I/O loop
+                            self.io_loop.register(job.id, proc, job.client_conn, job.client_framed, job.client_binary,
+                                                  finish_local_job)
+                            return
                         
-                        # Remove from running jobs
-                        with self.lock:
-                            if job.id in self.running_jobs:
-                                del self.running_jobs[job.id]
+                        # Non-interactive mode, just wait for completion
+                        proc.wait()
+                        finish_local_job(proc.returncode)
                                 
                     except Exception as e:
-                        print(f"[ERROR] Error executing local job {job.id}: {e}")
+                        logger.error(f"Error executing local job {job.id}: {e}")
                         job.status = "failed"
                 
                 # Start job in background thread
@@ -458,15 +1065,10 @@ class MultiNodeScheduler:
             # For remote nodes, send via network
             node = self.resource_manager.nodes.get(node_id)
             if not node or node.status != "online":
-                print(f"[WARNING] Node {node_id} is not available")
+                logger.warning(f"Node {node_id} is not available")
                 job.status = "failed"
                 return
                 
-            # Create individual connection
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(10.0)
-            sock.connect((node.ip, node.port))
-            
             request = {
                 "cmd": "start_job",
                 "job_id": job.id,
@@ -475,134 +1077,109 @@ class MultiNodeScheduler:
                 "gpu_ids": gpu_ids,
                 "distributed": False
             }
-            sock.send(json.dumps(request).encode())
-            
-            # Receive response
-            response_data = sock.recv(4096).decode()
-            response = json.loads(response_data)
+            response = self.resource_manager.pool.request(node_id, request)
             
             if response.get('status') == 'ok':
-                print(f"[INFO] Started job {job.id} on node {node_id}")
+                logger.info(f"Started job {job.id} on node {node_id}")
             else:
-                print(f"[ERROR] Failed to start job {job.id} on node {node_id}: {response.get('message', 'Unknown error')}")
+                logger.error(f"Failed to start job {job.id} on node {node_id}: {response.get('message', 'Unknown error')}")
                 job.status = "failed"
-                
-            sock.close()
             
         except Exception as e:
-            print(f"[ERROR] Failed to start job {job.id} on node {node_id}: {e}")
+            logger.error(f"Failed to start job {job.id} on node {node_id}: {e}")
             job.status = "failed"
     
     def start_multi_node_job(self, job: DistributedJob, assignment: Dict):
         """Execute distributed job on multiple nodes"""
+        # Everything but the rank and its GPUs is the same for every node
+        job_request = {
+            "cmd": "start_distributed_job",
+            "job_id": job.id,
+            "user": job.user,
+            "command": job.cmd,
+            "distributed": True,
+            "distributed_type": job.distributed_type,
+            "world_size": len(assignment),
+            "master_node": job.master_node,
+            "node_list": list(assignment)
+        }
         # Send distributed execution information to each node
         for rank, (node_id, gpu_ids) in enumerate(assignment.items()):
             try:
                 # For localhost node
                 if node_id == "localhost":
-                    print(f"[INFO] Started distributed job {job.id} rank {rank} on localhost with GPUs {gpu_ids}")
+                    logger.info(f"Started distributed job {job.id} rank {rank} on localhost with GPUs {gpu_ids}")
                     continue
                 
                 # For remote nodes
                 node = self.resource_manager.nodes.get(node_id)
                 if not node or node.status != "online":
-                    print(f"[WARNING] Node {node_id} is not available, skipping rank {rank}")
+                    logger.warning(f"Node {node_id} is not available, skipping rank {rank}")
                     continue
                     
-                # Create individual connection
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(10.0)
-                sock.connect((node.ip, node.port))
-                
-                request = {
-                    "cmd": "start_distributed_job",
-                    "job_id": job.id,
-                    "user": job.user,
-                    "command": job.cmd,
-                    "gpu_ids": gpu_ids,
-                    "distributed": True,
-                    "distributed_type": job.distributed_type,
-                    "rank": rank,
-                    "world_size": len(assignment),
-                    "master_node": job.master_node,
-                    "node_list": list(assignment.keys())
-                }
-                sock.send(json.dumps(request).encode())
-                
-                # Receive response
-                response_data = sock.recv(4096).decode()
-                response = json.loads(response_data)
+                request = {**job_request, "gpu_ids": gpu_ids, "rank": rank}
+                response = self.resource_manager.pool.request(node_id, request)
                 
                 if response.get('status') == 'ok':
-                    print(f"[INFO] Started distributed job {job.id} rank {rank} on node {node_id}")
+                    logger.info(f"Started distributed job {job.id} rank {rank} on node {node_id}")
                 else:
-                    print(f"[ERROR] Failed to start distributed job {job.id} on node {node_id}: {response.get('message', 'Unknown error')}")
+                    logger.error(f"Failed to start distributed job {job.id} on node {node_id}: {response.get('message', 'Unknown error')}")
                     job.status = "failed"
-                    
-                sock.close()
                 
             except Exception as e:
-                print(f"[ERROR] Failed to start distributed job {job.id} on node {node_id}: {e}")
+                logger.error(f"Failed to start distributed job {job.id} on node {node_id}: {e}")
                 job.status = "failed"
                 break
     
     def cancel_job(self, job_id: str) -> bool:
-        """Cancel job"""
+        """Cancel job
+        
+        The lock only covers the state change; node agents are told to kill a running
+        job after it is released, so cancels don't block submit/status behind node RPCs.
+        """
         with self.lock:
-            # Look for job in queue
-            for job in list(self.job_queue):
-                if job.id == job_id:
-                    self.job_queue.remove(job)
-                    print(f"[INFO] Cancelled queued job {job_id}")
-                    return True
+            # Look for job in queue; its heap entry becomes a tombstone
+            job = self.jobs_by_id.pop(job_id, None)
+            if job is not None:
+                job.status = "cancelled"
+                self._prune_queue()
+                self.notify_scheduler()  # It may have been blocking the head of the queue
+                logger.info(f"Cancelled queued job {job_id}")
+                return True
             
             # Look for job in running jobs
-            if job_id in self.running_jobs:
-                job = self.running_jobs[job_id]
+            job = self.running_jobs.pop(job_id, None)
+            if job is None:
+                logger.warning(f"Job {job_id} not found")
+                return False
+            job.status = "cancelled"
+        
+        self.cancel_on_nodes(job)
+        self.notify_scheduler()
+        logger.info(f"Cancelled running job {job_id}")
+        return True
+    
+    def cancel_on_nodes(self, job: DistributedJob):
+        """Send a cancel request to each remote node the job runs on; called without self.lock"""
+        for node_id in job.assigned_nodes or []:
+            if node_id == "localhost":
+                continue  # For localhost, only log without actual cancellation
+            
+            node = self.resource_manager.nodes.get(node_id)
+            if node and node.status == "online":
                 try:
-                    # Send cancel request to each node
-                    if job.assigned_nodes:
-                        for node_id in job.assigned_nodes:
-                            if node_id == "localhost":
-                                continue  # For localhost, only log without actual cancellation
-                            
-                            node = self.resource_manager.nodes.get(node_id)
-                            if node and node.status == "online":
-                                try:
-                                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                                    sock.settimeout(5.0)
-                                    sock.connect((node.ip, node.port))
-                                    
-                                    cancel_request = {
-                                        "cmd": "cancel_job",
-                                        "job_id": job_id
-                                    }
-                                    sock.send(json.dumps(cancel_request).encode())
-                                    
-                                    response_data = sock.recv(4096).decode()
-                                    response = json.loads(response_data)
-                                    
-                                    if response.get('status') == 'ok':
-                                        print(f"[INFO] Cancelled job {job_id} on node {node_id}")
-                                    else:
-                                        print(f"[WARNING] Failed to cancel job {job_id} on node {node_id}")
-                                    
-                                    sock.close()
-                                except Exception as e:
-                                    print(f"[ERROR] Error cancelling job {job_id} on node {node_id}: {e}")
-                    
-                    # Remove from running jobs list
-                    del self.running_jobs[job_id]
-                    job.status = "cancelled"
-                    print(f"[INFO] Cancelled running job {job_id}")
-                    return True
+                    cancel_request = {
+                        "cmd": "cancel_job",
+                        "job_id": job.id
+                    }
+                    response = self.resource_manager.pool.request(node_id, cancel_request)
                     
+                    if response.get('status') == 'ok':
+                        logger.info(f"Cancelled job {job.id} on node {node_id}")
+                    else:
+                        logger.warning(f"Failed to cancel job {job.id} on node {node_id}")
                 except Exception as e:
-                    print(f"[ERROR] Error cancelling job {job_id}: {e}")
-                    return False
-            
-            print(f"[WARNING] Job {job_id} not found")
-            return False
+                    logger.error(f"Error cancelling job {job.id} on node {node_id}: {e}")
     
     def flush_all_jobs(self) -> int:
         """Cancel all queued and running jobs"""
@@ -610,30 +1187,36 @@ class MultiNodeScheduler:
             cancelled_count = 0
             
             # Cancel all queued jobs
-            queued_count = len(self.job_queue)
-            for job in list(self.job_queue):
-                print(f"[INFO] Cancelled queued job {job.id}")
+            queued_count = len(self.jobs_by_id)
+            for job in self._queued_jobs():
+                job.status = "cancelled"
+                logger.info(f"Cancelled queued job {job.id}")
                 cancelled_count += 1
             self.job_queue.clear()
+            self.jobs_by_id.clear()
             
-            # Cancel all running jobs
-            running_jobs = list(self.running_jobs.values())
-            for job in running_jobs:
-                if self.cancel_job(job.id):
-                    cancelled_count += 1
-            
-            print(f"[INFO] Flushed {cancelled_count} jobs ({queued_count} queued, {len(running_jobs)} running)")
-            return cancelled_count
+            running_ids = list(self.running_jobs)
+        
+        # Cancel all running jobs; each one's node RPCs run outside the lock
+        for job_id in running_ids:
+            if self.cancel_job(job_id):
+                cancelled_count += 1
+        
+        logger.info(f"Flushed {cancelled_count} jobs ({queued_count} queued, {len(running_ids)} running)")
+        return cancelled_count
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--config', default='cluster_config.yaml', help='Cluster configuration file')
     parser.add_argument('--port', type=int, default=8080, help='Master server port')
+    parser.add_argument('--log-level', default=None, help='Log level (default: logging.level from the config, else INFO)')
     args = parser.parse_args()
     
     # Initialize resource manager
     resource_manager = ClusterResourceManager(args.config)
+    setup_logging(args.log_level or resource_manager.log_level)
     resource_manager.connect_to_nodes()
+    resource_manager.start_watchers()
     
     # Initialize scheduler
     scheduler = MultiNodeScheduler(resource_manager)
@@ -642,206 +1225,236 @@ def main():
     def scheduling_loop():
         while True:
             scheduler.try_schedule_jobs()
-            time.sleep(2)
+            # Wake on submit/cancel/completion/heartbeat; the timeout is a safety net for unsignalled releases
+            scheduler.wait_for_work(timeout=2.0)
     
     threading.Thread(target=scheduling_loop, daemon=True).start()
     
-    # Client request handler server
-    def handle_client(conn, addr):
-        close_connection = True  # Default behavior
-        try:
-            print(f"[DEBUG] Client connected from {addr}")
-            data = conn.recv(4096)
+    def process_request(request: Dict, addr) -> Dict:
+        """Handle one non-interactive client request; runs on a worker thread"""
+        logger.debug(f"Request: {request.get('cmd', 'unknown')}")
+        response = {'status': 'error', 'message': f"Unknown command: {request.get('cmd')}"}
+        
+        if request['cmd'] == 'submit':
+            # Handle distributed job submission
+            job = DistributedJob(
+                id=request['job_id'],
+                user=request['user'],
+                cmd=request['cmdline'],
+                node_requirements=request.get('node_requirements', {}),
+                total_gpus=request.get('total_gpus', 1),
+                priority=request.get('priority', 0),
+                distributed_type=request.get('distributed_type', 'single')
+            )
+            job_id = scheduler.submit_job(job)
+            response = {'status': 'ok', 'job_id': job_id}
+            logger.debug(f"Job submitted: {job_id}")
+        
+        elif request['cmd'] == 'queue':
+            # Query queue status using thread-safe method
+            response = scheduler.get_queue_status()
+            logger.debug(f"Queue status sent to {addr}")
+        
+        elif request['cmd'] == 'cancel':
+            # Handle job cancellation
+            job_id = request.get('job_id')
+            if job_id:
+                success = scheduler.cancel_job(job_id)
+                if success:
+                    response = {'status': 'ok', 'message': f'Job {job_id} cancelled'}
+                else:
+                    response = {'status': 'error', 'message': f'Failed to cancel job {job_id}'}
+                logger.debug(f"Cancel request for job {job_id}: {'success' if success else 'failed'}")
+            else:
+                response = {'status': 'error', 'message': 'No job_id provided'}
+                logger.debug("Cancel request failed: No job_id provided")
+        
+        elif request['cmd'] == 'flush':
+            # Flush all jobs
+            cancelled_count = scheduler.flush_all_jobs()
+            response = {'status': 'ok', 'message': f'Flushed {cancelled_count} jobs'}
+            logger.debug(f"Flush request: cancelled {cancelled_count} jobs")
+        
+        elif request['cmd'] == 'heartbeat':
+            # Handle heartbeat from node agents
+            node_id = request.get('node_id')
+            if node_id and node_id in resource_manager.nodes:
+                resource_manager.nodes[node_id].last_heartbeat_ns = time.monotonic_ns()
+                resource_manager.mark_online(node_id)
+                scheduler.notify_scheduler()
+                logger.info(f"Heartbeat received from {node_id}")
+            else:
+                logger.warning(f"Heartbeat from unknown node: {node_id}")
             
-            if not data:
-                print(f"[WARNING] Empty data from {addr}")
-                return
-                
-            print(f"[DEBUG] Received {len(data)} bytes from {addr}")
-            request = json.loads(data.decode())
-            print(f"[DEBUG] Request: {request.get('cmd', 'unknown')}")
+            response = {'status': 'ok', 'message': 'heartbeat acknowledged'}
+        
+        elif request['cmd'] in ('interactive_output', 'interactive_output_batch'):
+            # Handle interactive output from node; batches carry several lines at once
+            job_id = request.get('job_id')
+            data = ''.join(request.get('lines') or [request.get('data', '')])
             
-            if request['cmd'] == 'submit':
-                # Handle distributed job submission
-                interactive = request.get('interactive', False)
-                
-                job = DistributedJob(
-                    id=request['job_id'],
-                    user=request['user'],
-                    cmd=request['cmdline'],
-                    node_requirements=request.get('node_requirements', {}),
-                    total_gpus=request.get('total_gpus', 1),
-                    priority=request.get('priority', 0),
-                    distributed_type=request.get('distributed_type', 'single'),
-                    interactive=interactive,
-                    client_conn=conn if interactive else None
-                )
-                
-                job_id = scheduler.submit_job(job)
+            clients = scheduler.interactive_clients.get(job_id)
+            if clients:
+                # Send output to all connected interactive clients
+                output_msg = {
+                    'type': 'output',
+                    'job_id': job_id,
+                    'data': data
+                }
+                dead_clients = broadcast_stream(clients, output_msg)
                 
-                if interactive:
-                    # For interactive jobs, add client to interactive clients list
-                    if job_id not in scheduler.interactive_clients:
-                        scheduler.interactive_clients[job_id] = []
-                    scheduler.interactive_clients[job_id].append(conn)
-                    
-                    # Send initial response but keep connection open
-                    response = {'status': 'ok', 'job_id': job_id, 'interactive': True}
-                    conn.send(json.dumps(response).encode())
-                    print(f"[DEBUG] Interactive job submitted: {job_id}")
-                    close_connection = False  # Don't close connection for interactive jobs
-                    return  # Don't close connection
-                else:
-                    # For non-interactive jobs, send response and close connection
-                    response = {'status': 'ok', 'job_id': job_id}
-                    conn.send(json.dumps(response).encode())
-                    print(f"[DEBUG] Job submitted: {job_id}")
+                # Remove dead clients
+                if dead_clients:
+                    scheduler.interactive_clients[job_id] = [c for c in clients if c not in dead_clients]
             
-            elif request['cmd'] == 'queue':
-                # Query queue status using thread-safe method
-                queue_info = scheduler.get_queue_status()
-                conn.send(json.dumps(queue_info).encode())
-                print(f"[DEBUG] Queue status sent to {addr}")
+            response = {'status': 'ok', 'message': 'Output forwarded'}
+        
+        elif request['cmd'] == 'interactive_complete':
+            # Handle interactive job completion
+            job_id = request.get('job_id')
+            exit_code = request.get('exit_code', 0)
             
-            elif request['cmd'] == 'cancel':
-                # Handle job cancellation
-                job_id = request.get('job_id')
-                if job_id:
-                    success = scheduler.cancel_job(job_id)
-                    if success:
-                        response = {'status': 'ok', 'message': f'Job {job_id} cancelled'}
-                    else:
-                        response = {'status': 'error', 'message': f'Failed to cancel job {job_id}'}
-                    print(f"[DEBUG] Cancel request for job {job_id}: {'success' if success else 'failed'}")
-                else:
-                    response = {'status': 'error', 'message': 'No job_id provided'}
-                    print(f"[DEBUG] Cancel request failed: No job_id provided")
-                conn.send(json.dumps(response).encode())
+            # Send completion to interactive clients
+            if job_id in scheduler.interactive_clients:
+                completion_msg = {
+                    'type': 'completion',
+                    'job_id': job_id,
+                    'exit_code': exit_code
+                }
+                dead_clients = broadcast_stream(scheduler.interactive_clients[job_id], completion_msg)
+                
+                # Clean up client list
+                for client_socket, _, _ in dead_clients:
+                    try:
+                        client_socket.close()
+                    except:
+                        pass
+                
+                del scheduler.interactive_clients[job_id]
             
-            elif request['cmd'] == 'flush':
-                # Flush all jobs
-                cancelled_count = scheduler.flush_all_jobs()
-                response = {'status': 'ok', 'message': f'Flushed {cancelled_count} jobs'}
-                conn.send(json.dumps(response).encode())
-                print(f"[DEBUG] Flush request: cancelled {cancelled_count} jobs")
+            scheduler.notify_scheduler()
+            response = {'status': 'ok', 'message': 'Interactive completion processed'}
+        
+        elif request['cmd'] == 'get_cluster_resources':
+            # Get cluster-wide resource information
+            try:
+                cluster_resources = resource_manager.get_cluster_resources()
+                # Clients expect GPU index lists, not the scheduler's internal masks
+                for resources in cluster_resources.values():
+                    resources['available_gpus'] = mask_to_gpus(resources.pop('available_mask', 0))
+                now, now_ns = time.time(), time.monotonic_ns()
+                response = {
+                    'status': 'ok', 
+                    'resources': cluster_resources,
+                    'nodes': {node_id: node.status_view(now, now_ns)
+                              for node_id, node in resource_manager.nodes.items()}
+                }
+                logger.debug(f"Cluster resources sent to {addr}")
+            except Exception as e:
+                response = {'status': 'error', 'message': f'Failed to get cluster resources: {str(e)}'}
+                logger.error(f"Failed to get cluster resources: {e}")
+        
+        return response
+    
+    def start_interactive_job(request: Dict, conn: socket.socket, framed: bool, binary: bool):
+        """Submit an interactive job that streams its output back over conn; runs on a worker thread"""
+        job = DistributedJob(
+            id=request['job_id'],
+            user=request['user'],
+            cmd=request['cmdline'],
+            node_requirements=request.get('node_requirements', {}),
+            total_gpus=request.get('total_gpus', 1),
+            priority=request.get('priority', 0),
+            distributed_type=request.get('distributed_type', 'single'),
+            interactive=True,
+            client_conn=conn,
+            client_framed=framed,
+            client_binary=binary
+        )
+        
+        # Add client to interactive clients list and acknowledge before the job can produce output
+        scheduler.interactive_clients.setdefault(job.id, []).append((conn, framed, binary))
+        response = {'status': 'ok', 'job_id': job.id, 'interactive': True}
+        send_message(conn, response, framed, binary)
+        scheduler.submit_job(job)
+        logger.debug(f"Interactive job submitted: {job.id}")
+    
+    def detach_socket(writer: asyncio.StreamWriter) -> socket.socket:
+        """Take a connection out of the event loop as a plain blocking socket"""
+        transport_sock = writer.get_extra_info('socket')
+        conn = socket.socket(transport_sock.family, transport_sock.type, fileno=os.dup(transport_sock.fileno()))
+        conn.setblocking(True)
+        writer.transport.abort()  # Closes only the event loop's descriptor
+        return conn
+    
+    # Client request handler server: one asyncio task per connection
+    async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        addr = writer.get_extra_info('peername')
+        framed = binary = False
+        # asyncio already sets TCP_NODELAY; keep-alive probes drop agents that vanished without a FIN
+        writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        try:
+            logger.debug(f"Client connected from {addr}")
+            request, framed, binary = await read_message(reader)
             
-            elif request['cmd'] == 'heartbeat':
-                # Handle heartbeat from node agents
-                node_id = request.get('node_id')
-                if node_id and node_id in resource_manager.nodes:
-                    resource_manager.nodes[node_id].last_heartbeat = time.time()
-                    resource_manager.nodes[node_id].status = "online"
-                    print(f"[INFO] Heartbeat received from {node_id}")
-                else:
-                    print(f"[WARNING] Heartbeat from unknown node: {node_id}")
-                
-                response = {'status': 'ok', 'message': 'heartbeat acknowledged'}
-                conn.send(json.dumps(response).encode())
+            if request is None:
+                logger.warning(f"Empty data from {addr}")
+                return
             
-            elif request['cmd'] == 'interactive_output':
-                # Handle interactive output from node
-                job_id = request.get('job_id')
-                data = request.get('data', '')
+            # Framed peers (node agents) keep the connection open for further requests
+            while request is not None:
+                logger.debug(f"Received {'framed' if framed else 'legacy'} request from {addr}")
                 
-                if job_id in scheduler.interactive_clients:
-                    # Send output to all connected interactive clients
-                    dead_clients = []
-                    for client_socket in scheduler.interactive_clients[job_id]:
-                        try:
-                            output_msg = {
-                                'type': 'output',
-                                'job_id': job_id,
-                                'data': data
-                            }
-                            client_socket.send((json.dumps(output_msg) + '\n').encode())
-                        except:
-                            dead_clients.append(client_socket)
-                    
-                    # Remove dead clients
-                    for client in dead_clients:
-                        scheduler.interactive_clients[job_id].remove(client)
+                if request['cmd'] == 'submit' and request.get('interactive', False):
+                    # Interactive jobs keep the connection open; hand it to the job's output streaming
+                    conn = detach_socket(writer)
+                    await asyncio.to_thread(start_interactive_job, request, conn, framed, binary)
+                    return
                 
-                response = {'status': 'ok', 'message': 'Output forwarded'}
-                conn.send(json.dumps(response).encode())
-            
-            elif request['cmd'] == 'interactive_complete':
-                # Handle interactive job completion
-                job_id = request.get('job_id')
-                exit_code = request.get('exit_code', 0)
+                response = await asyncio.to_thread(process_request, request, addr)
+                if 'req_id' in request:
+                    # Agents pipeline requests on one connection and match replies by req_id
+                    response['req_id'] = request['req_id']
+                writer.write(pack_message(response, framed, binary))
+                await writer.drain()
                 
-                # Send completion to interactive clients
-                if job_id in scheduler.interactive_clients:
-                    dead_clients = []
-                    for client_socket in scheduler.interactive_clients[job_id]:
-                        try:
-                            completion_msg = {
-                                'type': 'completion',
-                                'job_id': job_id,
-                                'exit_code': exit_code
-                            }
-                            client_socket.send((json.dumps(completion_msg) + '\n').encode())
-                        except:
-                            dead_clients.append(client_socket)
-                    
-                    # Clean up client list
-                    for client in dead_clients:
-                        try:
-                            client.close()
-                        except:
-                            pass
-                    
-                    del scheduler.interactive_clients[job_id]
-                
-                response = {'status': 'ok', 'message': 'Interactive completion processed'}
-                conn.send(json.dumps(response).encode())
-            
-            elif request['cmd'] == 'get_cluster_resources':
-                # Get cluster-wide resource information
-                try:
-                    cluster_resources = resource_manager.get_cluster_resources()
-                    response = {
-                        'status': 'ok', 
-                        'resources': cluster_resources,
-                        'nodes': {node_id: {
-                            'hostname': node.hostname,
-                            'status': node.status,
-                            'gpu_count': node.gpu_count,
-                            'gpu_type': node.gpu_type,
-                            'last_heartbeat': node.last_heartbeat
-                        } for node_id, node in resource_manager.nodes.items()}
-                    }
-                    conn.send(json.dumps(response).encode())
-                    print(f"[DEBUG] Cluster resources sent to {addr}")
-                except Exception as e:
-                    response = {'status': 'error', 'message': f'Failed to get cluster resources: {str(e)}'}
-                    conn.send(json.dumps(response).encode())
-                    print(f"[ERROR] Failed to get cluster resources: {e}")
+                if not framed:
+                    return
+                request, framed, binary = await asyncio.wait_for(read_message(reader), KEEPALIVE_IDLE_TIMEOUT)
             
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            logger.debug(f"Connection from {addr} closed")
         except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON decode error from {addr}: {e}")
+            logger.error(f"JSON decode error from {addr}: {e}")
             error_response = {'status': 'error', 'message': 'Invalid JSON'}
             try:
-                conn.send(json.dumps(error_response).encode())
+                writer.write(pack_message(error_response, framed, binary))
+                await writer.drain()
             except:
                 pass
         except Exception as e:
+            logger.error(f"Error handling request from {addr}: {e}")
             error_response = {'status': 'error', 'message': str(e)}
-            conn.send(json.dumps(error_response).encode())
+            try:
+                writer.write(pack_message(error_response, framed, binary))
+                await writer.drain()
+            except:
+                pass
         finally:
-            if close_connection:
-                conn.close()
+            writer.close()
     
     # Start master server
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind(('0.0.0.0', args.port))
-    server.listen(10)
-    
-    print(f"[INFO] Multi-node GPU scheduler master started on port {args.port}")
+    async def serve():
+        server = await asyncio.start_server(handle_client, '0.0.0.0', args.port, reuse_address=True,
+                                            backlog=socket.SOMAXCONN)  # Absorb heartbeat bursts after a restart
+        logger.info(f"Multi-node GPU scheduler master started on port {args.port} "
+                    f"({'uvloop' if uvloop is not None else 'asyncio'} event loop)")
+        async with server:
+            await server.serve_forever()
     
-    while True:
-        conn, addr = server.accept()
-        threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())  # asyncio.Runner(loop_factory=) needs 3.11
+    asyncio.run(serve())
 
 if __name__ == "__main__":
     main()
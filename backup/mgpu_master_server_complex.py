@@ -4,6 +4,7 @@ Multi-Node GPU Scheduler - Master Server
 Manages cluster-wide resource allocation and job scheduling
 """
 import os
+import pwd
 import socket
 import threading
 import subprocess
@@ -12,9 +13,18 @@ import time
 import yaml
 from collections import deque
 import argparse
+import functools
 from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional
 
+@functools.lru_cache(maxsize=1024)
+def home_for(user: str) -> str:
+    """Home directory of user, resolved through NSS once per process"""
+    try:
+        return pwd.getpwnam(user).pw_dir
+    except KeyError:
+        return os.path.expanduser(f'~{user}')
+
 @dataclass
 class Node:
     node_id: str
@@ -387,7 +397,7 @@ class MultiNodeScheduler:
                 
                 # Set CUDA_VISIBLE_DEVICES for GPU assignment
                 cuda_env = f"CUDA_VISIBLE_DEVICES={','.join(map(str, gpu_ids))}"
-                home_dir = os.path.expanduser(f'~{job.user}')
+                home_dir = home_for(job.user)
                 
                 # Use the user's shell with proper environment
                 full_command = f"cd {home_dir} && export {cuda_env} && export PYTHONUNBUFFERED=1 && {job.cmd}"
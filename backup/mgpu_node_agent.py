@@ -4,33 +4,437 @@ Multi-Node GPU Scheduler - Node Agent
 Runs on each compute node to manage local GPU resources and execute jobs
 """
 import os
+import re
+import sys
+import pwd
+import functools
+import itertools
+import codecs
+import select
+import selectors
+import shlex
+import signal
 import socket
 import threading
 import subprocess
 import json
+import queue
 import time
 import psutil
 import argparse
-from typing import Dict, List
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
-def get_available_gpus():
-    """Query local GPU resources"""
+# Shared wire helpers live in the src tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mgpu_core.network.framing import (USE_MSGPACK, encode, encode_json, pack_message, frame_payload,
+                                       recv_frame, split_message)
+
+KEEPALIVE_IDLE_TIMEOUT = 300  # Seconds a pooled master connection may sit idle
+REQUEST_TIMEOUT = 10.0        # Seconds a connection may take to deliver its first request
+OUTPUT_BATCH_LINES = 64       # Interactive output lines per interactive_output_batch message
+OUTPUT_BATCH_BYTES = 4096     # ... or this many characters, whichever comes first
+OUTPUT_FLUSH_INTERVAL = 0.02  # Ship a partial batch once stdout has been idle this long
+JOB_PATH = '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'  # sudo's default secure_path
+
+@functools.lru_cache(maxsize=1024)
+def home_for(user: str) -> str:
+    """Home directory of user, resolved through NSS once per process"""
+    try:
+        return pwd.getpwnam(user).pw_dir
+    except KeyError:
+        return os.path.expanduser(f'~{user}')
+
+@functools.lru_cache(maxsize=1024)
+def user_ids(user: str):
+    """(uid, gid, supplementary groups) of user, resolved once per process"""
+    entry = pwd.getpwnam(user)
+    return entry.pw_uid, entry.pw_gid, tuple(os.getgrouplist(user, entry.pw_gid))
+
+@functools.lru_cache(maxsize=1024)
+def shell_for(user: str) -> str:
+    """Login shell of user, resolved once per process"""
     try:
-        out = subprocess.check_output(['nvidia-smi', '--query-gpu=index,memory.free,memory.total', '--format=csv,noheader,nounits'])
+        return pwd.getpwnam(user).pw_shell or '/bin/sh'
+    except KeyError:
+        return '/bin/sh'
+
+def job_environment(user: str, home_dir: str, extra: Dict[str, str]) -> Dict[str, str]:
+    """Environment of a job started without sudo: what sudo's env_reset would leave, plus extra
+    
+    Nothing else is inherited from this process, which runs as root.
+    """
+    env = {'PATH': JOB_PATH, 'HOME': home_dir, 'USER': user, 'LOGNAME': user, 'SHELL': shell_for(user)}
+    if 'LANG' in os.environ:
+        env['LANG'] = os.environ['LANG']
+    env.update(extra)
+    return env
+
+def spawn_as(user: str, job_env: Dict[str, str], cmd: str, **popen_kwargs) -> subprocess.Popen:
+    """Run cmd as user from its home directory, in its own session
+    
+    As root (or as user itself) this is one fork/exec of /bin/sh with privileges dropped
+    by Popen; any other agent falls back to sudo and a login shell.
+    """
+    home_dir = home_for(user)
+    uid, gid, groups = user_ids(user)
+    euid = os.geteuid()
+    if euid not in (0, uid):
+        exports = ' '.join(f"{key}={shlex.quote(value)}" for key, value in job_env.items())
+        return subprocess.Popen(['sudo', '-u', user, 'bash', '-lc', f"cd {home_dir} && {exports} {cmd}"],
+                                start_new_session=True, **popen_kwargs)
+    # Already the target user needs no credential change (and non-root can't setgroups)
+    credentials = {} if euid == uid else {'user': uid, 'group': gid, 'extra_groups': list(groups)}
+    env = job_environment(user, home_dir, job_env)
+    return subprocess.Popen(['/bin/sh', '-c', cmd], cwd=home_dir, env=env, start_new_session=True,
+                            **credentials, **popen_kwargs)
+
+@dataclass(eq=False)
+class AgentConnection:
+    """Per-connection state of the agent's request reactor"""
+    sock: socket.socket
+    addr: Tuple
+    framed: Optional[bool] = None  # Unknown until the first byte arrives
+    binary: bool = False           # Last request was msgpack; the reply uses the same codec
+    inbuf: bytearray = field(default_factory=bytearray)
+    outbuf: bytearray = field(default_factory=bytearray)
+    busy: bool = False             # A request is running on the worker pool
+    close_after_send: bool = False
+    closed: bool = False
+    events: int = selectors.EVENT_READ
+    last_active: float = field(default_factory=time.monotonic)
+
+class RequestReactor:
+    """One selectors loop serving every agent connection
+    
+    Complete requests are handed to a bounded worker pool; the finished response comes
+    back through a wakeup socket and is written by the loop. Framed connections stay
+    open for further requests; legacy bare-JSON connections carry exactly one.
+    """
+    
+    def __init__(self, handler: Callable[[Dict, Tuple], Dict], max_workers: Optional[int] = None):
+        self.handler = handler
+        self.sel = selectors.DefaultSelector()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) * 4),
+                                           thread_name_prefix='agent-worker')
+        self.completed: queue.SimpleQueue = queue.SimpleQueue()
+        self.recv_buffer = bytearray(65536)  # Only the selector thread reads, so one buffer serves every connection
+        self.connections: Dict[int, AgentConnection] = {}
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.sel.register(self._wake_r, selectors.EVENT_READ)
+        
+    def serve(self, server: socket.socket):
+        """Run the loop forever on a listening socket"""
+        server.setblocking(False)
+        self.sel.register(server, selectors.EVENT_READ)
+        while True:
+            for key, events in self.sel.select(timeout=1.0):
+                if key.fileobj is server:
+                    self._accept(server)
+                elif key.fileobj is self._wake_r:
+                    self._drain_completed()
+                else:
+                    conn = key.data
+                    if conn.closed:
+                        continue
+                    if events & selectors.EVENT_WRITE:
+                        self._flush(conn)
+                    if events & selectors.EVENT_READ and not conn.closed:
+                        self._read(conn)
+            self._sweep_idle()
+    
+    def _accept(self, server: socket.socket):
+        try:
+            sock, addr = server.accept()
+        except BlockingIOError:
+            return
+        print(f"[DEBUG] Received connection from {addr}")
+        # Small request/response messages: don't let Nagle hold back replies
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setblocking(False)
+        conn = AgentConnection(sock, addr)
+        self.connections[sock.fileno()] = conn
+        self.sel.register(sock, conn.events, conn)
+    
+    def _read(self, conn: AgentConnection):
+        try:
+            n = conn.sock.recv_into(self.recv_buffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"[WARNING] Connection error from {conn.addr}: {e}")
+            self._close(conn)
+            return
+        if not n:
+            if conn.framed is None:
+                print(f"[WARNING] Empty data received from {conn.addr}")
+            self._close(conn)
+            return
+        conn.inbuf += memoryview(self.recv_buffer)[:n]
+        conn.last_active = time.monotonic()
+        self._next_request(conn)
+    
+    def _parse(self, conn: AgentConnection) -> Optional[Dict]:
+        """Pop one complete request from conn.inbuf, or None if more bytes are needed"""
+        if not conn.inbuf:
+            return None
+        if conn.framed is None:
+            conn.framed = conn.inbuf[:1] != b'{'  # Known before parsing, so errors are answered in kind
+        parsed = split_message(conn.inbuf)
+        if parsed is None:
+            return None
+        request, _, conn.binary = parsed
+        return request
+    
+    def _next_request(self, conn: AgentConnection):
+        # One request in flight per connection keeps responses in order
+        if conn.busy or conn.close_after_send:
+            return
+        try:
+            request = self._parse(conn)
+        except json.JSONDecodeError as je:
+            print(f"[ERROR] JSON decode error: {je}")
+            self._reply(conn, {'status': 'error', 'message': f'Invalid JSON: {str(je)}'}, close=True)
+            return
+        except Exception as e:
+            print(f"[ERROR] Error handling request from {conn.addr}: {e}")
+            self._reply(conn, {'status': 'error', 'message': str(e)}, close=True)
+            return
+        if request is None:
+            return
+        conn.busy = True
+        future = self.executor.submit(self._run, request, conn.addr)
+        future.add_done_callback(lambda f, conn=conn: self._complete(conn, f.result()))
+    
+    def _run(self, request: Dict, addr) -> Dict:
+        print(f"[DEBUG] Parsed request: {request}")
+        try:
+            return self.handler(request, addr)
+        except Exception as e:
+            print(f"[ERROR] Error handling request from {addr}: {e}")
+            return {'status': 'error', 'message': str(e)}
+    
+    def _complete(self, conn: AgentConnection, response: Dict):
+        # Runs on a worker thread; hand the response back to the loop
+        self.completed.put((conn, response))
+        try:
+            self._wake_w.send(b'\0')
+        except BlockingIOError:
+            pass  # Loop already has a wakeup pending
+    
+    def _drain_completed(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                conn, response = self.completed.get_nowait()
+            except queue.Empty:
+                return
+            if conn.closed:
+                continue
+            conn.busy = False
+            self._reply(conn, response, close=not conn.framed)
+            print(f"[DEBUG] Response sent successfully to {conn.addr}")
+            if not conn.closed:
+                self._next_request(conn)
+    
+    def _reply(self, conn: AgentConnection, response: Dict, close: bool = False):
+        conn.outbuf += pack_message(response, bool(conn.framed), conn.binary)
+        conn.close_after_send = conn.close_after_send or close
+        conn.last_active = time.monotonic()
+        self._flush(conn)
+    
+    def _flush(self, conn: AgentConnection):
+        if conn.outbuf:
+            try:
+                sent = conn.sock.send(conn.outbuf)
+                del conn.outbuf[:sent]
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                print(f"[ERROR] Failed to send response to {conn.addr}: {e}")
+                self._close(conn)
+                return
+        if not conn.outbuf and conn.close_after_send:
+            self._close(conn)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outbuf else 0)
+        if events != conn.events:
+            conn.events = events
+            self.sel.modify(conn.sock, events, conn)
+    
+    def _sweep_idle(self):
+        now = time.monotonic()
+        for conn in list(self.connections.values()):
+            limit = KEEPALIVE_IDLE_TIMEOUT if conn.framed and not conn.inbuf else REQUEST_TIMEOUT
+            if not conn.busy and now - conn.last_active > limit:
+                if not conn.framed:
+                    print(f"[ERROR] Socket timeout with {conn.addr}")
+                self._close(conn)
+    
+    def _close(self, conn: AgentConnection):
+        if conn.closed:
+            return
+        conn.closed = True
+        self.connections.pop(conn.sock.fileno(), None)
+        try:
+            self.sel.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+        print(f"[DEBUG] Connection closed with {conn.addr}")
+
+GPU_QUERY_TTL = 2.0  # Seconds an nvidia-smi result is reused before querying again
+_gpu_cache = {'t': float('-inf'), 'v': []}
+_gpu_lock = threading.Lock()
+
+def query_gpus() -> List[Dict]:
+    """Run nvidia-smi once and parse its output"""
+    try:
+        out = subprocess.run(['nvidia-smi', '--query-gpu=index,memory.free,memory.total', '--format=csv,noheader,nounits'],
+                             stdout=subprocess.PIPE, text=True, check=True).stdout
         gpus = []
-        for line in out.decode().strip().split('\n'):
-            index, mem_free, mem_total = line.split(', ')
+        for line in out.strip().split('\n'):
+            index, mem_free, mem_total = map(int, line.split(','))
             gpus.append({
-                'index': int(index),
-                'memory_free': int(mem_free),
-                'memory_total': int(mem_total),
-                'utilization': (int(mem_total) - int(mem_free)) / int(mem_total) * 100
+                'index': index,
+                'memory_free': mem_free,
+                'memory_total': mem_total,
+                'utilization': (mem_total - mem_free) / mem_total * 100
             })
         return gpus
     except Exception as e:
         print(f"[ERROR] Failed to get GPU info: {e}")
         return []
 
+_MEM_AVAILABLE = re.compile(rb'^MemAvailable:\s+(\d+) kB', re.MULTILINE)
+
+def memory_available_gb() -> int:
+    """Available memory in GB, read straight from /proc/meminfo where the kernel provides it"""
+    try:
+        with open('/proc/meminfo', 'rb') as f:
+            match = _MEM_AVAILABLE.search(f.read())
+        if match:
+            return int(match[1]) >> 20  # kB -> GB
+    except OSError:
+        pass
+    return psutil.virtual_memory().available // (1024**3)
+
+def get_available_gpus() -> List[Dict]:
+    """Query local GPU resources, reusing a result younger than GPU_QUERY_TTL
+    
+    The returned list is shared between callers and must not be modified.
+    """
+    with _gpu_lock:
+        if time.monotonic() - _gpu_cache['t'] >= GPU_QUERY_TTL:
+            _gpu_cache['v'] = query_gpus()
+            _gpu_cache['t'] = time.monotonic()
+        return _gpu_cache['v']
+
+class MasterChannel:
+    """One long-lived, pipelined connection from a node agent to the master
+    
+    Every request carries a req_id that the master echoes in its reply, so heartbeats,
+    output batches and completions from different threads can all be in flight at
+    once; a reader thread hands each reply to the caller waiting for it.
+    """
+    
+    def __init__(self, host: str, port: int, connect_timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.sock: Optional[socket.socket] = None
+        self.write_lock = threading.Lock()  # Connects and whole-frame writes
+        self.pending_lock = threading.Lock()
+        self.pending: Dict[int, Future] = {}  # req_id -> reply, for requests on self.sock
+        self.req_ids = itertools.count(1)
+    
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection((self.host, self.port), self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        threading.Thread(target=self._read_replies, args=(sock,), daemon=True).start()
+        return sock
+    
+    def _read_replies(self, sock: socket.socket):
+        error: Exception = ConnectionError("Connection closed by master")
+        try:
+            while True:
+                reply = recv_frame(sock)
+                if reply is None:
+                    break
+                with self.pending_lock:
+                    # Masters that don't echo req_id answer strictly in order
+                    req_id = reply.pop('req_id', min(self.pending, default=None))
+                    future = self.pending.pop(req_id, None)
+                if future is not None:
+                    future.set_result(reply)
+        except (OSError, ValueError) as e:
+            error = ConnectionError(f"Connection to master lost: {e}")
+        self._drop(sock, error)
+    
+    def _drop(self, sock: socket.socket, error: Exception):
+        # Forget a dead connection and fail everything still waiting on it
+        with self.pending_lock:
+            if self.sock is not sock:
+                return
+            self.sock = None
+            failed, self.pending = self.pending, {}
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for future in failed.values():
+            future.set_exception(error)
+    
+    def request(self, message: Union[Dict, bytes], timeout: float = 10.0) -> Dict:
+        """Send one request and wait for its reply
+        
+        message may also be an already encoded JSON object. A connection that turns out to
+        be stale is replaced and the request sent once more.
+        """
+        for attempt in range(2):
+            req_id = next(self.req_ids)
+            if isinstance(message, bytes):
+                payload = message[:-1] + b',"req_id":' + str(req_id).encode() + b'}'
+            else:
+                payload = encode({**message, 'req_id': req_id})
+            future: Future = Future()
+            with self.write_lock:
+                sock = self.sock
+                try:
+                    if sock is None:
+                        sock = self.sock = self._connect()
+                    with self.pending_lock:
+                        self.pending[req_id] = future
+                    sock.sendall(frame_payload(payload))
+                except ConnectionError as e:
+                    if sock is not None:
+                        self._drop(sock, e)
+                    if attempt:
+                        raise
+                    continue
+            try:
+                return future.result(timeout)
+            except FutureTimeout:
+                with self.pending_lock:
+                    self.pending.pop(req_id, None)
+                raise socket.timeout(f"No reply from master within {timeout}s")
+            except ConnectionError:
+                if attempt:
+                    raise
+        raise ConnectionError("Master connection failed")
+
 class NodeAgent:
     """Node agent - manages local resources and executes jobs"""
     
@@ -40,11 +444,25 @@ class NodeAgent:
         self.master_port = master_port
         self.agent_port = agent_port
         self.running_jobs: Dict[str, subprocess.Popen] = {}
-        self.allocated_gpus: List[int] = []  # Currently allocated GPU list
+        self.allocated_gpus: Set[int] = set()  # Currently allocated GPUs
         self.lock = threading.Lock()
+        self.master = MasterChannel(master_host, master_port)
         
-    def get_node_resources(self) -> Dict:
-        """Return node resource information"""
+        # Resource fields that never change after boot, and the heartbeat bytes built from them
+        self.static_resources = {
+            'node_id': node_id,
+            'cpu_count': psutil.cpu_count(),
+            'memory_total': psutil.virtual_memory().total // (1024**3),  # GB
+        }
+        self._heartbeat_prefix = (encode_json({'cmd': 'heartbeat', 'node_id': node_id})[:-1]
+                                  + b',"resources":' + encode_json(self.static_resources)[:-1] + b',')
+        
+    def master_request(self, message: Union[Dict, bytes], timeout: float = 10.0) -> Dict:
+        """Send one request over the shared master connection and return the reply"""
+        return self.master.request(message, timeout)
+    
+    def dynamic_resources(self) -> Dict:
+        """Resource fields that change between heartbeats"""
         gpus = get_available_gpus()
         available_gpu_indices = []
         
@@ -55,16 +473,26 @@ class NodeAgent:
                     available_gpu_indices.append(gpu['index'])
         
         return {
-            'node_id': self.node_id,
             'gpu_count': len(gpus),
             'available_gpus': available_gpu_indices,
             'gpu_details': gpus,
-            'cpu_count': psutil.cpu_count(),
-            'memory_total': psutil.virtual_memory().total // (1024**3),  # GB
-            'memory_available': psutil.virtual_memory().available // (1024**3),  # GB
+            'memory_available': memory_available_gb(),
             'load_average': os.getloadavg() if hasattr(os, 'getloadavg') else [0, 0, 0]
         }
     
+    def get_node_resources(self) -> Dict:
+        """Return node resource information"""
+        return {**self.static_resources, **self.dynamic_resources()}
+    
+    def heartbeat_payload(self) -> Union[Dict, bytes]:
+        """Heartbeat message; as JSON only the dynamic fields are serialized each time"""
+        if USE_MSGPACK:
+            # A msgpack map can't be spliced like the JSON text, and is cheap to pack whole
+            return {'cmd': 'heartbeat', 'node_id': self.node_id, 'resources': self.get_node_resources(),
+                    'timestamp': time.time()}
+        return (self._heartbeat_prefix + encode_json(self.dynamic_resources())[1:]
+                + b',"timestamp":' + encode_json(time.time()) + b'}')
+    
     def start_job(self, job_info: Dict) -> bool:
         """Execute single node job"""
         job_id = job_info['job_id']
@@ -76,29 +504,24 @@ class NodeAgent:
         try:
             with self.lock:
                 # Allocate GPUs
-                for gpu_id in gpu_ids:
-                    if gpu_id in self.allocated_gpus:
-                        raise Exception(f"GPU {gpu_id} already allocated")
-                    self.allocated_gpus.append(gpu_id)
+                busy = self.allocated_gpus.intersection(gpu_ids)
+                if busy:
+                    raise Exception(f"GPU {min(busy)} already allocated")
+                self.allocated_gpus.update(gpu_ids)
             
             # Set CUDA_VISIBLE_DEVICES
-            cuda_env = f"CUDA_VISIBLE_DEVICES={','.join(map(str, gpu_ids))}"
-            home_dir = os.path.expanduser(f'~{user}')
-            
-            full_command = f"cd {home_dir} && PYTHONUNBUFFERED=1 {cuda_env} {command}"
+            job_env = {
+                'PYTHONUNBUFFERED': '1',
+                'CUDA_VISIBLE_DEVICES': ','.join(map(str, gpu_ids))
+            }
             
             # Execute job (different handling for interactive)
             if interactive:
-                proc = subprocess.Popen([
-                    'sudo', '-u', user, 'bash', '-lc', full_command
-                ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                stdin=subprocess.PIPE, bufsize=1, universal_newlines=True, text=True,
-                preexec_fn=os.setsid)
+                proc = spawn_as(user, job_env, command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                stdin=subprocess.PIPE)
             else:
-                proc = subprocess.Popen([
-                    'sudo', '-u', user, 'bash', '-lc', full_command
-                ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                universal_newlines=True, preexec_fn=os.setsid)
+                # Batch output is never read, so don't give it a pipe that can fill up and stall the job
+                proc = spawn_as(user, job_env, command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
             
             with self.lock:
                 self.running_jobs[job_id] = proc
@@ -107,43 +530,86 @@ class NodeAgent:
             
             # Monitor job completion (different for interactive)
             if interactive:
+                def send_output(lines: List[str]):
+                    # Send a batch of output lines to master server
+                    for start in range(0, len(lines), OUTPUT_BATCH_LINES):
+                        try:
+                            output_msg = {
+                                'cmd': 'interactive_output_batch',
+                                'job_id': job_id,
+                                'lines': lines[start:start + OUTPUT_BATCH_LINES],
+                                'node_id': self.node_id
+                            }
+                            
+                            self.master_request(output_msg, timeout=2.0)
+                            
+                        except Exception as e:
+                            print(f"[DEBUG] Failed to send interactive output: {e}")
+                
+                # Reader -> sender hand-off, so a slow master never stops us draining the job's pipe
+                outbox: queue.SimpleQueue = queue.SimpleQueue()
+                
+                def forward_output():
+                    # Sender: merge everything queued since the last send into one batch
+                    done = False
+                    while not done:
+                        lines = outbox.get()
+                        if lines is None:
+                            return
+                        while True:
+                            try:
+                                more = outbox.get_nowait()
+                            except queue.Empty:
+                                break
+                            if more is None:
+                                done = True
+                                break
+                            lines.extend(more)
+                        send_output(lines)
+                
                 def monitor_interactive_job():
-                    # Stream output in real-time for interactive jobs
-                    while proc.poll() is None:
-                        if proc.stdout:
-                            line = proc.stdout.readline()
-                            if line:
-                                # Send output to master server
-                                try:
-                                    master_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                                    master_sock.settimeout(2.0)
-                                    master_sock.connect((self.master_host, self.master_port))
-                                    
-                                    output_msg = {
-                                        'cmd': 'interactive_output',
-                                        'job_id': job_id,
-                                        'data': line,
-                                        'node_id': self.node_id
-                                    }
-                                    
-                                    master_sock.send(json.dumps(output_msg).encode())
-                                    master_sock.recv(1024)  # Receive response
-                                    master_sock.close()
-                                    
-                                except Exception as e:
-                                    print(f"[DEBUG] Failed to send interactive output: {e}")
-                                    
-                        time.sleep(0.1)
+                    # Stream output in real-time for interactive jobs, coalescing lines
+                    # that arrive together into one message to master
+                    sender = threading.Thread(target=forward_output, daemon=True)
+                    sender.start()
+                    fd = proc.stdout.fileno()
+                    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                    lines: List[str] = []
+                    pending = ''  # Trailing text without a newline yet
+                    eof = False
+                    
+                    while not eof:
+                        # Block until output arrives; the flush timeout only matters while a batch is waiting
+                        timeout = OUTPUT_FLUSH_INTERVAL if lines or pending else None
+                        ready, _, _ = select.select([fd], [], [], timeout)
+                        if ready:
+                            chunk = os.read(fd, 65536)
+                            eof = not chunk
+                            pending += decoder.decode(chunk, final=eof)
+                            complete = pending.splitlines(keepends=True)
+                            pending = complete.pop() if complete and not complete[-1].endswith(('\n', '\r')) else ''
+                            lines.extend(complete)
+                        
+                        # Flush when the batch is full, stdout went idle (prompts without a
+                        # newline included) or the job closed its output
+                        idle = not ready or eof
+                        if idle and pending:
+                            lines.append(pending)
+                            pending = ''
+                        if lines and (idle or len(lines) >= OUTPUT_BATCH_LINES
+                                      or sum(map(len, lines)) >= OUTPUT_BATCH_BYTES):
+                            outbox.put(lines)
+                            lines = []
+                    
+                    # Let the sender deliver all output before the completion notice
+                    outbox.put(None)
+                    sender.join()
                     
                     # Get final exit code
                     exit_code = proc.wait()
                     
                     # Send completion notification
                     try:
-                        master_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        master_sock.settimeout(10.0)
-                        master_sock.connect((self.master_host, self.master_port))
-                        
                         completion_msg = {
                             'cmd': 'interactive_complete',
                             'job_id': job_id,
@@ -151,18 +617,14 @@ class NodeAgent:
                             'node_id': self.node_id
                         }
                         
-                        master_sock.send(json.dumps(completion_msg).encode())
-                        master_sock.recv(1024)
-                        master_sock.close()
+                        self.master_request(completion_msg, timeout=10.0)
                         
                     except Exception as e:
                         print(f"[ERROR] Failed to notify interactive completion: {e}")
                     
                     # Cleanup
                     with self.lock:
-                        for gpu_id in gpu_ids:
-                            if gpu_id in self.allocated_gpus:
-                                self.allocated_gpus.remove(gpu_id)
+                        self.allocated_gpus.difference_update(gpu_ids)
                         if job_id in self.running_jobs:
                             del self.running_jobs[job_id]
                     
@@ -174,9 +636,7 @@ class NodeAgent:
                     proc.wait()
                     with self.lock:
                         # Release GPUs
-                        for gpu_id in gpu_ids:
-                            if gpu_id in self.allocated_gpus:
-                                self.allocated_gpus.remove(gpu_id)
+                        self.allocated_gpus.difference_update(gpu_ids)
                         # Remove from running jobs list
                         if job_id in self.running_jobs:
                             del self.running_jobs[job_id]
@@ -190,9 +650,7 @@ class NodeAgent:
             print(f"[ERROR] Failed to start job {job_id}: {e}")
             # Release allocated GPUs
             with self.lock:
-                for gpu_id in gpu_ids:
-                    if gpu_id in self.allocated_gpus:
-                        self.allocated_gpus.remove(gpu_id)
+                self.allocated_gpus.difference_update(gpu_ids)
             return False
     
     def start_distributed_job(self, job_info: Dict) -> bool:
@@ -209,10 +667,10 @@ class NodeAgent:
         try:
             with self.lock:
                 # Allocate GPUs
-                for gpu_id in gpu_ids:
-                    if gpu_id in self.allocated_gpus:
-                        raise Exception(f"GPU {gpu_id} already allocated")
-                    self.allocated_gpus.append(gpu_id)
+                busy = self.allocated_gpus.intersection(gpu_ids)
+                if busy:
+                    raise Exception(f"GPU {min(busy)} already allocated")
+                self.allocated_gpus.update(gpu_ids)
             
             # Setup distributed execution environment
             env_vars = {
@@ -231,17 +689,8 @@ class NodeAgent:
                 # MPI environment setup is handled by mpirun
                 pass
             
-            # Generate environment variables string
-            env_str = ' '.join([f"{k}={v}" for k, v in env_vars.items()])
-            
-            home_dir = os.path.expanduser(f'~{user}')
-            full_command = f"cd {home_dir} && {env_str} {command}"
-            
             # Execute distributed job
-            proc = subprocess.Popen([
-                'sudo', '-u', user, 'bash', '-lc', full_command
-            ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-            universal_newlines=True, preexec_fn=os.setsid)
+            proc = spawn_as(user, env_vars, command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
             
             with self.lock:
                 self.running_jobs[job_id] = proc
@@ -253,9 +702,7 @@ class NodeAgent:
                 proc.wait()
                 with self.lock:
                     # Release GPUs
-                    for gpu_id in gpu_ids:
-                        if gpu_id in self.allocated_gpus:
-                            self.allocated_gpus.remove(gpu_id)
+                    self.allocated_gpus.difference_update(gpu_ids)
                     # Remove from running jobs list
                     if job_id in self.running_jobs:
                         del self.running_jobs[job_id]
@@ -268,159 +715,116 @@ class NodeAgent:
             print(f"[ERROR] Failed to start distributed job {job_id}: {e}")
             # Release allocated GPUs
             with self.lock:
-                for gpu_id in gpu_ids:
-                    if gpu_id in self.allocated_gpus:
-                        self.allocated_gpus.remove(gpu_id)
+                self.allocated_gpus.difference_update(gpu_ids)
             return False
     
+    def terminate_process_tree(self, proc: subprocess.Popen, grace: float = 2.0):
+        """Stop a job and everything it spawned
+        
+        Jobs are started with setsid, so one killpg reaches the whole tree; SIGKILL follows
+        for whatever is left of the group after the grace period.
+        """
+        try:
+            pgid = os.getpgid(proc.pid)
+        except ProcessLookupError:
+            return
+        if pgid == os.getpgrp():
+            # setsid did not take effect; signalling the group would hit the agent itself
+            parent = psutil.Process(proc.pid)
+            for child in parent.children(recursive=True) + [parent]:
+                try:
+                    child.kill()
+                except psutil.NoSuchProcess:
+                    pass
+            return
+        deadline = time.monotonic() + grace
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                pass
+            # The leader can exit before the rest of its group; signal 0 fails once the group is empty
+            while time.monotonic() < deadline:
+                os.killpg(pgid, 0)
+                time.sleep(0.05)
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    
     def cancel_job(self, job_id: str) -> bool:
         """Cancel job"""
         with self.lock:
-            if job_id in self.running_jobs:
-                proc = self.running_jobs[job_id]
-                try:
-                    # Terminate entire process tree
-                    parent = psutil.Process(proc.pid)
-                    children = parent.children(recursive=True)
-                    for child in children:
-                        try:
-                            child.kill()
-                        except:
-                            pass
-                    parent.kill()
-                    del self.running_jobs[job_id]
-                    print(f"[INFO] Canceled job {job_id}")
-                    return True
-                except Exception as e:
-                    print(f"[ERROR] Failed to cancel job {job_id}: {e}")
-                    return False
-            else:
-                print(f"[WARNING] Job {job_id} not found")
-                return False
-    
-    def handle_request(self, conn, addr):
-        """Handle requests from master server"""
-        print(f"[DEBUG] Received connection from {addr}")
-        
+            proc = self.running_jobs.pop(job_id, None)
+        if proc is None:
+            print(f"[WARNING] Job {job_id} not found")
+            return False
         try:
-            # Set socket timeout
-            conn.settimeout(10.0)
-            
-            data = conn.recv(4096)
-            print(f"[DEBUG] Received data length: {len(data)} bytes")
-            
-            if not data:
-                print(f"[WARNING] Empty data received from {addr}")
-                return
-            
-            print(f"[DEBUG] Raw data: {data[:200]}...")  # Print only first 200 bytes
-            
-            try:
-                request = json.loads(data.decode())
-                print(f"[DEBUG] Parsed request: {request}")
-            except json.JSONDecodeError as je:
-                print(f"[ERROR] JSON decode error: {je}")
-                print(f"[ERROR] Raw data was: {data}")
-                error_response = {'status': 'error', 'message': f'Invalid JSON: {str(je)}'}
-                conn.send(json.dumps(error_response).encode())
-                return
-            
-            cmd = request.get('cmd')
-            print(f"[DEBUG] Processing command: {cmd}")
-            
-            response = {'status': 'error', 'message': 'Unknown command'}
-            
-            if cmd == 'get_resources':
-                try:
-                    resources = self.get_node_resources()
-                    response = {'status': 'ok', 'resources': resources}
-                    print(f"[DEBUG] Sending resources: {resources}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to get resources: {e}")
-                    response = {'status': 'error', 'message': f'Failed to get resources: {str(e)}'}
-            
-            elif cmd == 'start_job':
-                success = self.start_job(request)
-                response = {'status': 'ok' if success else 'error'}
-            
-            elif cmd == 'start_distributed_job':
-                success = self.start_distributed_job(request)
-                response = {'status': 'ok' if success else 'error'}
-            
-            elif cmd == 'cancel_job':
-                success = self.cancel_job(request['job_id'])
-                response = {'status': 'ok' if success else 'error'}
-            
-            elif cmd == 'ping':
-                response = {'status': 'ok', 'timestamp': time.time()}
-            
-            elif cmd == 'heartbeat':
-                # Heartbeat only sends OK response
-                response = {'status': 'ok', 'message': 'heartbeat received'}
-                print(f"[DEBUG] Heartbeat received from {addr}")
-            
-            # Send response
-            response_data = json.dumps(response).encode()
-            print(f"[DEBUG] Sending response: {len(response_data)} bytes")
-            conn.send(response_data)
-            print(f"[DEBUG] Response sent successfully to {addr}")
-            
-        except socket.timeout:
-            print(f"[ERROR] Socket timeout with {addr}")
-        except ConnectionResetError:
-            print(f"[WARNING] Connection reset by {addr}")
+            # Terminate entire process tree
+            self.terminate_process_tree(proc)
+            print(f"[INFO] Canceled job {job_id}")
+            return True
         except Exception as e:
-            print(f"[ERROR] Error handling request from {addr}: {e}")
-            error_response = {'status': 'error', 'message': str(e)}
-            try:
-                conn.send(json.dumps(error_response).encode())
-                print(f"[DEBUG] Error response sent to {addr}")
-            except Exception as send_error:
-                print(f"[ERROR] Failed to send error response: {send_error}")
-        finally:
+            print(f"[ERROR] Failed to cancel job {job_id}: {e}")
+            return False
+    
+    def process_request(self, request: Dict, addr) -> Dict:
+        """Dispatch a single decoded request and build its response"""
+        cmd = request.get('cmd')
+        print(f"[DEBUG] Processing command: {cmd}")
+        
+        response = {'status': 'error', 'message': 'Unknown command'}
+        
+        if cmd == 'get_resources':
             try:
-                conn.close()
-                print(f"[DEBUG] Connection closed with {addr}")
-            except:
-                pass
+                resources = self.get_node_resources()
+                response = {'status': 'ok', 'resources': resources}
+                print(f"[DEBUG] Sending resources: {resources}")
+            except Exception as e:
+                print(f"[ERROR] Failed to get resources: {e}")
+                response = {'status': 'error', 'message': f'Failed to get resources: {str(e)}'}
+        
+        elif cmd == 'start_job':
+            success = self.start_job(request)
+            response = {'status': 'ok' if success else 'error'}
+        
+        elif cmd == 'start_distributed_job':
+            success = self.start_distributed_job(request)
+            response = {'status': 'ok' if success else 'error'}
+        
+        elif cmd == 'cancel_job':
+            success = self.cancel_job(request['job_id'])
+            response = {'status': 'ok' if success else 'error'}
+        
+        elif cmd == 'ping':
+            response = {'status': 'ok', 'timestamp': time.time()}
+        
+        elif cmd == 'heartbeat':
+            # Heartbeat only sends OK response
+            response = {'status': 'ok', 'message': 'heartbeat received'}
+            print(f"[DEBUG] Heartbeat received from {addr}")
+        
+        return response
     
     def start_agent_server(self):
         """Start agent server"""
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server.bind(('0.0.0.0', self.agent_port))
-        server.listen(10)
+        server.listen(socket.SOMAXCONN)  # Absorb reconnect bursts after a master restart
         
         print(f"[INFO] Node agent {self.node_id} started on port {self.agent_port}")
         
-        while True:
-            conn, addr = server.accept()
-            threading.Thread(target=self.handle_request, args=(conn, addr), daemon=True).start()
+        RequestReactor(self.process_request).serve(server)
     
     def send_heartbeat(self):
         """Send heartbeat to master server"""
         while True:
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5.0)  # 5 second timeout
-                
                 print(f"[DEBUG] Attempting heartbeat to {self.master_host}:{self.master_port}")
-                sock.connect((self.master_host, self.master_port))
-                
-                heartbeat = {
-                    'cmd': 'heartbeat',
-                    'node_id': self.node_id,
-                    'timestamp': time.time(),
-                    'resources': self.get_node_resources()
-                }
                 
-                heartbeat_data = json.dumps(heartbeat).encode()
-                sock.send(heartbeat_data)
-                
-                # Receive response
-                response_data = sock.recv(4096)
-                if response_data:
-                    response = json.loads(response_data.decode())
+                response = self.master_request(self.heartbeat_payload(), timeout=5.0)
+                if response:
                     if response.get('status') == 'ok':
                         print(f"[DEBUG] Heartbeat acknowledged by master")
                     else:
@@ -428,8 +832,6 @@ class NodeAgent:
                 else:
                     print(f"[WARNING] Empty response to heartbeat")
                 
-                sock.close()
-                
             except socket.timeout:
                 print(f"[WARNING] Heartbeat timeout to {self.master_host}:{self.master_port}")
             except ConnectionRefusedError:
@@ -8,15 +8,13 @@ Mirrors mgpu_srun options plus multi-node flags.
 import sys
 import os
 import socket
-import json
 import argparse
 import getpass
-import random
-import string
 
-def generate_job_id():
-    """Generate unique 8-character job ID."""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+# Shared wire helpers live in the src tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mgpu_core.network.framing import send_frame, recv_frame, FrameStream
+from mgpu_core.utils.id_utils import generate_job_id
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -150,14 +148,17 @@ def main():
 
     # Connect to master server and send request
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Small request/response, don't wait on Nagle
+    if args.interactive:
+        # Output can stop for a long time; keep-alive notices a master that vanished
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
     try:
         sock.connect((args.master_host, args.master_port))
-        sock.send(json.dumps(request).encode())
+        send_frame(sock, request)
 
         if args.interactive:
             # First receive the submission response
-            response = sock.recv(8192).decode()
-            result = json.loads(response)
+            result = recv_frame(sock) or {}
             
             if result.get('status') != 'ok':
                 print(f"Error: {result.get('message')}", file=sys.stderr)
@@ -167,35 +168,31 @@ def main():
             print("Starting interactive session...")
             print("=" * 50)
             
-            # Stream JSON messages until completion
-            buffer = b''
+            # Stream framed messages until completion
+            stream = FrameStream(sock)
             while True:
-                chunk = sock.recv(4096)
-                if not chunk:
+                msg = stream.recv()
+                if msg is None:
                     break
-                buffer += chunk
-                
-                # Parse JSON messages
-                while b'\n' in buffer:
-                    line, buffer = buffer.split(b'\n', 1)
-                    if line.strip():
-                        try:
-                            msg = json.loads(line.decode())
-                            if msg.get('type') == 'output':
-                                print(msg.get('data', '').rstrip())
-                            elif msg.get('type') == 'completion':
-                                print("=" * 50)
-                                print(f"Job completed with exit code: {msg.get('exit_code')}")
-                                return
-                            elif msg.get('type') == 'error':
-                                print(f"ERROR: {msg.get('message')}")
-                                return
-                        except json.JSONDecodeError:
-                            print(f"Invalid JSON: {line}")
+                if msg.get('type') == 'output':
+                    data = msg.get('data', '')
+                    if isinstance(data, bytes):
+                        # msgpack streams carry raw output bytes
+                        data = data.decode(errors='replace')
+                    sys.stdout.write(data)
+                    sys.stdout.flush()
+                elif msg.get('type') == 'completion':
+                    print("=" * 50)
+                    print(f"Job completed with exit code: {msg.get('exit_code')}")
+                    return
+                elif msg.get('type') == 'error':
+                    print(f"ERROR: {msg.get('message')}")
+                    return
         else:
-            resp = sock.recv(4096).decode()
+            resp = None
             try:
-                info = json.loads(resp)
+                resp = recv_frame(sock)
+                info = resp or {}
                 if info.get('status') == 'ok':
                     print(f"Job {info.get('job_id')} submitted")
                     if args.background:
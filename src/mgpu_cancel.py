@@ -2,7 +2,8 @@
 import sys
 import os
 import socket
-import json
+
+from mgpu_core.network.framing import send_frame, recv_frame
 
 def main():
     # Cancel a job by job ID
@@ -21,9 +22,10 @@ def main():
     try:
         # TCP connection (multi-node master server)
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         s.connect((master_host, master_port))
-        s.send(json.dumps(req).encode())
-        resp = json.loads(s.recv(4096).decode())
+        send_frame(s, req)
+        resp = recv_frame(s)
         
         if resp['status'] == 'ok':
             print(f'Job {job_id} cancelled successfully.')
@@ -126,6 +126,8 @@ def main():
         logger.error(f"Client error: {e}")
         print(f"Error: {e}")
         return 1
+    finally:
+        client.close()
 
 
 if __name__ == '__main__':
@@ -3,7 +3,7 @@ Multi-GPU Client for job submission and monitoring
 """
 
 import socket
-import json
+import select
 import time
 import sys
 import os
@@ -13,6 +13,7 @@ from typing import Dict, List, Optional, Any
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 from mgpu_core.models.job_models import MessageType
+from mgpu_core.network.framing import FrameStream
 from mgpu_core.network.network_manager import NetworkManager
 from mgpu_core.utils.logging_utils import setup_logger
 from mgpu_core.utils.system_utils import TimeoutConfig
@@ -27,6 +28,41 @@ class JobClient:
     def __init__(self, host: str = '127.0.0.1', port: int = 8080):
         self.host = host
         self.port = port
+        self._sock = None  # Kept open across requests; the master answers framed requests in a loop
+    
+    def _get_conn(self, timeout: Optional[float]) -> Optional[socket.socket]:
+        """Connection to the master, opened on first use and reused afterwards"""
+        if self._sock is None:
+            self._sock = NetworkManager.connect_to_server(self.host, self.port, timeout)
+        return self._sock
+    
+    def close(self):
+        """Close the reused connection, if any"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+    
+    def _request(self, request: Dict[str, Any], timeout: Optional[float] = 10.0) -> Optional[Dict[str, Any]]:
+        """Send one request over the reused connection and return the reply (None on failure)
+        
+        A connection the master has since closed fails on first use; that case reconnects once.
+        """
+        for attempt in range(2):
+            reused = self._sock is not None
+            sock = self._get_conn(timeout)
+            if not sock:
+                return None
+            if NetworkManager.send_json_message(sock, request, timeout):
+                response = NetworkManager.receive_json_message(sock, timeout)
+                if response is not None:
+                    return response
+            self.close()
+            if not reused:
+                return None
+        return None
     
     def submit_job(self, gpus: int, cmd: str, interactive: bool = False, 
                    node_gpu_ids: Optional[Dict[str, List[int]]] = None, 
@@ -63,7 +99,10 @@ class JobClient:
             if node_gpu_ids:
                 request['node_gpu_ids'] = node_gpu_ids
             
-            # Connect to server
+            if not interactive:
+                return self._handle_non_interactive_session(request, timeout_config)
+            
+            # Interactive sessions get their own connection; it carries the job's output stream
             sock = NetworkManager.connect_to_server(self.host, self.port, timeout_config['connection_timeout'])
             if not sock:
                 print(f"Failed to connect to server at {self.host}:{self.port}")
@@ -75,10 +114,7 @@ class JobClient:
                 sock.close()
                 return False
             
-            if interactive:
-                return self._handle_interactive_session(sock, timeout_config)
-            else:
-                return self._handle_non_interactive_session(sock, timeout_config)
+            return self._handle_interactive_session(sock, timeout_config)
                 
         except Exception as e:
             logger.error(f"Job submission error: {e}")
@@ -111,16 +147,14 @@ class JobClient:
             except:
                 pass
     
-    def _handle_non_interactive_session(self, sock: socket.socket, timeout_config: Dict[str, Any]) -> bool:
+    def _handle_non_interactive_session(self, request: Dict[str, Any], timeout_config: Dict[str, Any]) -> bool:
         """Handle non-interactive session"""
         try:
-            response = NetworkManager.receive_json_message(sock, timeout_config['connection_timeout'])
+            response = self._request(request, timeout_config['connection_timeout'])
             if not response:
                 print("No response from server")
                 return False
             
-            sock.close()
-            
             if response.get('status') == 'ok':
                 job_id = response['job_id']
                 print(f"Job submitted: {job_id}")
@@ -139,6 +173,7 @@ class JobClient:
         max_session_time = timeout_config['session_timeout']
         consecutive_timeouts = 0
         max_consecutive_timeouts = timeout_config['max_consecutive_timeouts']
+        stream = FrameStream(sock)
         
         try:
             while True:
@@ -147,36 +182,30 @@ class JobClient:
                     print(f"\nSession timed out after {max_session_time} seconds")
                     break
                 
-                # Set timeout for receiving data
+                # Wait up to a second for the next frame, then read it whole
                 try:
-                    sock.settimeout(1.0)
-                    data = sock.recv(8192)
-                    if not data:
+                    if not stream.pending() and not select.select([sock], [], [], 1.0)[0]:
+                        raise socket.timeout()
+                    sock.settimeout(None)
+                    msg = stream.recv()
+                    if msg is None:
                         print("\nConnection closed by server")
                         break
                     
                     # Reset timeout counter on successful data receive
                     consecutive_timeouts = 0
                     
-                    # Process each line separately
-                    lines = data.decode().strip().split('\n')
-                    for line in lines:
-                        if line.strip():
-                            try:
-                                msg = json.loads(line)
-                                if msg.get('type') == 'output':
-                                    print(msg.get('data', '').rstrip())
-                                elif msg.get('type') == 'completion':
-                                    print("=" * 50)
-                                    print(f"Job completed with exit code: {msg.get('exit_code')}")
-                                    return True
-                                elif msg.get('type') == 'error':
-                                    print(f"ERROR: {msg.get('message')}")
-                                    return False
-                                else:
-                                    print(f"Response: {msg}")
-                            except json.JSONDecodeError:
-                                print(f"Invalid JSON: {line}")
+                    if msg.get('type') == 'output':
+                        print(msg.get('data', '').rstrip())
+                    elif msg.get('type') == 'completion':
+                        print("=" * 50)
+                        print(f"Job completed with exit code: {msg.get('exit_code')}")
+                        return True
+                    elif msg.get('type') == 'error':
+                        print(f"ERROR: {msg.get('message')}")
+                        return False
+                    else:
+                        print(f"Response: {msg}")
                                         
                 except socket.timeout:
                     consecutive_timeouts += 1
@@ -231,27 +260,16 @@ class JobClient:
                     'from_line': shown_lines
                 }
                 
-                sock = NetworkManager.connect_to_server(self.host, self.port, timeout_config['connection_timeout'])
-                if not sock:
+                # Every poll goes over the same connection
+                response = self._request(request, timeout_config['connection_timeout'])
+                if response is None:
                     consecutive_failures += 1
                     if consecutive_failures >= max_consecutive_failures:
-                        print("Cannot connect to server, stopping monitoring")
-                        break
-                    time.sleep(5.0)
-                    continue
-                
-                if not NetworkManager.send_json_message(sock, request, timeout_config['connection_timeout']):
-                    sock.close()
-                    consecutive_failures += 1
-                    if consecutive_failures >= max_consecutive_failures:
-                        print("Failed to send request, stopping monitoring")
+                        print("Cannot reach server, stopping monitoring")
                         break
                     time.sleep(3.0)
                     continue
                 
-                response = NetworkManager.receive_json_message(sock, timeout_config['connection_timeout'])
-                sock.close()
-                
                 if response and response.get('status') == 'ok':
                     # Reset failure counter on successful response
                     consecutive_failures = 0
@@ -306,18 +324,7 @@ class JobClient:
         try:
             request = {'cmd': MessageType.QUEUE}
             
-            sock = NetworkManager.connect_to_server(self.host, self.port, 10.0)
-            if not sock:
-                print(f"Failed to connect to server at {self.host}:{self.port}")
-                return False
-            
-            if not NetworkManager.send_json_message(sock, request, 10.0):
-                print("Failed to send queue request")
-                sock.close()
-                return False
-            
-            response = NetworkManager.receive_json_message(sock, 10.0)
-            sock.close()
+            response = self._request(request, 10.0)
             
             if response and response.get('status') == 'ok':
                 queued = response.get('queue', [])
@@ -351,19 +358,11 @@ class JobClient:
         try:
             request = {'cmd': MessageType.CANCEL, 'job_id': job_id}
             
-            sock = NetworkManager.connect_to_server(self.host, self.port, 10.0)
-            if not sock:
-                print(f"Failed to connect to server at {self.host}:{self.port}")
-                return False
-            
-            if not NetworkManager.send_json_message(sock, request, 10.0):
-                print("Failed to send cancel request")
-                sock.close()
+            response = self._request(request, 10.0)
+            if response is None:
+                print(f"Failed to reach server at {self.host}:{self.port}")
                 return False
             
-            response = NetworkManager.receive_json_message(sock, 10.0)
-            sock.close()
-            
             print(f"Cancel result: {response}")
             return bool(response and response.get('status') == 'ok')
             
@@ -2,13 +2,18 @@
 Core data models for Multi-GPU Scheduler
 """
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from typing import Dict, List, Optional, Any
+import sys
 import time
 import subprocess
 
 
-@dataclass
+# Slotted dataclasses need Python 3.10; older interpreters keep the per-instance __dict__
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class SimpleJob:
     """Job representation with all necessary attributes"""
     id: str
@@ -28,26 +33,17 @@ class SimpleJob:
 
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
-        return {
-            'id': self.id,
-            'user': self.user,
-            'cmd': self.cmd,
-            'gpus_needed': self.gpus_needed,
-            'node_gpu_ids': self.node_gpu_ids,
-            'priority': self.priority,
-            'status': self.status,
-            'interactive': self.interactive,
-            'start_time': self.start_time,
-            'end_time': self.end_time,
-            'exit_code': self.exit_code,
-            'assigned_node': self.assigned_node,
-            'assigned_gpus': self.assigned_gpus,
-            'retry_count': self.retry_count
-        }
+        return {name: getattr(self, name) for name in _JOB_FIELDS}
+
+
+_JOB_FIELDS = tuple(f.name for f in fields(SimpleJob))
 
 
 class NodeInfo:
     """Node information container"""
+    __slots__ = ('node_id', 'host', 'port', 'gpu_count', 'available_gpus',
+                 'running_jobs', 'last_heartbeat', 'failure_count')
+
     def __init__(self, node_id: str, host: str, port: int, gpu_count: int):
         self.node_id = node_id
         self.host = host
@@ -76,6 +72,8 @@ class MessageType:
     QUEUE = 'queue'
     CANCEL = 'cancel'
     GET_JOB_OUTPUT = 'get_job_output'
+    SUBSCRIBE = 'subscribe'
+    SUBSCRIBE_QUEUE = 'subscribe_queue'
     NODE_REGISTER = 'node_register'
     NODE_STATUS = 'node_status'
     JOB_COMPLETE = 'job_complete'
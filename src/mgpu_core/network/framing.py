@@ -0,0 +1,323 @@
+"""
+Length-prefixed message framing for Multi-GPU Scheduler
+
+Each frame is a 4-byte big-endian payload length followed by the encoded
+message. Peers that still send a bare JSON object (first byte '{') are
+detected by recv_message and answered in the same unframed format.
+
+Frame payloads are JSON by default. Setting MGPU_WIRE_CODEC=msgpack makes
+this process send msgpack payloads when msgspec or the msgpack package is
+installed (msgspec is preferred; both produce the same bytes).
+The first payload byte tells the two apart (JSON starts with '{' or '[',
+a msgpack map never does), so it doubles as the content type: decode
+sniffs it, and replies are packed in the codec the request arrived in, so
+a peer only ever receives msgpack after sending some. That lets the
+setting be rolled out node by node.
+
+JSON goes through orjson when it is installed and falls back to the
+standard library otherwise. orjson is optional: requirements.txt installs
+it for speed, and both paths produce the same messages. Dataclass
+instances (SimpleJob) may be passed as-is and go out as a map of their
+fields; orjson and msgspec do that natively, without building a dict per
+object.
+"""
+
+import os
+import json
+import socket
+import struct
+import threading
+import functools
+from dataclasses import fields, is_dataclass
+from importlib.util import find_spec
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = int(os.environ.get('MGPU_MAX_FRAME_BYTES', 16 * 1024 * 1024))  # Larger frames are rejected
+LEGACY_RECV_BYTES = 65536
+RECV_BUFFER_BYTES = 65536  # Initial size of each thread's reusable receive buffer
+STREAM_RECV_BYTES = 65536  # Per recv when reading an output stream; request/response reads stay exact
+STREAM_SOCKET_BUFFER = 1 << 20  # SO_RCVBUF asked for on output-stream sockets
+HAVE_MSGPACK = find_spec('msgspec') is not None or find_spec('msgpack') is not None
+USE_MSGPACK = os.environ.get('MGPU_WIRE_CODEC', 'json').lower() == 'msgpack' and HAVE_MSGPACK
+
+
+def _encode_default(obj):
+    """Fallback for encoders without native dataclass support: the instance's fields as a dict"""
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+@functools.lru_cache(maxsize=None)
+def _msgpack_codec():
+    """(pack, unpack) for msgpack, imported on first use; short-lived CLI processes only ever see JSON"""
+    try:
+        import msgspec
+    except ImportError:
+        import msgpack
+        return (functools.partial(msgpack.packb, use_bin_type=True, default=_encode_default),
+                functools.partial(msgpack.unpackb, raw=False))
+    # Reused for every message; building them is the expensive part
+    return msgspec.msgpack.Encoder().encode, msgspec.msgpack.Decoder().decode
+
+
+def encode_json(message: Any) -> bytes:
+    """Encode a message as JSON (legacy wire format)"""
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(message, default=_encode_default).encode()
+
+
+def decode_json(data) -> Any:
+    """Decode a JSON payload; raises json.JSONDecodeError on bad input"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+def encode(message: Any, binary: Optional[bool] = None) -> bytes:
+    """Encode a frame payload as msgpack if binary (default: the configured codec), else JSON"""
+    if not (USE_MSGPACK if binary is None else (binary and HAVE_MSGPACK)):
+        return encode_json(message)
+    return _msgpack_codec()[0](message)
+
+
+def is_msgpack(data) -> bool:
+    """Whether a frame payload is msgpack rather than JSON"""
+    return HAVE_MSGPACK and data[:1] not in (b'{', b'[')
+
+
+def decode(data) -> Any:
+    """Decode a JSON or msgpack payload"""
+    if not is_msgpack(data):
+        return decode_json(data)
+    return _msgpack_codec()[1](data)
+
+
+_tls = threading.local()
+
+
+def _recv_buffer(size: int) -> memoryview:
+    """View of this thread's reusable receive buffer; valid until its next receive"""
+    buf = getattr(_tls, 'buf', None)
+    if buf is None or len(buf) < size:
+        buf = _tls.buf = bytearray(max(size, RECV_BUFFER_BYTES))
+    return memoryview(buf)[:size]
+
+
+def recv_into_exact(sock: socket.socket, view: memoryview, got: int = 0):
+    """Fill view from sock; the first got bytes are already there"""
+    size = len(view)
+    while got < size:
+        n = sock.recv_into(view[got:])
+        if not n:
+            raise ConnectionError(f"Connection closed after {got} of {size} bytes")
+        got += n
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytearray:
+    """Read exactly size bytes from sock into a new buffer"""
+    buf = bytearray(size)
+    recv_into_exact(sock, memoryview(buf))
+    return buf
+
+
+def frame_payload(payload: bytes) -> bytes:
+    """Length-prefix an already encoded payload"""
+    return HEADER.pack(len(payload)) + payload
+
+
+def pack_frame(message: Any, binary: Optional[bool] = None) -> bytes:
+    """Encode one message as a length-prefixed frame"""
+    return frame_payload(encode(message, binary))
+
+
+def send_frame(sock: socket.socket, message: Any, binary: Optional[bool] = None):
+    """Send one length-prefixed message"""
+    sock.sendall(pack_frame(message, binary))
+
+
+def _recv_payload(sock: socket.socket) -> Optional[memoryview]:
+    """Receive one frame's payload into the thread's buffer, or None if the peer closed cleanly"""
+    header = _recv_buffer(HEADER.size)
+    got = sock.recv_into(header)
+    if not got:
+        return None
+    recv_into_exact(sock, header, got)
+    size, = HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds limit of {MAX_FRAME_BYTES}")
+    payload = _recv_buffer(size)  # Reuses the header's buffer; size was already taken out
+    recv_into_exact(sock, payload)
+    return payload
+
+
+def recv_frame(sock: socket.socket) -> Optional[Any]:
+    """Receive one length-prefixed message, or None if the peer closed cleanly"""
+    payload = _recv_payload(sock)
+    return None if payload is None else decode(payload)
+
+
+def recv_message(sock: socket.socket) -> Tuple[Optional[Any], bool, bool]:
+    """Receive a framed or legacy bare-JSON message; returns (message, framed, binary)"""
+    first = sock.recv(1, socket.MSG_PEEK)
+    if not first:
+        return None, False, False
+    if first == b'{':
+        # Legacy peer: one JSON object per connection, no length prefix
+        return recv_legacy(sock), False, False
+    payload = _recv_payload(sock)
+    if payload is None:
+        return None, True, False
+    return decode(payload), True, is_msgpack(payload)
+
+
+def split_message(buf: bytearray, eof: bool = False) -> Optional[Tuple[Any, bool, bool]]:
+    """Remove one complete framed or bare-JSON message from the front of buf
+
+    Returns (message, framed, binary), or None while buf holds only part of one. A bare
+    JSON object has to be all of buf; legacy peers send one per connection. Like
+    recv_legacy, bare JSON that doesn't parse yet is taken as incomplete; it raises only
+    once eof says the peer has closed, or past MAX_FRAME_BYTES.
+    """
+    if not buf:
+        return None
+    if buf[:1] == b'{':
+        try:
+            message = decode_json(buf)
+        except json.JSONDecodeError:
+            if eof or len(buf) > MAX_FRAME_BYTES:
+                raise
+            return None
+        buf.clear()
+        return message, False, False
+    frame = split_frame(buf)
+    return None if frame is None else (frame[0], True, frame[1])
+
+
+def split_frame(buf: bytearray) -> Optional[Tuple[Any, bool]]:
+    """Remove one complete length-prefixed frame from the front of buf
+
+    Returns (message, binary), or None while buf holds only part of one.
+    """
+    if len(buf) < HEADER.size:
+        return None
+    size, = HEADER.unpack_from(buf)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds limit of {MAX_FRAME_BYTES}")
+    end = HEADER.size + size
+    if len(buf) < end:
+        return None
+    payload = bytes(buf[HEADER.size:end])
+    del buf[:end]
+    return decode(payload), is_msgpack(payload)
+
+
+class FrameStream:
+    """Reads a long run of frames (interactive job output) with few, large recvs
+
+    recv_frame makes two exact reads per frame, which is right for one reply but means
+    two syscalls per output line. This reads up to STREAM_RECV_BYTES at a time and splits
+    frames from its buffer. Bytes past the last complete frame stay in that buffer, so
+    once a socket is read through a FrameStream, don't go back to recv_frame on it.
+    """
+
+    def __init__(self, sock: socket.socket, recv_bytes: int = STREAM_RECV_BYTES):
+        self.sock = sock
+        self.buf = bytearray()
+        self.chunk = memoryview(bytearray(recv_bytes))
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, STREAM_SOCKET_BUFFER)
+        except OSError:
+            pass  # Capped by net.core.rmem_max; the default buffer still works
+
+    def pending(self) -> bool:
+        """Whether a complete frame may already be buffered (select() would not report it)"""
+        return len(self.buf) >= HEADER.size
+
+    def recv(self) -> Optional[Any]:
+        """Next message, or None if the peer closed cleanly"""
+        while True:
+            frame = split_frame(self.buf)
+            if frame is not None:
+                return frame[0]
+            n = self.sock.recv_into(self.chunk)
+            if not n:
+                if self.buf:
+                    raise ConnectionError(f"Connection closed with {len(self.buf)} bytes of a frame unread")
+                return None
+            self.buf += self.chunk[:n]
+
+
+def recv_legacy(sock: socket.socket) -> Optional[Any]:
+    """Receive one bare JSON object, reading until it parses rather than trusting a single recv
+
+    A recv can stop anywhere, even inside a literal or a number, and the decoder's error
+    position doesn't tell that apart from bad input. So any decode error means "read more"
+    until the peer closes or the object outgrows MAX_FRAME_BYTES.
+    """
+    data = bytearray()
+    view = _recv_buffer(LEGACY_RECV_BYTES)
+    while True:
+        n = sock.recv_into(view)
+        if not n:
+            return decode_json(data) if data else None
+        data += view[:n]  # Straight from the reused buffer; no bytes object per recv
+        try:
+            return decode_json(data)
+        except json.JSONDecodeError:
+            if len(data) > MAX_FRAME_BYTES:
+                raise
+
+
+def send_message(sock: socket.socket, message: Any, framed: bool = True, binary: Optional[bool] = None):
+    """Send a message in the same format the peer used"""
+    sock.sendall(pack_message(message, framed, binary))
+
+
+def pack_message(message: Any, framed: bool = True, binary: Optional[bool] = None) -> bytes:
+    """Wire bytes for a message in the same format (and codec) the peer used"""
+    return pack_frame(message, binary) if framed else encode_json(message)
+
+
+def encode_stream(message: Any, framed: bool, binary: Optional[bool] = None) -> bytes:
+    """Wire bytes for one streaming message (a frame, or newline-delimited JSON for legacy clients)"""
+    if framed:
+        return pack_frame(message, binary)
+    return encode_json(message) + b'\n'
+
+
+async def read_message(reader, legacy_timeout: float = 10.0) -> Tuple[Optional[Any], bool, bool]:
+    """asyncio counterpart of recv_message for an asyncio.StreamReader
+
+    Also reports whether the payload was msgpack, so the reply can use the same codec.
+    """
+    import asyncio  # Only the master's event loop reads this way; keep it off the CLI import path
+
+    first = await reader.read(1)
+    if not first:
+        return None, False, False
+    if first == b'{':
+        # Legacy peer: read until the buffered bytes form one complete JSON object
+        data = bytearray(first)
+        while True:
+            chunk = await asyncio.wait_for(reader.read(LEGACY_RECV_BYTES), legacy_timeout)
+            data += chunk
+            try:
+                return decode_json(data), False, False
+            except json.JSONDecodeError:
+                if not chunk or len(data) > MAX_FRAME_BYTES:
+                    raise
+    header = first + await reader.readexactly(HEADER.size - 1)
+    size, = HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds limit of {MAX_FRAME_BYTES}")
+    payload = await reader.readexactly(size)
+    return decode(payload), True, is_msgpack(payload)
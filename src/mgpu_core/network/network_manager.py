@@ -3,10 +3,11 @@ Network utilities for Multi-GPU Scheduler
 """
 
 import socket
-import json
 import logging
 from typing import Dict, Optional, Any
 
+from mgpu_core.network.framing import send_frame, recv_frame
+
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,7 @@ class NetworkManager:
         """Create connection to server with timeout"""
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Requests are small; don't wait on Nagle
             if timeout is not None:
                 sock.settimeout(timeout)
             sock.connect((host, port))
@@ -29,12 +31,11 @@ class NetworkManager:
     
     @staticmethod
     def send_json_message(sock: socket.socket, message: Dict[str, Any], timeout: Optional[float] = 10.0) -> bool:
-        """Send JSON message with timeout"""
+        """Send one length-prefixed message with timeout"""
         try:
             if timeout is not None:
                 sock.settimeout(timeout)
-            data = json.dumps(message).encode()
-            sock.send(data)
+            send_frame(sock, message)
             return True
         except Exception as e:
             logger.error(f"Failed to send message: {e}")
@@ -42,14 +43,11 @@ class NetworkManager:
     
     @staticmethod
     def receive_json_message(sock: socket.socket, timeout: Optional[float] = 10.0) -> Optional[Dict[str, Any]]:
-        """Receive JSON message with timeout"""
+        """Receive one length-prefixed message with timeout"""
         try:
             if timeout is not None:
                 sock.settimeout(timeout)
-            data = sock.recv(8192).decode()
-            if not data:
-                return None
-            return json.loads(data)
+            return recv_frame(sock)
         except Exception as e:
             logger.error(f"Failed to receive message: {e}")
             return None
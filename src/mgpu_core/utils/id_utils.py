@@ -0,0 +1,11 @@
+"""
+Job ID utilities for Multi-GPU Scheduler
+"""
+
+import os
+import base64
+
+
+def generate_job_id() -> str:
+    """Generate a unique 8-character job ID (40 random bits, base32 A-Z2-7)"""
+    return base64.b32encode(os.urandom(5)).decode('ascii')
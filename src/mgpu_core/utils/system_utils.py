@@ -5,6 +5,7 @@ Utility functions for Multi-GPU Scheduler
 import subprocess
 import socket
 import logging
+import functools
 from typing import List, Dict, Any, Optional
 
 
@@ -56,6 +57,23 @@ class GPUManager:
 class IPManager:
     """IP address detection and management"""
     
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def primary_ip() -> str:
+        """Address of the interface that carries the default route (no subprocess, no packets sent)
+        
+        Computed once per process; "" when there is no route.
+        """
+        test_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # connect() on a UDP socket only picks the route and source address
+            test_sock.connect(("10.255.255.255", 1))
+            return test_sock.getsockname()[0]
+        except OSError:
+            return ""
+        finally:
+            test_sock.close()
+    
     @staticmethod
     def get_actual_ip_address(master_host: str, master_port: int) -> str:
         """Get actual IP address using multiple detection methods"""
@@ -72,30 +90,12 @@ class IPManager:
         except Exception as e:
             logger.debug(f"Method 1 (master connection) failed: {e}")
         
-        # Method 2: Use hostname -I command
-        try:
-            result = subprocess.run(['hostname', '-I'], capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                ips = result.stdout.strip().split()
-                for ip in ips:
-                    if ip and not ip.startswith("127."):
-                        logger.info(f"IP detected via hostname -I: {ip}")
-                        return ip
-        except Exception as e:
-            logger.debug(f"Method 2 (hostname -I) failed: {e}")
-        
-        # Method 3: Connect to external IP to find interface IP
-        try:
-            test_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            test_sock.settimeout(5.0)
-            test_sock.connect(("8.8.8.8", 80))
-            actual_ip = test_sock.getsockname()[0]
-            test_sock.close()
-            if actual_ip and actual_ip != "127.0.0.1":
-                logger.info(f"IP detected via external connection: {actual_ip}")
-                return actual_ip
-        except Exception as e:
-            logger.debug(f"Method 3 (external connection) failed: {e}")
+        # Method 2: Source address of the default route
+        actual_ip = IPManager.primary_ip()
+        if actual_ip and not actual_ip.startswith("127."):
+            logger.info(f"IP detected via default route: {actual_ip}")
+            return actual_ip
+        logger.debug("Method 2 (default route) found no address")
         
         # Fallback to configured host or localhost
         logger.warning("Could not detect actual IP, using fallback")
@@ -5,11 +5,11 @@ Node Agent for Multi-GPU Scheduler
 import socket
 import subprocess
 import threading
-import json
 import time
 import os
 import sys
 import signal
+import shlex
 import psutil
 from typing import Dict, List, Optional, Any
 
@@ -18,6 +18,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'
 
 from mgpu_core.models.job_models import JobProcess, MessageType
 from mgpu_core.network.network_manager import NetworkManager
+from mgpu_core.network.framing import recv_message, send_message
 from mgpu_core.utils.logging_utils import setup_logger
 from mgpu_core.utils.system_utils import GPUManager, IPManager
 
@@ -42,6 +43,7 @@ class NodeAgent:
         self.lock = threading.RLock()
         self.running = False
         self.server_socket = None
+        self.actual_ip = None  # Detected at registration, exported to jobs as MGPU_NODE_IP
     
     def get_actual_ip_address(self) -> str:
         """Get actual IP address using multiple detection methods"""
@@ -131,7 +133,7 @@ class NodeAgent:
         """Register this node with the master server"""
         try:
             # Get actual IP address
-            actual_ip = self.get_actual_ip_address()
+            actual_ip = self.actual_ip = self.get_actual_ip_address()
             
             # Get GPU information
             gpu_info = GPUManager.get_gpu_info(self.gpu_count)
@@ -196,26 +198,25 @@ class NodeAgent:
                 for gpu in gpus:
                     self.available_gpus.remove(gpu)
                 
-                # Set environment
-                env = os.environ.copy()
-                if gpus:
-                    env['CUDA_VISIBLE_DEVICES'] = ','.join(map(str, gpus))
-                else:
-                    env['CUDA_VISIBLE_DEVICES'] = ''
+                # The job inherits the agent's environment as is; its two extra variables are
+                # exported by the shell rather than by copying os.environ for every job
+                cuda_devices = ','.join(map(str, gpus))
+                node_ip = self.actual_ip or IPManager.primary_ip()
+                exports = f"export CUDA_VISIBLE_DEVICES={shlex.quote(cuda_devices)} MGPU_NODE_IP={shlex.quote(node_ip)}\n"
                 
                 # Start process with output capture for all jobs
-                # Create new process group for proper cleanup
+                # New session (and process group) for proper cleanup; unlike preexec_fn,
+                # start_new_session keeps Popen on its fast spawn path
                 process = subprocess.Popen(
-                    command,
-                    shell=True,
-                    env=env,
+                    ['/bin/bash', '-c', exports + command],
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
                     stdin=subprocess.PIPE if interactive else None,
                     bufsize=1,
                     universal_newlines=True,
                     text=True,
-                    preexec_fn=os.setsid  # Create new process group
+                    close_fds=True,
+                    start_new_session=True
                 )
                 
                 # Store job
@@ -409,12 +410,12 @@ class NodeAgent:
     
     def handle_client(self, client_socket: socket.socket, address):
         """Handle client connection"""
+        framed = binary = False
         try:
-            data = client_socket.recv(8192).decode()
-            if not data:
+            request, framed, binary = recv_message(client_socket)
+            if request is None:
                 return
             
-            request = json.loads(data)
             cmd = request.get('cmd')
             
             if cmd == MessageType.RUN:
@@ -429,13 +430,13 @@ class NodeAgent:
             else:
                 response = {'status': 'error', 'message': f'Unknown command: {cmd}'}
             
-            client_socket.send(json.dumps(response).encode())
+            send_message(client_socket, response, framed, binary)
             
         except Exception as e:
             logger.error(f"Client handler error: {e}")
             try:
                 error_response = {'status': 'error', 'message': str(e)}
-                client_socket.send(json.dumps(error_response).encode())
+                send_message(client_socket, error_response, framed, binary)
             except:
                 pass
         finally:
@@ -452,7 +453,7 @@ class NodeAgent:
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(socket.SOMAXCONN)  # Absorb reconnect bursts
         
         logger.info(f"Node Agent {self.node_id} started on {self.host}:{self.port}")
         logger.info(f"Master server: {self.master_host}:{self.master_port}")
@@ -474,6 +475,7 @@ class NodeAgent:
             while self.running:
                 try:
                     client_socket, address = self.server_socket.accept()
+                    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                     logger.debug(f"Connection from {address}")
                     
                     # Handle each client in a separate thread
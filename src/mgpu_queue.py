@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 import os
 import socket
-import json
+
+from mgpu_core.network.framing import send_frame, recv_frame
 
 def main():
     # Master server connection information
@@ -14,9 +15,10 @@ def main():
     try:
         # TCP connection (multi-node master server)
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         s.connect((master_host, master_port))
-        s.send(json.dumps(req).encode())
-        resp = json.loads(s.recv(4096).decode())
+        send_frame(s, req)
+        resp = recv_frame(s)
         
         if resp['status'] == 'ok':
             print('--- Running Jobs ---')
@@ -1,36 +1,64 @@
 #!/usr/bin/env python3
 import os
+import pwd
 import socket
 import threading
 import subprocess
-import uuid
-import json
 import time
-import random
-import string
+import signal
+import shlex
 import argparse
-from collections import deque
+import bisect
+import functools
+import itertools
 import psutil
 import select
+import selectors
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from mgpu_core.network.framing import encode_stream, pack_message, send_message, split_message
+from mgpu_core.utils.id_utils import generate_job_id
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
 
 SOCKET_PATH = '/tmp/mgpu_scheduler.sock'
 MAX_JOB_TIME = 600  # Maximum occupation time (seconds), can be passed as argument in main if needed
+IDLE_RECHECK_INTERVAL = 30  # Seconds the scheduler sleeps when nothing is queued and nothing happens
+QUEUED_RECHECK_INTERVAL = 2  # Queued jobs may wait on GPU memory freed outside the scheduler
+HANDLER_THREADS = 32  # Worker threads answering complete requests
+JOB_PATH = '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'  # sudo's default secure_path
 
 class Job:
-    def __init__(self, user, gpus, mem, cmd, time_limit=None, priority=0, gpu_ids=None, env_setup_cmd=None, client_socket=None):
-        self.id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    def __init__(self, user, gpus, mem, cmd, time_limit=None, priority=0, gpu_ids=None, env_setup_cmd=None, client_socket=None,
+                 client_framed=False, client_binary=False):
+        self.id = generate_job_id()
         self.user = user
         self.gpus = gpus
         self.mem = mem  # If None, server will auto-allocate
-        self.cmd = cmd
+        # A string (or a one-item list) is a shell command line, as mgpu_srun sends; a longer
+        # list is an argv, exec'd without a shell for clients that ask for that explicitly
+        if isinstance(cmd, list) and len(cmd) > 1:
+            self.argv = cmd
+            self.cmd = shlex.join(cmd)  # Shown in queue listings; exact quoting for the sudo path
+        else:
+            self.argv = None
+            self.cmd = cmd[0] if isinstance(cmd, list) else cmd
         self.status = 'queued'
+        self.error_msg = None  # Set when the job is rejected (status 'error')
         self.proc = None
         self.start_time = None  # Job execution start time
         self.time_limit = time_limit  # Per-user time limit (seconds)
         self.priority = priority
         self.gpu_ids = gpu_ids  # User-requested specific GPU IDs
+        self.assigned_gpus = []  # GPU indexes the job was started on
         self.env_setup_cmd = env_setup_cmd  # User-requested environment setup command
         self.client_socket = client_socket  # Socket to stream output back to user
+        self.client_framed = client_framed  # Stream in the wire format the client submitted with
+        self.client_binary = client_binary
 
     def to_dict(self):
         return {
@@ -41,84 +69,270 @@ class Job:
             'cmd': self.cmd,
             'status': self.status,
             'gpu_ids': self.gpu_ids,
-            'env_setup_cmd': self.env_setup_cmd
+            'env_setup_cmd': self.env_setup_cmd,
+            'error_msg': self.error_msg,
+            'assigned_gpus': self.assigned_gpus
         }
 
-def get_available_gpus():
+GPU_QUERY_TTL = 0.25  # Seconds a free-memory reading is reused before querying again
+_gpu_cache = {'t': float('-inf'), 'v': []}
+_gpu_lock = threading.Lock()
+_nvml_handles = None
+
+def _nvml_free_memory():
+    """Free memory (MB) per GPU through NVML; the library is initialized once per process"""
+    global _nvml_handles
+    if _nvml_handles is None:
+        pynvml.nvmlInit()
+        _nvml_handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+    return [pynvml.nvmlDeviceGetMemoryInfo(h).free // (1024 * 1024) for h in _nvml_handles]
+
+def query_gpus():
+    if pynvml is not None:
+        try:
+            return _nvml_free_memory()
+        except pynvml.NVMLError:
+            pass  # No usable driver through NVML; nvidia-smi reports the same
     try:
         out = subprocess.check_output(['nvidia-smi', '--query-gpu=memory.free', '--format=csv,noheader,nounits'])
-        mems = [int(x) for x in out.decode().strip().split('\n')]
-        return mems
+        # One value per line; int() parses the bytes directly, no decode/strip pass
+        return [int(x) for x in out.split()]
     except Exception:
         return []
 
+def get_available_gpus():
+    """Free memory (MB) per GPU, reusing a reading younger than GPU_QUERY_TTL
+
+    The returned list is shared between callers and must not be modified.
+    """
+    with _gpu_lock:
+        if time.monotonic() - _gpu_cache['t'] >= GPU_QUERY_TTL:
+            _gpu_cache['v'] = query_gpus()
+            _gpu_cache['t'] = time.monotonic()
+        return _gpu_cache['v']
+
+def gpu_order(available, used, busy):
+    """Idle GPUs, then busy ones (bit i of busy set), least free memory first within each group
+
+    Returned as (indexes, free memory) per group so fitting_gpus can bisect.
+    """
+    groups = []
+    for idle in (True, False):
+        idxs = sorted((i for i in range(len(available)) if (not busy >> i & 1) == idle), key=lambda i: available[i] - used[i])
+        groups.append((idxs, [available[i] - used[i] for i in idxs]))
+    return groups
+
+def fitting_gpus(order, mem):
+    """GPU indexes from gpu_order with at least mem MB free, in preference order
+
+    Best fit: within each group the tightest fit comes first, so small jobs leave the
+    GPUs with the most free memory to the large ones behind them.
+    """
+    return [i for idxs, free in order for i in idxs[bisect.bisect_left(free, mem):]]
+
+@functools.lru_cache(maxsize=1024)
+def home_for(user):
+    """Home directory of user, resolved through NSS once per process"""
+    try:
+        return pwd.getpwnam(user).pw_dir
+    except KeyError:
+        return os.path.expanduser(f'~{user}')
+
+@functools.lru_cache(maxsize=1024)
+def user_ids(user):
+    """(uid, gid, supplementary groups) of user, resolved once per process"""
+    entry = pwd.getpwnam(user)
+    return entry.pw_uid, entry.pw_gid, tuple(os.getgrouplist(user, entry.pw_gid))
+
+@functools.lru_cache(maxsize=1024)
+def shell_for(user):
+    """Login shell of user, resolved once per process"""
+    try:
+        return pwd.getpwnam(user).pw_shell or '/bin/sh'
+    except KeyError:
+        return '/bin/sh'
+
+def job_environment(user, home_dir, **extra):
+    """Environment of a job started without sudo: what sudo's env_reset would leave, plus extra
+
+    Nothing else is inherited from the server, which runs as root.
+    """
+    env = {'PATH': JOB_PATH, 'HOME': home_dir, 'USER': user, 'LOGNAME': user, 'SHELL': shell_for(user)}
+    if 'LANG' in os.environ:
+        env['LANG'] = os.environ['LANG']
+    env.update(extra)
+    return env
+
+def spawn_job(job, gpu_idxs, **popen_kwargs):
+    """Start job's command as its user from the user's home directory, in its own session
+
+    Run as root (or as the user itself), this is one fork/exec with privileges dropped by
+    Popen: of the job's argv when it has one, else of /bin/sh. Jobs with an env_setup_cmd, and any other server, keep sudo and a
+    login shell, since the setup command may rely on bash or the user's profile.
+    """
+    home_dir = home_for(job.user)
+    cuda_devices = ','.join(str(i) for i in gpu_idxs)
+    euid = os.geteuid()
+    try:
+        uid, gid, groups = user_ids(job.user)
+    except KeyError:
+        uid = None  # Unknown to NSS; sudo reports it
+    if job.env_setup_cmd or uid is None or euid not in (0, uid):
+        env_setup = f"{job.env_setup_cmd} && " if job.env_setup_cmd else ''
+        cmd = f"cd {home_dir} && {env_setup}PYTHONUNBUFFERED=1 CUDA_VISIBLE_DEVICES={cuda_devices} {job.cmd}"
+        return subprocess.Popen(['sudo', '-u', job.user, 'bash', '-lc', cmd], start_new_session=True, **popen_kwargs)
+    # Already the target user needs no credential change (and non-root can't setgroups)
+    credentials = {} if euid == uid else {'user': uid, 'group': gid, 'extra_groups': list(groups)}
+    env = job_environment(job.user, home_dir, PYTHONUNBUFFERED='1', CUDA_VISIBLE_DEVICES=cuda_devices)
+    return subprocess.Popen(job.argv or ['/bin/sh', '-c', job.cmd], cwd=home_dir, env=env, start_new_session=True,
+                            **credentials, **popen_kwargs)
+
 class Scheduler:
     def __init__(self):
-        self.job_queue = deque()
+        # (-priority, seq, job) kept sorted, so a pass walks it in order without sorting;
+        # entries whose job is no longer in jobs_by_id are tombstones left by start or cancel
+        self.job_queue = []
+        self.jobs_by_id = {}  # Queued jobs only
+        self.seq = itertools.count()
         self.running_jobs = {}
+        self.exited = []  # Ids of running jobs whose process has exited, drained by reap_jobs
         self.lock = threading.Lock()
+        self.cv = threading.Condition(self.lock)
+        self.work_pending = False  # Set by wake() so a notify before wait() isn't lost
+
+    def wake(self):
+        """Ask the scheduler thread to run a pass now"""
+        with self.cv:
+            self.work_pending = True
+            self.cv.notify()
+
+    def wait_for_work(self, max_job_time=None):
+        """Block until submit/cancel/job exit wakes the scheduler, the recheck interval passes,
+        or the next running job reaches its time limit"""
+        with self.cv:
+            if not self.work_pending:
+                timeout = QUEUED_RECHECK_INTERVAL if self.jobs_by_id else IDLE_RECHECK_INTERVAL
+                deadlines = [d for d in (self._deadline(job, max_job_time) for job in self.running_jobs.values()) if d is not None]
+                if deadlines:
+                    timeout = max(0, min(timeout, min(deadlines) - time.time()))
+                self.cv.wait(timeout)
+            self.work_pending = False
+
+    @staticmethod
+    def _deadline(job, max_job_time=None):
+        """When a running job must be stopped: the job's own time limit or the server-wide one, whichever is shorter"""
+        limits = [t for t in (job.time_limit, max_job_time) if t]
+        if not limits or job.start_time is None:
+            return None
+        return job.start_time + min(limits)
+
+    def expire_jobs(self, max_job_time=None):
+        """Kill running jobs that are past their time limit"""
+        now = time.time()
+        with self.lock:
+            expired = []
+            for job in self.running_jobs.values():
+                deadline = self._deadline(job, max_job_time)
+                if deadline is not None and deadline <= now:
+                    expired.append(job)
+            for job in expired:
+                del self.running_jobs[job.id]
+        # Kill outside the lock, as cancel_job does
+        for job in expired:
+            print(f"[INFO] Job {job.id} exceeded its time limit; killing it")
+            try:
+                self._kill_proc_tree(job.proc.pid)
+            except Exception as e:
+                print(f"[DEBUG] Failed to kill proc tree: {e}")
+
+    def _watch_job(self, job):
+        """Record the job's exit and wake the scheduler so its GPUs are reused right away"""
+        job.proc.wait()
+        with self.cv:
+            self.exited.append(job.id)
+            self.work_pending = True
+            self.cv.notify()
 
     def submit_job(self, job):
         with self.lock:
-            self.job_queue.append(job)
+            bisect.insort(self.job_queue, (-job.priority, next(self.seq), job))
+            self.jobs_by_id[job.id] = job
+            self.work_pending = True
+            self.cv.notify()
             return job.id
 
+    def _is_queued(self, job):
+        return self.jobs_by_id.get(job.id) is job
+
+    def _queued_jobs(self):
+        """Live queued jobs in scheduling order (highest priority, then oldest); caller holds self.lock
+
+        A generator, so a dispatch pass builds no snapshot; the queue must not change while it is consumed.
+        """
+        return (job for _, _, job in self.job_queue if self._is_queued(job))
+
+    def _prune_queue(self):
+        """Drop tombstones from the front, and filter them all out once they outnumber live entries"""
+        head = 0
+        while head < len(self.job_queue) and not self._is_queued(self.job_queue[head][2]):
+            head += 1
+        del self.job_queue[:head]
+        if len(self.job_queue) > 2 * len(self.jobs_by_id) + 64:
+            self.job_queue = [entry for entry in self.job_queue if self._is_queued(entry[2])]
+
     def _kill_proc_tree(self, pid):
         try:
             parent = psutil.Process(pid)
             children = parent.children(recursive=True)
-            for child in children:
-                try:
-                    child.kill()
-                except Exception:
-                    pass
-            parent.kill()
+        except Exception:
+            return
+        # Jobs lead their own session, so one killpg also reaches children that were reparented
+        try:
+            os.killpg(pid, signal.SIGKILL)
         except Exception:
             pass
+        # sudo may have moved the command into a process group of its own
+        for proc in children + [parent]:
+            try:
+                proc.kill()
+            except Exception:
+                pass
 
     def cancel_job(self, job_id):
         with self.lock:
-            # 큐에서 먼저 제거
-            for job in list(self.job_queue):
-                if job.id == job_id:
-                    self.job_queue.remove(job)
-                    # 혹시 실행 중인 job이 있으면 프로세스 트리 전체 kill
-                    if job_id in self.running_jobs:
-                        proc = self.running_jobs[job_id].proc
-                        if proc:
-                            try:
-                                self._kill_proc_tree(proc.pid)
-                            except Exception as e:
-                                print(f"[DEBUG] Failed to kill proc tree: {e}")
-                        del self.running_jobs[job_id]
-                    return True
-            # 큐에 없고 실행 중인 경우
-            if job_id in self.running_jobs:
-                proc = self.running_jobs[job_id].proc
-                if proc:
-                    try:
-                        self._kill_proc_tree(proc.pid)
-                    except Exception as e:
-                        print(f"[DEBUG] Failed to kill proc tree: {e}")
-                del self.running_jobs[job_id]
+            self.work_pending = True
+            self.cv.notify()
+            # 큐에서 먼저 제거 (queue entry는 tombstone으로 남음)
+            if self.jobs_by_id.pop(job_id, None) is not None:
+                self._prune_queue()
                 return True
-        return False
+            # 큐에 없고 실행 중인 경우
+            job = self.running_jobs.pop(job_id, None)
+            if job is None:
+                return False
+        # Kill outside the lock; walking and signalling the process tree can take a while
+        if job.proc:
+            try:
+                self._kill_proc_tree(job.proc.pid)
+            except Exception as e:
+                print(f"[DEBUG] Failed to kill proc tree: {e}")
+        return True
 
     def get_queue(self):
         """Get queue snapshot without blocking"""
         with self.lock:
-            return [job.to_dict() if getattr(job, 'status', '') != 'error' else {**job.to_dict(), 'error_msg': getattr(job, 'error_msg', '')} for job in list(self.job_queue)]
+            return [job.to_dict() for job in self._queued_jobs()]
 
     def get_running(self):
         """Get running jobs snapshot without blocking"""
         with self.lock:
-            return [job.to_dict() for job in list(self.running_jobs.values())]
+            return [job.to_dict() for job in self.running_jobs.values()]
     
     def get_queue_status(self):
         """Get complete queue status in a single lock"""
         with self.lock:
-            queue_jobs = [job.to_dict() if getattr(job, 'status', '') != 'error' else {**job.to_dict(), 'error_msg': getattr(job, 'error_msg', '')} for job in list(self.job_queue)]
-            running_jobs = [job.to_dict() for job in list(self.running_jobs.values())]
+            queue_jobs = [job.to_dict() for job in self._queued_jobs()]
+            running_jobs = [job.to_dict() for job in self.running_jobs.values()]
         return {
             'status': 'ok',
             'queue': queue_jobs,
@@ -137,9 +351,9 @@ class Scheduler:
                     line = proc.stdout.readline()
                     if line and job.client_socket:
                         # print(f"[DEBUG] Streaming line: {line.strip()}")  # Debug output
-                        msg = json.dumps({'type': 'output', 'data': line})
+                        msg = encode_stream({'type': 'output', 'data': line}, job.client_framed, job.client_binary)
                         try:
-                            job.client_socket.send((msg + '\n').encode())
+                            job.client_socket.sendall(msg)
                         except (BrokenPipeError, ConnectionResetError, OSError) as e:
                             print(f"[DEBUG] Client disconnected: {e}")
                             print(f"[DEBUG] Canceling job {job.id} due to client disconnection")
@@ -171,8 +385,8 @@ class Scheduler:
             # Send job completion message
             if job.client_socket:
                 try:
-                    completion_msg = json.dumps({'type': 'completion', 'job_id': job.id, 'exit_code': proc.returncode})
-                    job.client_socket.send((completion_msg + '\n').encode())
+                    completion_msg = {'type': 'completion', 'job_id': job.id, 'exit_code': proc.returncode}
+                    job.client_socket.sendall(encode_stream(completion_msg, job.client_framed, job.client_binary))
                     print(f"[DEBUG] Sent completion message for job {job.id}")
                 except Exception as e:
                     print(f"[DEBUG] Error sending completion: {e}")
@@ -213,19 +427,26 @@ class Scheduler:
             print(f"[DEBUG] Error canceling job {job.id}: {e}")
 
     def try_run_jobs(self, max_job_time=None):
+        # Nothing to place: wakeups for job exits and idle rechecks don't need a GPU reading.
+        # A submit racing this check sets work_pending, so the next pass sees it
+        if not self.jobs_by_id:
+            return
+        # Same cached reading the submit validator used; a refresh (NVML or nvidia-smi) runs
+        # before taking the lock so submits and cancels don't wait on it
+        available = get_available_gpus()
+        if not available:
+            return
         with self.lock:
-            available = get_available_gpus()
-            if not available:
-                return
             max_mem = max(available) if available else 0
             min_mem = min(available) if available else 0
             used = [0]*len(available)
-            # 현재 실행 중인 작업의 GPU 메모리 점유량 반영
+            busy = 0  # Bit i set while any job runs on GPU i
+            # 현재 실행 중인 작업의 GPU 메모리 점유량 반영 (실제로 할당된 GPU 기준)
             for running_job in self.running_jobs.values():
-                if running_job.mem is not None and running_job.gpus > 0:
-                    # 이미 할당된 GPU 인덱스 추정 (가장 단순하게 앞에서부터 할당)
-                    for i in range(running_job.gpus):
-                        if i < len(used):
+                for i in running_job.assigned_gpus:
+                    if i < len(used):
+                        busy |= 1 << i
+                        if running_job.mem is not None:
                             used[i] += running_job.mem
             # User priority table (can be loaded from config or set here)
             user_priority = {
@@ -234,72 +455,118 @@ class Scheduler:
                 # 'alice': 10,
                 # 'bob': 5,
             }
-            # Sort queue by user-supplied priority (descending), then FIFO
-            self.job_queue = deque(sorted(self.job_queue, key=lambda job: (-getattr(job, 'priority', 0), job.id)))
-            for job in list(self.job_queue):
+            # GPU preference order; it only changes when a job is placed, so it is rebuilt then
+            order = None
+            launches = []  # Jobs placed in this pass; started after the lock is released
+            # Queue order is user-supplied priority (descending), then FIFO
+            for job in self._queued_jobs():
                 job_mem = job.mem if job.mem is not None else min_mem
                 if job_mem > max_mem or job_mem < 1:
                     job.status = 'error'
                     job.error_msg = f"요청 메모리({job_mem}MB)가 허용 범위({min_mem}~{max_mem}MB)를 벗어났습니다."
                     continue
-                # GPU allocation: prefer idle GPUs, then those with most free memory
-                gpu_status = [(i, available[i] - used[i], used[i]) for i in range(len(available))]
-                gpu_status.sort(key=lambda x: (x[2] > 0, -x[1]))
-
                 if job.gpu_ids:
                     # Validate requested GPU IDs (convert to int if needed)
                     candidate_idxs = [int(i) for i in job.gpu_ids if int(i) < len(available) and available[int(i)] - used[int(i)] >= job_mem]
                 else:
-                    candidate_idxs = [i for i, free, u in gpu_status if free >= job_mem]
+                    # GPU allocation: prefer idle GPUs, then the tightest memory fit
+                    if order is None:
+                        order = gpu_order(available, used, busy)
+                    candidate_idxs = fitting_gpus(order, job_mem)
 
                 if len(candidate_idxs) >= job.gpus:
                     selected_idxs = candidate_idxs[:job.gpus]
                     for idx in selected_idxs:
                         used[idx] += job_mem
+                        busy |= 1 << idx
+                    job.assigned_gpus = selected_idxs
+                    order = None
                     
-                    # Build command with CUDA_VISIBLE_DEVICES and force unbuffered output
-                    cuda_env = f"CUDA_VISIBLE_DEVICES={','.join(str(i) for i in selected_idxs)}"
-                    home_dir = os.path.expanduser(f'~{job.user}')
-                    env_setup_cmd = getattr(job, 'env_setup_cmd', None)
-                    
-                    # Build full command with unbuffered output
-                    if env_setup_cmd:
-                        cmd = f"cd {home_dir} && {env_setup_cmd} && PYTHONUNBUFFERED=1 {cuda_env} {job.cmd}"
-                    else:
-                        cmd = f"cd {home_dir} && PYTHONUNBUFFERED=1 {cuda_env} {job.cmd}"
-                    
-                    # Start process with output pipes for streaming
-                    if job.client_socket:
-                        # Interactive mode - stream output to client
-                        # Use unbuffered output and pty for real-time streaming
-                        proc = subprocess.Popen([
-                            'sudo', '-u', job.user, 'bash', '-lc', cmd
-                        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                        bufsize=0, universal_newlines=True, preexec_fn=os.setsid)
-                        
-                        # Start output streaming thread
-                        threading.Thread(
-                            target=self._stream_output_to_client, 
-                            args=(job, proc), 
-                            daemon=True
-                        ).start()
-                    else:
-                        # Background mode - no output streaming
-                        proc = subprocess.Popen([
-                            'sudo', '-u', job.user, 'bash', '-lc', cmd
-                        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=os.setsid)
-                    
-                    job.proc = proc
-                    job.status = 'running'
-                    job.start_time = time.time()
-                    self.running_jobs[job.id] = job
-                    self.job_queue.remove(job)
+                    # Stays in jobs_by_id until its process is installed, so a cancel in between finds it
+                    job.status = 'starting'
+                    launches.append(job)
+        if not launches:
+            return
+
+        # Fork/exec outside the lock; submits, cancels and queue queries don't wait on it
+        procs = []
+        for job in launches:
+            try:
+                if job.client_socket:
+                    # Interactive mode - stream output to client
+                    proc = spawn_job(job, job.assigned_gpus, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     bufsize=0, universal_newlines=True)
+                else:
+                    # Background mode - no output streaming
+                    proc = spawn_job(job, job.assigned_gpus, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                print(f"[DEBUG] Failed to start job {job.id}: {e}")
+                job.error_msg = str(e)
+                proc = None
+            procs.append((job, proc))
+
+        cancelled = []
+        with self.lock:
+            for job, proc in procs:
+                if not self._is_queued(job):
+                    # Cancelled while its process was starting
+                    if proc is not None:
+                        cancelled.append((job, proc))
+                    continue
+                del self.jobs_by_id[job.id]
+                if proc is None:
+                    job.status = 'error'
+                    continue
+                job.proc = proc
+                job.status = 'running'
+                job.start_time = time.time()
+                self.running_jobs[job.id] = job
+                threading.Thread(target=self._watch_job, args=(job,), daemon=True).start()
+                if job.client_socket:
+                    # Start output streaming thread
+                    threading.Thread(
+                        target=self._stream_output_to_client, 
+                        args=(job, proc), 
+                        daemon=True
+                    ).start()
+            self._prune_queue()
+        for job, proc in procs:
+            if proc is None:
+                # Nothing will stream; report the error the way a shell would (exit code 127) and let the client return
+                self._end_client_stream(job, 127, f"{job.error_msg}\n")
+        for job, proc in cancelled:
+            try:
+                self._kill_proc_tree(proc.pid)
+            except Exception as e:
+                print(f"[DEBUG] Failed to kill proc tree: {e}")
+            proc.wait()
+            # No stream thread was started, so the client hears about the cancel here
+            self._end_client_stream(job, proc.returncode)
+
+    def _end_client_stream(self, job, exit_code, output=None):
+        """Send an interactive client its completion (after any last output) and close it"""
+        if not job.client_socket:
+            return
+        data = b''
+        if output:
+            data = encode_stream({'type': 'output', 'data': output}, job.client_framed, job.client_binary)
+        completion_msg = {'type': 'completion', 'job_id': job.id, 'exit_code': exit_code}
+        try:
+            job.client_socket.sendall(data + encode_stream(completion_msg, job.client_framed, job.client_binary))
+        except OSError:
+            pass
+        try:
+            job.client_socket.close()
+        except OSError:
+            pass
+        job.client_socket = None
 
     def reap_jobs(self):
+        # Only jobs the watcher threads saw exit; no poll() over every running job
         with self.lock:
-            finished = [jid for jid, job in self.running_jobs.items() if job.proc.poll() is not None]
-            for jid in finished:
-                del self.running_jobs[jid]
+            for jid in self.exited:
+                self.running_jobs.pop(jid, None)
+            self.exited.clear()
     
     def check_disconnected_clients(self):
         """Check for disconnected interactive clients and cancel their jobs"""
@@ -334,10 +601,36 @@ class Scheduler:
                 
                 del self.running_jobs[jid]
 
-def handle_client(conn, scheduler, max_job_time):
+# Replies that never vary; their wire bytes are encoded once per format (framed, msgpack)
+CANNED_REPLIES = {
+    'ok': {'status':'ok'},
+    'fail': {'status':'fail'},
+    'unknown': {'status':'fail','msg':'unknown command'},
+}
+
+@functools.lru_cache(maxsize=None)
+def canned_reply(key, framed, binary):
+    """Wire bytes of CANNED_REPLIES[key] in the client's format"""
+    return pack_message(CANNED_REPLIES[key], framed, binary)
+
+def finish_request(conn, framed, keep_alive=None):
+    """Hand a framed connection back for its next request; bare-JSON peers get EOF"""
+    if framed and keep_alive is not None:
+        keep_alive(conn)
+        return
+    try:
+        conn.shutdown(socket.SHUT_WR)  # Signal we're done sending
+    except:
+        pass
+    conn.close()
+
+def handle_client(conn, scheduler, max_job_time, req, framed=False, binary=False, keep_alive=None):
+    """Answer one complete request; length-prefixed clients get frames back, bare-JSON clients bare JSON
+
+    A framed connection stays open for further requests (passed to keep_alive once answered);
+    bare-JSON peers send one request per connection.
+    """
     try:
-        data = conn.recv(4096)
-        req = json.loads(data.decode())
         cmd = req.get('cmd')
         if cmd == 'submit':
             available = get_available_gpus()
@@ -346,9 +639,10 @@ def handle_client(conn, scheduler, max_job_time):
             mem = req.get('mem')
             if mem is not None:
                 if mem > max_mem or mem < 1:
-                    job_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+                    job_id = generate_job_id()
                     msg = f"요청 메모리({mem}MB)가 허용 범위({min_mem}~{max_mem}MB)를 벗어났습니다."
-                    conn.send(json.dumps({'status':'fail','job_id':job_id,'msg':msg}).encode())
+                    send_message(conn, {'status':'fail','job_id':job_id,'msg':msg}, framed, binary)
+                    finish_request(conn, framed, keep_alive)
                     return
             time_limit = req.get('time_limit')
             priority = req.get('priority', 0)
@@ -359,56 +653,35 @@ def handle_client(conn, scheduler, max_job_time):
             interactive = req.get('interactive', False)
             client_socket = conn if interactive else None
             
-            job = Job(req['user'], req['gpus'], mem, req['cmdline'], time_limit, priority, gpu_ids, env_setup_cmd, client_socket)
-            job_id = scheduler.submit_job(job)
+            job = Job(req['user'], req['gpus'], mem, req['cmdline'], time_limit, priority, gpu_ids, env_setup_cmd, client_socket,
+                      framed, binary)
             
-            # Send initial response
-            response = {'status':'ok','job_id':job_id}
+            # Send initial response first: the scheduler may start the job and stream its output right away
+            response = {'status':'ok','job_id':job.id}
             if interactive:
                 response['interactive'] = True
-            response_data = json.dumps(response).encode()
-            conn.send(response_data)
+            send_message(conn, response, framed, binary)
+            scheduler.submit_job(job)
             
-            # For non-interactive jobs, ensure data is sent before closing
-            if not interactive:
-                try:
-                    conn.shutdown(socket.SHUT_WR)  # Signal we're done sending
-                except:
-                    pass
-                conn.close()
             # For interactive jobs, connection stays open for streaming
+            if not interactive:
+                finish_request(conn, framed, keep_alive)
             
         elif cmd == 'queue':
             # Use thread-safe queue status method
             queue_status = scheduler.get_queue_status()
-            response_data = json.dumps(queue_status).encode()
-            conn.send(response_data)
-            try:
-                conn.shutdown(socket.SHUT_WR)
-            except:
-                pass
-            conn.close()
+            send_message(conn, queue_status, framed, binary)
+            finish_request(conn, framed, keep_alive)
         elif cmd == 'cancel':
             ok = scheduler.cancel_job(req['job_id'])
-            response_data = json.dumps({'status':'ok' if ok else 'fail'}).encode()
-            conn.send(response_data)
-            try:
-                conn.shutdown(socket.SHUT_WR)
-            except:
-                pass
-            conn.close()
+            conn.sendall(canned_reply('ok' if ok else 'fail', framed, binary))
+            finish_request(conn, framed, keep_alive)
         else:
-            response_data = json.dumps({'status':'fail','msg':'unknown command'}).encode()
-            conn.send(response_data)
-            try:
-                conn.shutdown(socket.SHUT_WR)
-            except:
-                pass
-            conn.close()
+            conn.sendall(canned_reply('unknown', framed, binary))
+            finish_request(conn, framed, keep_alive)
     except Exception as e:
         try:
-            response_data = json.dumps({'status':'fail','msg':str(e)}).encode()
-            conn.send(response_data)
+            send_message(conn, {'status':'fail','msg':str(e)}, framed, binary)
             conn.shutdown(socket.SHUT_WR)
         except:
             pass
@@ -421,20 +694,116 @@ def main():
     if os.path.exists(SOCKET_PATH):
         os.remove(SOCKET_PATH)
     scheduler = Scheduler()
+    # Open NVML (or find nvidia-smi missing) now rather than on the first submit
+    print(f"[INFO] {len(get_available_gpus())} GPU(s) visible via {'NVML' if _nvml_handles else 'nvidia-smi'}")
     s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     s.bind(SOCKET_PATH)
-    s.listen(5)
+    s.listen(socket.SOMAXCONN)  # Absorb bursts of mgpu_srun invocations
     print('mgpu_scheduler_server started')
     def bg():
         while True:
-            scheduler.try_run_jobs(args.max_job_time)
+            # Reap first so GPUs of jobs that just exited are free for this pass
             scheduler.reap_jobs()
+            scheduler.expire_jobs(args.max_job_time)
             scheduler.check_disconnected_clients()
-            time.sleep(2)
+            scheduler.try_run_jobs(args.max_job_time)
+            scheduler.wait_for_work(args.max_job_time)
     threading.Thread(target=bg, daemon=True).start()
+    serve(s, scheduler, args.max_job_time)
+
+def serve(server, scheduler, max_job_time):
+    """Accept clients and collect their requests on one selectors loop
+
+    Once a request is complete the connection leaves the loop and is answered on a pooled
+    worker thread with a blocking socket, so a slow client can't stall the loop; interactive
+    submits keep it for streaming the job's output. A framed connection comes back to the
+    loop after its reply, so a long-running client can send many requests over one connect.
+    """
+    pool = ThreadPoolExecutor(max_workers=HANDLER_THREADS)
+    sel = selectors.DefaultSelector()
+    server.setblocking(False)
+    sel.register(server, selectors.EVENT_READ)
+    # Workers hand answered connections back through a queue; the socketpair wakes select()
+    returned = queue.SimpleQueue()
+    wake_r, wake_w = socket.socketpair()
+    wake_r.setblocking(False)
+    wake_w.setblocking(False)
+    sel.register(wake_r, selectors.EVENT_READ)
+    recv_buffer = bytearray(65536)
+
+    def give_back(conn, inbuf):
+        returned.put((conn, inbuf))
+        try:
+            wake_w.send(b'\0')
+        except BlockingIOError:
+            pass  # A wakeup is already pending
+
+    def dispatch(conn, inbuf, registered=False, eof=False):
+        """Answer conn on the pool if inbuf holds a complete request; False to keep reading"""
+        framed = inbuf[:1] != b'{'
+        try:
+            parsed = split_message(inbuf, eof)
+        except Exception as e:
+            if registered:
+                sel.unregister(conn)
+            conn.setblocking(True)
+            try:
+                send_message(conn, {'status':'fail','msg':str(e)}, framed)
+            except OSError:
+                pass
+            conn.close()
+            return True
+        if parsed is None:
+            return False
+        if registered:
+            sel.unregister(conn)
+        conn.setblocking(True)
+        # Bytes of a pipelined next request stay in inbuf for when the connection comes back
+        pool.submit(handle_client, conn, scheduler, max_job_time, *parsed,
+                    keep_alive=lambda c, buf=inbuf: give_back(c, buf))
+        return True
+
     while True:
-        conn, _ = s.accept()
-        threading.Thread(target=handle_client, args=(conn, scheduler, args.max_job_time), daemon=True).start()
+        for key, _ in sel.select():
+            if key.fileobj is server:
+                # Take every pending connection, not one per wakeup
+                while True:
+                    try:
+                        conn, _ = server.accept()
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    if conn.family == socket.AF_INET:
+                        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    conn.setblocking(False)
+                    sel.register(conn, selectors.EVENT_READ, bytearray())
+                continue
+            if key.fileobj is wake_r:
+                try:
+                    while wake_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+                while not returned.empty():
+                    conn, inbuf = returned.get()
+                    if not dispatch(conn, inbuf):
+                        conn.setblocking(False)
+                        sel.register(conn, selectors.EVENT_READ, inbuf)
+                continue
+            conn, inbuf = key.fileobj, key.data
+            try:
+                n = conn.recv_into(recv_buffer)
+            except BlockingIOError:
+                continue
+            except OSError:
+                n = 0
+            if not n:
+                # A half-closed peer still gets an answer to whatever it sent
+                if not (inbuf and dispatch(conn, inbuf, registered=True, eof=True)):
+                    sel.unregister(conn)
+                    conn.close()
+                continue
+            inbuf += memoryview(recv_buffer)[:n]
+            dispatch(conn, inbuf, registered=True)
 
 if __name__ == "__main__":
     main()
@@ -2,11 +2,10 @@
 Job Scheduler for Multi-GPU Master Server
 """
 
-import json
 import queue
+import shlex
 import threading
 import time
-import uuid
 import sys
 import os
 from typing import Dict, List, Optional, Any
@@ -16,6 +15,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'
 
 from mgpu_core.models.job_models import SimpleJob, NodeInfo
 from mgpu_core.network.network_manager import NetworkManager
+from mgpu_core.network.framing import encode_stream, send_message
+from mgpu_core.utils.id_utils import generate_job_id
 from mgpu_core.utils.logging_utils import setup_logger
 
 
@@ -27,10 +28,13 @@ class JobScheduler:
     
     def __init__(self):
         self.job_queue = queue.Queue()
+        self.pending_jobs = {}  # job_id -> SimpleJob submitted but not yet running
         self.running_jobs = {}  # job_id -> SimpleJob
         self.completed_jobs = {}  # job_id -> SimpleJob
         self.job_outputs = {}  # job_id -> List[str]
-        self.interactive_clients = {}  # job_id -> List[socket]
+        self.interactive_clients = {}  # job_id -> List[(socket, framed, binary)]
+        self.subscribers = {}  # job_id -> List[(socket, framed, binary)] waiting for completion
+        self.queue_subscribers = []  # (socket, framed, binary) sent the queue status on every change
         self.lock = threading.RLock()
         self.running = False
         self.nodes = {}  # Will be set by master
@@ -46,7 +50,7 @@ class JobScheduler:
             
             # Create job
             job = SimpleJob(
-                id=request.get('job_id', str(uuid.uuid4())[:8].upper()),
+                id=request.get('job_id') or generate_job_id(),
                 user=request.get('user', 'unknown'),
                 cmd=request.get('command', ''),
                 gpus_needed=request.get('gpus', 1),
@@ -58,7 +62,10 @@ class JobScheduler:
             logger.info(f"Created job {job.id} with node_gpu_ids: {job.node_gpu_ids}")
             
             # Add to queue
-            self.job_queue.put(job)
+            with self.lock:
+                self.pending_jobs[job.id] = job
+                self.job_queue.put(job)
+                self.publish_queue_status()
             logger.info(f"Job {job.id} submitted: {job.cmd[:50]}...")
             
             return {'status': 'ok', 'job_id': job.id, 'message': 'Job submitted'}
@@ -78,7 +85,7 @@ class JobScheduler:
                 while not self.job_queue.empty():
                     try:
                         job = self.job_queue.get_nowait()
-                        queued_jobs.append(job.to_dict())
+                        queued_jobs.append(job)
                         temp_queue.put(job)
                     except queue.Empty:
                         break
@@ -87,7 +94,8 @@ class JobScheduler:
                 while not temp_queue.empty():
                     self.job_queue.put(temp_queue.get())
                 
-                running_jobs = [job.to_dict() for job in self.running_jobs.values()]
+                # SimpleJobs go to the encoder as they are; no dict per job
+                running_jobs = list(self.running_jobs.values())
                 
                 # Node status
                 nodes_status = {}
@@ -133,6 +141,8 @@ class JobScheduler:
                             job.end_time = time.time()
                             self.completed_jobs[job_id] = job
                             del self.running_jobs[job_id]
+                            self.notify_subscribers(job)
+                            self.publish_queue_status()
                             
                             # Free up node resources
                             if job.assigned_gpus:
@@ -157,6 +167,9 @@ class JobScheduler:
                             found = True
                             job.status = 'cancelled'
                             self.completed_jobs[job_id] = job
+                            self.pending_jobs.pop(job_id, None)
+                            self.notify_subscribers(job)
+                            self.publish_queue_status()
                         else:
                             temp_queue.put(job)
                     except queue.Empty:
@@ -255,7 +268,9 @@ class JobScheduler:
                     # Move to running jobs
                     with self.lock:
                         self.running_jobs[job.id] = job
+                        self.pending_jobs.pop(job.id, None)
                         node.running_jobs.append(job.id)
+                        self.publish_queue_status()
                     
                     logger.info(f"Job {job.id} started on node {node_id} with GPUs {assigned_gpus}")
                 else:
@@ -274,6 +289,9 @@ class JobScheduler:
                         job.status = 'failed'
                         with self.lock:
                             self.completed_jobs[job.id] = job
+                            self.pending_jobs.pop(job.id, None)
+                            self.notify_subscribers(job)
+                            self.publish_queue_status()
                     
             except queue.Empty:
                 continue
@@ -283,17 +301,12 @@ class JobScheduler:
     
     def create_debug_command(self, original_cmd: str, node_id: str, job_id: str) -> str:
         """Create command with debug information to track actual execution location"""
-        debug_prefix = f'''echo "=== JOB EXECUTION DEBUG INFO ==="
-echo "Job ID: {job_id}"
-echo "Target Node ID: {node_id}"
-echo "Actual Hostname: $(hostname)"
-echo "Actual IP: $(hostname -I | cut -d' ' -f1 || echo 'N/A')"
-echo "Process ID: $$"
-echo "Working Directory: $(pwd)"
-echo "Timestamp: $(date)"
-echo "Port Check: $(netstat -tlnp 2>/dev/null | grep :808 | head -3 || echo 'No 808x ports')"
-echo "=============================="
-'''
+        # One machine-readable line, parsed with a single JSON decode on the client side.
+        # bash sets $HOSTNAME and the node agent exports $MGPU_NODE_IP, so nothing is spawned
+        debug_prefix = (
+            f"""printf 'DEBUG_JSON:{{"job_id":"%s","node":"%s","hostname":"%s","ip":"%s","pid":%d}}\\n' """
+            f"""{shlex.quote(job_id)} {shlex.quote(node_id)} "$HOSTNAME" "$MGPU_NODE_IP" $$"""
+        )
         return f"{debug_prefix}\n{original_cmd}"
     
     def handle_job_completion(self, request: Dict) -> Dict:
@@ -315,6 +328,8 @@ echo "=============================="
                 # Move to completed jobs
                 self.completed_jobs[job_id] = job
                 del self.running_jobs[job_id]
+                self.notify_subscribers(job)
+                self.publish_queue_status()
                 
                 # Free node resources
                 if job.assigned_node and job.assigned_node in self.nodes:
@@ -334,6 +349,82 @@ echo "=============================="
             logger.error(f"Job completion error: {e}")
             return {'status': 'error', 'message': str(e)}
     
+    def subscribe(self, job_id: str, client_socket, framed: bool = True, binary: bool = False):
+        """Acknowledge a subscribe request, then push a completion message when the job finishes
+        
+        The ack is sent under the lock before the client is registered, so it always
+        arrives ahead of the completion message.
+        """
+        with self.lock:
+            if job_id in self.completed_jobs:
+                send_message(client_socket, {'status': 'ok', 'job_id': job_id}, framed, binary)
+                client_socket.sendall(encode_stream(self.completion_message(self.completed_jobs[job_id]), framed, binary))
+                return
+            
+            if job_id not in self.running_jobs and job_id not in self.pending_jobs:
+                send_message(client_socket, {'status': 'error', 'message': f'Job {job_id} not found'}, framed, binary)
+                return
+            
+            send_message(client_socket, {'status': 'ok', 'job_id': job_id}, framed, binary)
+            self.subscribers.setdefault(job_id, []).append((client_socket, framed, binary))
+    
+    def completion_message(self, job: SimpleJob) -> Dict:
+        """Completion message pushed to subscribers"""
+        return {
+            'type': 'completion',
+            'job_id': job.id,
+            'exit_code': job.exit_code,
+            'job_status': job.status,
+            'output': self.job_outputs.get(job.id, [])
+        }
+    
+    def notify_subscribers(self, job: SimpleJob):
+        """Push the completion message to every client subscribed to job (caller holds the lock)"""
+        clients = self.subscribers.pop(job.id, [])
+        if not clients:
+            return
+        
+        message = self.completion_message(job)
+        for client_socket, framed, binary in clients:
+            try:
+                client_socket.sendall(encode_stream(message, framed, binary))
+            except:
+                pass  # Subscriber went away
+    
+    def subscribe_queue(self, client_socket, framed: bool = True, binary: bool = False):
+        """Acknowledge a subscribe_queue request and send the current queue status, then a new one on every change"""
+        with self.lock:
+            send_message(client_socket, {'status': 'ok'}, framed, binary)
+            client_socket.sendall(encode_stream(self.queue_status_message(), framed, binary))
+            self.queue_subscribers.append((client_socket, framed, binary))
+    
+    def unsubscribe_queue(self, client_socket):
+        """Stop sending queue updates to client_socket"""
+        with self.lock:
+            self.queue_subscribers = [entry for entry in self.queue_subscribers if entry[0] is not client_socket]
+    
+    def queue_status_message(self) -> Dict:
+        """Queue status pushed to queue subscribers"""
+        return {'type': 'queue_status', **self.get_queue_status()}
+    
+    def publish_queue_status(self):
+        """Push the queue status to every queue subscriber (caller holds the lock)"""
+        if not self.queue_subscribers:
+            return
+        
+        message = self.queue_status_message()
+        encoded = {}  # One encoding per wire format
+        alive = []
+        for client_socket, framed, binary in self.queue_subscribers:
+            try:
+                if (framed, binary) not in encoded:
+                    encoded[framed, binary] = encode_stream(message, framed, binary)
+                client_socket.sendall(encoded[framed, binary])
+                alive.append((client_socket, framed, binary))
+            except OSError:
+                pass  # Subscriber went away
+        self.queue_subscribers = alive
+    
     def get_job_output(self, job_id: str, from_line: int = 0) -> Dict:
         """Get job output for non-interactive jobs"""
         if not job_id:
@@ -393,12 +484,13 @@ echo "=============================="
             # For interactive jobs, forward to connected clients
             if interactive and job_id in self.interactive_clients:
                 dead_clients = []
-                for client_socket in self.interactive_clients[job_id]:
+                message = {'type': 'output', 'data': data}
+                for client in self.interactive_clients[job_id]:
+                    client_socket, framed, binary = client
                     try:
-                        message = {'type': 'output', 'data': data}
-                        client_socket.send(json.dumps(message).encode() + b'\n')
+                        client_socket.sendall(encode_stream(message, framed, binary))
                     except:
-                        dead_clients.append(client_socket)
+                        dead_clients.append(client)
                 
                 # Remove dead clients
                 for client in dead_clients:
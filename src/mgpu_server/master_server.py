@@ -4,7 +4,6 @@ Multi-GPU Master Server Main Class
 
 import socket
 import threading
-import json
 import sys
 import os
 from typing import Dict, Any
@@ -13,6 +12,7 @@ from typing import Dict, Any
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 from mgpu_core.models.job_models import MessageType
+from mgpu_core.network.framing import encode_stream, recv_message, send_message
 from mgpu_core.utils.logging_utils import setup_logger
 from mgpu_server.job_scheduler import JobScheduler
 from mgpu_server.node_manager import NodeManager
@@ -39,45 +39,58 @@ class MasterServer:
     
     def handle_client(self, client_socket: socket.socket, address):
         """Handle client connection"""
+        framed = binary = False
         try:
-            data = client_socket.recv(8192).decode()
-            if not data:
-                return
-            
-            request = json.loads(data)
-            cmd = request.get('cmd')
-            
-            response = self.process_request(cmd, request)
-            
-            # Handle interactive sessions differently
-            if cmd == MessageType.SUBMIT and request.get('interactive'):
-                if response.get('status') == 'ok':
+            # Length-prefixed clients may send any number of requests on one connection;
+            # bare-JSON clients send exactly one and get bare JSON back
+            while True:
+                request, framed, binary = recv_message(client_socket)
+                if request is None:
+                    return
+                
+                cmd = request.get('cmd')
+                
+                if cmd == MessageType.SUBSCRIBE:
+                    # The scheduler sends the ack itself, then pushes completion on this connection
+                    self.job_scheduler.subscribe(request.get('job_id'), client_socket, framed, binary)
+                    continue
+                
+                if cmd == MessageType.SUBSCRIBE_QUEUE:
+                    # Queue status is pushed on every change until the client disconnects
+                    self.job_scheduler.subscribe_queue(client_socket, framed, binary)
+                    continue
+                
+                response = self.process_request(cmd, request)
+                
+                # Handle interactive sessions differently
+                if cmd == MessageType.SUBMIT and request.get('interactive') and response.get('status') == 'ok':
                     # Send initial response
-                    client_socket.send(json.dumps(response).encode())
+                    send_message(client_socket, response, framed, binary)
                     
                     # Register for interactive updates
                     job_id = response['job_id']
                     if job_id not in self.job_scheduler.interactive_clients:
                         self.job_scheduler.interactive_clients[job_id] = []
-                    self.job_scheduler.interactive_clients[job_id].append(client_socket)
+                    self.job_scheduler.interactive_clients[job_id].append((client_socket, framed, binary))
                     
                     # Keep connection alive for interactive session
-                    self.handle_interactive_client(client_socket, job_id)
+                    self.handle_interactive_client(client_socket, job_id, framed, binary)
                     return
-                else:
-                    client_socket.send(json.dumps(response).encode())
-            else:
+                
                 # Regular request-response
-                client_socket.send(json.dumps(response).encode())
+                send_message(client_socket, response, framed, binary)
+                if not framed:
+                    return
                 
         except Exception as e:
             logger.error(f"Client handler error: {e}")
             try:
                 error_response = {'status': 'error', 'message': str(e)}
-                client_socket.send(json.dumps(error_response).encode())
+                send_message(client_socket, error_response, framed, binary)
             except:
                 pass
         finally:
+            self.job_scheduler.unsubscribe_queue(client_socket)
             try:
                 client_socket.close()
             except:
@@ -139,16 +152,16 @@ class MasterServer:
             }
             
             dead_clients = []
-            for client_socket in self.job_scheduler.interactive_clients[job_id]:
+            for client_socket, framed, binary in self.job_scheduler.interactive_clients[job_id]:
                 try:
-                    client_socket.send(json.dumps(completion_msg).encode() + b'\n')
+                    client_socket.sendall(encode_stream(completion_msg, framed, binary))
                 except:
                     dead_clients.append(client_socket)
             
             # Clean up all clients for this job
-            for client in self.job_scheduler.interactive_clients[job_id]:
+            for client_socket, _, _ in self.job_scheduler.interactive_clients[job_id]:
                 try:
-                    client.close()
+                    client_socket.close()
                 except:
                     pass
             
@@ -159,7 +172,8 @@ class MasterServer:
         # Also handle regular job completion
         return self.job_scheduler.handle_job_completion(request)
     
-    def handle_interactive_client(self, client_socket: socket.socket, job_id: str):
+    def handle_interactive_client(self, client_socket: socket.socket, job_id: str, framed: bool = False,
+                                  binary: bool = False):
         """Handle interactive client connection with proper timeout and cleanup"""
         try:
             # Keep connection alive until job completes
@@ -183,8 +197,9 @@ class MasterServer:
         finally:
             # Remove client from interactive clients list
             if job_id in self.job_scheduler.interactive_clients:
-                if client_socket in self.job_scheduler.interactive_clients[job_id]:
-                    self.job_scheduler.interactive_clients[job_id].remove(client_socket)
+                client = (client_socket, framed, binary)
+                if client in self.job_scheduler.interactive_clients[job_id]:
+                    self.job_scheduler.interactive_clients[job_id].remove(client)
             
             try:
                 client_socket.close()
@@ -202,7 +217,7 @@ class MasterServer:
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(10)
+        self.server_socket.listen(socket.SOMAXCONN)  # Absorb reconnect bursts
         
         logger.info(f"Master Server started on {self.host}:{self.port}")
         logger.info(f"Job scheduler initialized")
@@ -213,6 +228,7 @@ class MasterServer:
             while self.running:
                 try:
                     client_socket, address = self.server_socket.accept()
+                    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                     logger.debug(f"Connection from {address}")
                     
                     # Handle each client in a separate thread
@@ -2,33 +2,52 @@
 import sys
 import os
 import socket
-import json
 import getpass
+import argparse
+
+from mgpu_core.network.framing import send_frame, recv_frame, FrameStream
+
+USAGE = 'mgpu_srun --gpu-ids <ID1,ID2,...> [--mem <MB>] [--time-limit <sec>] [--priority <N>] [--env-setup-cmd <CMD>] [--interactive] [--background] -- <command>'
+
+def parse_args():
+    parser = argparse.ArgumentParser(usage=USAGE, description="Submit a GPU job to mgpu_scheduler.")
+    parser.add_argument('--gpu-ids', type=str,
+                        help='Comma-separated GPU IDs')
+    parser.add_argument('--mem', type=int,
+                        help='Memory requirement per GPU (MB)')
+    parser.add_argument('--time-limit', type=int,
+                        help='Job time limit (seconds)')
+    parser.add_argument('--priority', type=int, default=0,
+                        help='Job priority (higher = sooner)')
+    parser.add_argument('--env-setup-cmd', type=str,
+                        help='Environment setup command')
+    parser.add_argument('--interactive', action='store_true',
+                        help='Stream job output (the default)')
+    parser.add_argument('--background', action='store_true',
+                        help='Submit job and exit immediately')
+    # Everything after '--' is the command, even if it looks like one of the options above
+    parser.add_argument('command', nargs=argparse.REMAINDER,
+                        help='Command to run under scheduler')
+    return parser.parse_args()
 
 def main():
     # Parse command line arguments for job submission
-    if '--gpu-ids' not in sys.argv or '--' not in sys.argv:
-        print('Usage: mgpu_srun --gpu-ids <ID1,ID2,...> [--mem <MB>] [--time-limit <sec>] [--priority <N>] [--env-setup-cmd <CMD>] [--interactive] [--background] -- <command>')
+    args = parse_args()
+    command_parts = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not args.gpu_ids or not command_parts:
+        print(f'Usage: {USAGE}')
         sys.exit(1)
-    gpu_ids = sys.argv[sys.argv.index('--gpu-ids')+1].split(',')
+    gpu_ids = args.gpu_ids.split(',')
     gpus = len(gpu_ids)
-    mem = None
-    if '--mem' in sys.argv:
-        mem = int(sys.argv[sys.argv.index('--mem')+1])
-    time_limit = None
-    if '--time-limit' in sys.argv:
-        time_limit = int(sys.argv[sys.argv.index('--time-limit')+1])
-    priority = 0
-    if '--priority' in sys.argv:
-        priority = int(sys.argv[sys.argv.index('--priority')+1])
-    env_setup_cmd = None
-    if '--env-setup-cmd' in sys.argv:
-        env_setup_cmd = sys.argv[sys.argv.index('--env-setup-cmd')+1]
+    mem = args.mem
+    time_limit = args.time_limit
+    priority = args.priority
+    env_setup_cmd = args.env_setup_cmd
     
     # Default to interactive mode unless --background is specified
-    interactive = '--background' not in sys.argv
-    cmd_idx = sys.argv.index('--')+1
-    cmdline = ' '.join(sys.argv[cmd_idx:])
+    interactive = not args.background
+    # One shell command line, so VAR=1 prefixes, &&, globs and redirections work as typed
+    cmdline = ' '.join(command_parts)
     user = getpass.getuser()
     req = {'cmd':'submit','user':user,'gpus':gpus,'gpu_ids':gpu_ids,'cmdline':cmdline, 'priority': priority, 'interactive': interactive}
     if mem is not None:
@@ -40,8 +59,8 @@ def main():
     # Connect to the scheduler server and submit the job
     s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     s.connect('/tmp/mgpu_scheduler.sock')
-    s.send(json.dumps(req).encode())
-    resp = json.loads(s.recv(4096).decode())
+    send_frame(s, req)
+    resp = recv_frame(s)
     if resp['status'] == 'ok':
         print(f"Job submitted. ID: {resp['job_id']} (priority={priority})")
         
@@ -51,29 +70,21 @@ def main():
             job_id = resp['job_id']
             try:
                 s.settimeout(None)  # Remove timeout for streaming
-                buffer = ""
+                stream = FrameStream(s)
                 while True:
                     try:
-                        data = s.recv(4096)
-                        if not data:
+                        # Each output line and the completion arrive as one frame
+                        msg = stream.recv()
+                        if msg is None:
                             print("[DEBUG] No more data from server")
                             break
                         
-                        buffer += data.decode('utf-8', errors='ignore')
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            if line.strip():
-                                try:
-                                    msg = json.loads(line)
-                                    if msg['type'] == 'output':
-                                        print(msg['data'], end='', flush=True)
-                                    elif msg['type'] == 'completion':
-                                        print(f"\nJob {msg['job_id']} completed with exit code {msg['exit_code']}")
-                                        s.close()
-                                        return
-                                except json.JSONDecodeError:
-                                    # If it's not valid JSON, just print the line
-                                    print(f"[DEBUG] Non-JSON line: {line}")
+                        if msg['type'] == 'output':
+                            print(msg['data'], end='', flush=True)
+                        elif msg['type'] == 'completion':
+                            print(f"\nJob {msg['job_id']} completed with exit code {msg['exit_code']}")
+                            s.close()
+                            return
                     except (ConnectionResetError, ConnectionAbortedError, socket.error) as e:
                         print(f"\nConnection to server lost: {e}")
                         break
@@ -84,8 +95,8 @@ def main():
                     cancel_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
                     cancel_socket.connect('/tmp/mgpu_scheduler.sock')
                     cancel_req = {'cmd': 'cancel', 'job_id': job_id}
-                    cancel_socket.send(json.dumps(cancel_req).encode())
-                    cancel_resp = json.loads(cancel_socket.recv(4096).decode())
+                    send_frame(cancel_socket, cancel_req)
+                    cancel_resp = recv_frame(cancel_socket)
                     if cancel_resp['status'] == 'ok':
                         print(f"Job {job_id} canceled successfully.")
                     else:
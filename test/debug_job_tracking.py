@@ -5,40 +5,63 @@ Job Tracking Debug Tool
 """
 
 import os
+import sys
 import socket
 import json
+import shlex
 import time
+import ipaddress
 import subprocess
 
+import psutil
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mgpu_core.utils.system_utils import IPManager
+
 def create_debug_command(original_cmd, node_id, job_id):
     """
     원본 명령어에 디버깅 정보를 추가한 명령어 생성
     """
-    debug_info = f"""
-echo "=== JOB EXECUTION DEBUG INFO ==="
-echo "Job ID: {job_id}"
-echo "Assigned Node ID: {node_id}"
-echo "Actual Hostname: $(hostname)"
-echo "Actual IP Address: $(hostname -I | cut -d' ' -f1)"
-echo "Process ID: $$"
-echo "Working Directory: $(pwd)"
-echo "User: $(whoami)"
-echo "Timestamp: $(date)"
-echo "==============================="
-    """
+    debug_info = (
+        f"""printf 'DEBUG_JSON:{{"job_id":"%s","node":"%s","hostname":"%s","ip":"%s","pid":%d}}\\n' """
+        f"""{shlex.quote(job_id)} {shlex.quote(node_id)} "$HOSTNAME" "${{MGPU_NODE_IP:-$(hostname -I | cut -d' ' -f1)}}" $$"""
+    )
     
-    return f"{debug_info.strip()}\n{original_cmd}"
+    return f"{debug_info}\n{original_cmd}"
+
+# netstat/ps 결과를 한 번의 bash 실행으로 수집 (구분선으로 분리)
+NODE_MAPPING_SCRIPT = """
+netstat -tlnp 2>/dev/null | grep LISTEN | grep -E '808[0-9]'
+echo '--mgpu-split--'
+ps aux | grep mgpu_simple
+"""
+
+def inet_addresses():
+    """
+    IPv4 주소 목록 ('주소/prefix', ip addr show 순서)
+    """
+    addresses = []
+    for entries in psutil.net_if_addrs().values():
+        for entry in entries:
+            if entry.family == socket.AF_INET:
+                prefix = ipaddress.IPv4Network(f"0.0.0.0/{entry.netmask}").prefixlen if entry.netmask else 32
+                addresses.append(f"{entry.address}/{prefix}")
+    return addresses
 
 def analyze_node_mapping():
     """
     현재 시스템의 노드 매핑 분석
     """
+    addresses = inet_addresses()
+    result = subprocess.run(['bash', '-c', NODE_MAPPING_SCRIPT], capture_output=True, text=True)
+    listening_ports, _, process_info = result.stdout.partition('--mgpu-split--\n')
+    
     analysis = {
-        "hostname": subprocess.getoutput("hostname"),
-        "ip_address": subprocess.getoutput("hostname -I | cut -d' ' -f1"),
-        "all_interfaces": subprocess.getoutput("ip addr show | grep 'inet ' | awk '{print $2}'"),
-        "listening_ports": subprocess.getoutput("netstat -tlnp 2>/dev/null | grep LISTEN | grep -E '808[0-9]'"),
-        "process_info": subprocess.getoutput("ps aux | grep mgpu_simple"),
+        "hostname": socket.gethostname(),
+        "ip_address": IPManager.primary_ip(),
+        "all_interfaces": "\n".join(addresses),
+        "listening_ports": listening_ports.strip(),
+        "process_info": process_info.strip(),
     }
     return analysis
 
@@ -52,17 +75,17 @@ def verify_job_execution_location(job_id, expected_node, actual_output):
         "analysis": {}
     }
     
-    # 출력에서 디버그 정보 추출
-    lines = actual_output.split('\n')
-    for line in lines:
-        if "Assigned Node ID:" in line:
-            verification["analysis"]["assigned_node"] = line.split(":")[1].strip()
-        elif "Actual Hostname:" in line:
-            verification["analysis"]["actual_hostname"] = line.split(":")[1].strip()
-        elif "Actual IP Address:" in line:
-            verification["analysis"]["actual_ip"] = line.split(":")[1].strip()
-        elif "Process ID:" in line:
-            verification["analysis"]["process_id"] = line.split(":")[1].strip()
+    # 출력에서 디버그 정보 추출 (DEBUG_JSON 한 줄)
+    for line in actual_output.split('\n'):
+        if line.startswith('DEBUG_JSON:'):
+            info = json.loads(line[len('DEBUG_JSON:'):])
+            verification["analysis"] = {
+                "assigned_node": info.get("node"),
+                "actual_hostname": info.get("hostname"),
+                "actual_ip": info.get("ip"),
+                "process_id": info.get("pid"),
+            }
+            break
     
     # 일치성 검사
     verification["location_match"] = (
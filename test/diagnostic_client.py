@@ -4,12 +4,16 @@ Enhanced Simple Client with Diagnostic Features
 특정 노드 할당 문제 디버깅을 위한 진단 기능이 포함된 클라이언트
 """
 
+import os
+import sys
 import socket
-import json
 import argparse
 import time
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mgpu_core.network.framing import send_frame, recv_frame, decode_json
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -20,20 +24,42 @@ class DiagnosticClient:
     def __init__(self, host='127.0.0.1', port=8080):
         self.host = host
         self.port = port
+        self._sock = None
+    
+    def _get_conn(self):
+        """서버 연결 (한 번 연결하여 재사용)"""
+        if self._sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(30)
+            try:
+                sock.connect((self.host, self.port))
+            except Exception:
+                sock.close()
+                raise
+            self._sock = sock
+        return self._sock
+    
+    def close(self):
+        """서버 연결 종료"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
     
     def send_request(self, request):
         """서버에 요청 전송"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(30)
-            sock.connect((self.host, self.port))
-            sock.send(json.dumps(request).encode())
+            sock = self._get_conn()
+            send_frame(sock, request)
             
-            response = sock.recv(8192).decode()
-            sock.close()
+            response = recv_frame(sock)
+            if response is None:
+                self.close()
             
-            return json.loads(response)
+            return response or {'status': 'error', 'message': 'Connection closed by server'}
         except Exception as e:
+            # Drop the connection; the next request reconnects
+            self.close()
             return {'status': 'error', 'message': str(e)}
     
     def test_node_assignment(self, node_id, gpu_id=0):
@@ -83,60 +109,62 @@ sleep 2
             print(f"Job submission failed: {result}")
     
     def wait_and_collect_output(self, job_id):
-        """작업 완료까지 대기하고 출력 수집"""
+        """작업 완료까지 대기하고 출력 수집 (서버가 완료 메시지를 push)"""
         print(f"Waiting for job {job_id} to complete...")
         
-        for i in range(30):  # 30초 대기
-            time.sleep(1)
-            
-            # 출력 요청
-            output_request = {
-                'cmd': 'get_job_output',
-                'job_id': job_id
-            }
-            
-            result = self.send_request(output_request)
-            
-            if result.get('status') == 'ok':
-                job_status = result.get('job_status')
-                output_lines = result.get('output', [])
-                
-                if job_status in ['completed', 'failed']:
-                    print(f"Job {job_status}!")
-                    print("Output:")
-                    for line in output_lines:
-                        print(f"  {line}")
-                    
-                    # 결과 분석
-                    self.analyze_execution_location(output_lines, job_id)
+        result = self.send_request({'cmd': 'subscribe', 'job_id': job_id})
+        if result.get('status') != 'ok':
+            print(f"Subscribe failed: {result}")
+            return
+        
+        # 완료 메시지를 받을 때까지 대기 (최대 30초)
+        deadline = time.time() + 30
+        try:
+            while True:
+                self._sock.settimeout(max(deadline - time.time(), 0.001))
+                message = recv_frame(self._sock)
+                if message is None:
+                    print("Connection closed by server")
+                    self.close()
+                    return
+                if message.get('type') == 'completion':
                     break
-                elif job_status == 'running':
-                    print(f"  Job still running... ({i+1}/30)")
-                else:
-                    print(f"  Job status: {job_status}")
-            
-            if i == 29:
-                print("Timeout waiting for job completion")
+        except socket.timeout:
+            print("Timeout waiting for job completion")
+            self.close()  # A late completion message must not be read as the next reply
+            return
+        finally:
+            if self._sock is not None:
+                self._sock.settimeout(30)
+        
+        job_status = message.get('job_status')
+        output_lines = message.get('output', [])
+        
+        print(f"Job {job_status}!")
+        print("Output:")
+        for line in output_lines:
+            print(f"  {line}")
+        
+        # 결과 분석
+        self.analyze_execution_location(output_lines, job_id)
     
     def analyze_execution_location(self, output_lines, job_id):
         """실행 위치 분석"""
         print(f"\n=== Execution Location Analysis for {job_id} ===")
         
+        # 서버가 작업 앞에 출력하는 DEBUG_JSON 한 줄만 파싱
         analysis = {}
         for line in output_lines:
-            if "Expected Node:" in line:
-                analysis['expected'] = line.split(":")[1].strip()
-            elif "Actual Hostname:" in line:
-                analysis['hostname'] = line.split(":")[1].strip()
-            elif "Actual IP:" in line:
-                analysis['ip'] = line.split(":")[1].strip()
-        
-        print(f"Expected Node: {analysis.get('expected', 'Unknown')}")
+            if line.startswith('DEBUG_JSON:'):
+                analysis = decode_json(line[len('DEBUG_JSON:'):])
+                break
+        
+        print(f"Expected Node: {analysis.get('node', 'Unknown')}")
         print(f"Actual Hostname: {analysis.get('hostname', 'Unknown')}")
         print(f"Actual IP: {analysis.get('ip', 'Unknown')}")
         
         # 일치성 판단
-        if analysis.get('expected') == analysis.get('hostname'):
+        if analysis.get('node') == analysis.get('hostname'):
             print("✅ MATCH: Job executed on expected node")
         else:
             print("❌ MISMATCH: Job executed on different node!")
@@ -155,8 +183,10 @@ sleep 2
                 
                 for node_id, info in nodes.items():
                     available_gpus = info.get('available_gpus', [])
-                    last_heartbeat = info.get('last_heartbeat', 0)
-                    time_since = time.time() - last_heartbeat
+                    if 'last_heartbeat_age' in info:
+                        time_since = info['last_heartbeat_age']
+                    else:
+                        time_since = time.time() - info.get('last_heartbeat', 0)
                     
                     status = "🟢 Healthy" if time_since < 60 else "🔴 Stale"
                     print(f"  {node_id}: {status}")
@@ -186,13 +216,16 @@ def main():
     
     client = DiagnosticClient(args.host, args.port)
     
-    if args.command == 'test-node':
-        client.test_node_assignment(args.node_id, args.gpu)
-    elif args.command == 'health':
-        client.cluster_health_check()
-    else:
-        print("Use 'test-node' or 'health' command")
-        parser.print_help()
+    try:
+        if args.command == 'test-node':
+            client.test_node_assignment(args.node_id, args.gpu)
+        elif args.command == 'health':
+            client.cluster_health_check()
+        else:
+            print("Use 'test-node' or 'health' command")
+            parser.print_help()
+    finally:
+        client.close()
 
 if __name__ == "__main__":
     main()
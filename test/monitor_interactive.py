@@ -2,45 +2,82 @@
 """
 Interactive job monitoring tool
 """
+import os
+import sys
 import socket
 import json
 import time
 import threading
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from mgpu_core.network.framing import send_frame, recv_frame, FrameStream, encode_json, decode_json
+
+def print_queue_status(data):
+    """Print one queue status snapshot"""
+    print(f"\n=== Queue Status ({time.strftime('%H:%M:%S')}) ===")
+    if data.get('status') == 'ok':
+        print(f"Queued jobs: {len(data.get('queue', []))}")
+        print(f"Running jobs: {len(data.get('running', []))}")
+        
+        for job in data.get('running', []):
+            print(f"  Running: {job.get('id')} - {job.get('cmd')[:50]}...")
+            print(f"    Status: {job.get('status')}, Interactive: {job.get('interactive')}")
+            
+        for job in data.get('queue', []):
+            print(f"  Queued: {job.get('id')} - {job.get('cmd')[:50]}...")
+    else:
+        print(f"Error: {data.get('message')}")
+
 def monitor_queue():
-    """Monitor queue status continuously"""
+    """Monitor queue status continuously
+    
+    Subscribes once; the master pushes a new snapshot whenever a job is submitted,
+    started, finished or cancelled, so nothing is polled.
+    """
     while True:
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5.0)
-            sock.connect(('localhost', 8080))
-            
-            request = {'cmd': 'queue'}
-            sock.send(json.dumps(request).encode())
-            
-            response = sock.recv(8192).decode()
-            data = json.loads(response)
+            sock = socket.create_connection(('localhost', 8080), timeout=5.0)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            send_frame(sock, {'cmd': 'subscribe_queue'})
+            ack = recv_frame(sock)
+            if not ack or ack.get('status') != 'ok':
+                print(f"Subscribe failed: {ack}")
+                sock.close()
+                break
             
-            print(f"\n=== Queue Status ({time.strftime('%H:%M:%S')}) ===")
-            if data.get('status') == 'ok':
-                print(f"Queued jobs: {len(data.get('queue', []))}")
-                print(f"Running jobs: {len(data.get('running', []))}")
-                
-                for job in data.get('running', []):
-                    print(f"  Running: {job.get('id')} - {job.get('cmd')[:50]}...")
-                    print(f"    Status: {job.get('status')}, Interactive: {job.get('interactive')}")
-                    
-                for job in data.get('queue', []):
-                    print(f"  Queued: {job.get('id')} - {job.get('cmd')[:50]}...")
-            else:
-                print(f"Error: {data.get('message')}")
+            # Block until the next update arrives
+            sock.settimeout(None)
+            stream = FrameStream(sock)
+            while True:
+                data = stream.recv()
+                if data is None:
+                    print("Connection closed by server")
+                    break
+                print_queue_status(data)
             
             sock.close()
             
         except Exception as e:
             print(f"Monitor error: {e}")
             
-        time.sleep(3)
+        time.sleep(3)  # Reconnect delay
+
+_decoder = json.JSONDecoder()
+
+def json_messages(line):
+    """JSON objects on one stream line
+    
+    The master's bare-JSON submit reply has no trailing newline, so it arrives on the
+    same line as the first streamed message.
+    """
+    try:
+        return [decode_json(line)]
+    except json.JSONDecodeError:
+        text, pos, messages = line.decode(), 0, []
+        while pos < len(text):
+            msg, pos = _decoder.raw_decode(text, pos)
+            messages.append(msg)
+        return messages
 
 def test_simple_interactive():
     """Test simple interactive job"""
@@ -60,23 +97,34 @@ def test_simple_interactive():
             'interactive': True
         }
         
-        sock.send(json.dumps(request).encode())
+        # Bare JSON on purpose: the master answers in the legacy newline-delimited stream
+        sock.sendall(encode_json(request))
         
         print("Waiting for interactive output...")
         
-        buffer = b''
+        # One growing buffer: complete lines are parsed in place and dropped in a single
+        # del per recv, and only newly received bytes are scanned for '\n'
+        buffer = bytearray()
+        chunk = memoryview(bytearray(65536))
         while True:
-            chunk = sock.recv(4096)
-            if not chunk:
+            n = sock.recv_into(chunk)
+            if not n:
                 break
-            buffer += chunk
+            scan = len(buffer)
+            buffer += chunk[:n]
             
             # Parse JSON messages
-            while b'\n' in buffer:
-                line, buffer = buffer.split(b'\n', 1)
-                if line.strip():
-                    try:
-                        msg = json.loads(line.decode())
+            start = 0
+            while True:
+                end = buffer.find(b'\n', scan)
+                if end < 0:
+                    break
+                line = buffer[start:end].strip()
+                start = scan = end + 1
+                if not line:
+                    continue
+                try:
+                    for msg in json_messages(line):
                         if msg.get('type') == 'output':
                             print(f"OUTPUT: {msg.get('data', '').strip()}")
                         elif msg.get('type') == 'completion':
@@ -84,8 +132,9 @@ def test_simple_interactive():
                             return
                         else:
                             print(f"MSG: {msg}")
-                    except json.JSONDecodeError as e:
-                        print(f"JSON Error: {e}, data: {line}")
+                except json.JSONDecodeError as e:
+                    print(f"JSON Error: {e}, data: {bytes(line)}")
+            del buffer[:start]
         
         sock.close()
         
@@ -12,6 +12,21 @@ from pathlib import Path
 
 # 테스트 스크립트들
 TEST_SCRIPTS = {
+    'framing': {
+        'script': 'test_framing.py',
+        'description': 'Wire framing and partial-read parsing tests',
+        'requirements': ['src/mgpu_core importable']
+    },
+    'scheduler_start': {
+        'script': 'test_scheduler_start.py',
+        'description': 'Single-node job start, spawn failure and cancel-during-start tests',
+        'requirements': ['psutil']
+    },
+    'master_interactive': {
+        'script': 'test_master_interactive.py',
+        'description': 'Modular master interactive output in the client\'s codec',
+        'requirements': ['src/mgpu_core importable']
+    },
     'streaming': {
         'script': 'test_streaming.py',
         'description': 'Output streaming and job cancellation tests',
@@ -143,10 +158,10 @@ def run_all_tests(verbose=False, quick=False):
         return False
     # 퀵 모드에서는 일부 테스트만 실행
     if quick:
-        test_order = ['streaming', 'cancellation', 'integration', 'gpu']
+        test_order = ['framing', 'scheduler_start', 'master_interactive', 'streaming', 'cancellation', 'integration', 'gpu']
         print(f"\n🚀 Quick mode: Running {len(test_order)} essential tests")
     else:
-        test_order = ['streaming', 'cancellation', 'output', 'integration', 'gpu', 'distributed', 'performance', 'error_handling', 'mpi', 'cluster', 'single_node_multinode', 'torch_load']
+        test_order = ['framing', 'scheduler_start', 'master_interactive', 'streaming', 'cancellation', 'output', 'integration', 'gpu', 'distributed', 'performance', 'error_handling', 'mpi', 'cluster', 'single_node_multinode', 'torch_load']
         print(f"\n🔬 Full mode: Running all {len(test_order)} test suites")
     
     results = {}
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Wire framing tests for the Multi-GPU Scheduler.
+Feeds requests to the framing helpers a byte at a time, the worst case a TCP
+read can produce, under orjson and under the standard-library fallback.
+"""
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from mgpu_core.network import framing
+
+# Cuts inside literals, numbers, escapes and strings all land somewhere in here
+REQUEST = {
+    'cmd': 'submit', 'user': 'tester', 'interactive': True, 'keep': False, 'note': None,
+    'gpus': 2, 'priority': -17, 'mem': 12.5e3, 'cmdline': 'echo "café ✓" \\ tab\there',
+    'node_gpu_ids': {'node001': [0, 1]},
+}
+
+
+class TrickleSocket:
+    """Socket stand-in whose every recv returns at most one byte"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def recv(self, size, flags=0):
+        return self.data[self.pos:self.pos + 1]  # Only peeks are used
+
+    def recv_into(self, view, size=0):
+        if self.pos >= len(self.data):
+            return 0
+        view[0] = self.data[self.pos]
+        self.pos += 1
+        return 1
+
+
+@contextmanager
+def json_codec(use_orjson: bool):
+    """Run the block with orjson, or with the standard-library json fallback"""
+    saved = framing.orjson
+    if use_orjson and saved is None:
+        raise RuntimeError("orjson is not installed")
+    framing.orjson = saved if use_orjson else None
+    try:
+        yield
+    finally:
+        framing.orjson = saved
+
+
+def codecs():
+    return [True, False] if framing.orjson is not None else [False]
+
+
+def legacy_bytes() -> bytes:
+    # The stdlib encoder keeps \\u escapes, so both decoders see escapes split mid-way
+    import json
+    return json.dumps(REQUEST).encode()
+
+
+def test_recv_legacy_byte_at_a_time():
+    """A bare JSON request split into one-byte reads still parses"""
+    for use_orjson in codecs():
+        with json_codec(use_orjson):
+            assert framing.recv_legacy(TrickleSocket(legacy_bytes())) == REQUEST
+            message, framed, binary = framing.recv_message(TrickleSocket(legacy_bytes()))
+            assert (message, framed, binary) == (REQUEST, False, False)
+
+
+def test_recv_legacy_rejects_bad_json_at_eof():
+    """Input that never parses is reported once the peer closes"""
+    for use_orjson in codecs():
+        with json_codec(use_orjson):
+            try:
+                framing.recv_legacy(TrickleSocket(b'{"cmd": tru}'))
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("bad JSON was accepted")
+
+
+def test_split_message_byte_at_a_time():
+    """The reactors' non-blocking parser waits out a bare JSON request split into one-byte reads"""
+    for use_orjson in codecs():
+        with json_codec(use_orjson):
+            buf = bytearray()
+            data = legacy_bytes()
+            for i in range(len(data)):
+                buf += data[i:i + 1]
+                parsed = framing.split_message(buf)
+                if i < len(data) - 1:
+                    assert parsed is None, f"parsed early at byte {i}"
+            assert parsed == (REQUEST, False, False) and not buf
+
+
+def test_split_message_frames_byte_at_a_time():
+    """Pipelined frames come out one at a time, each only once complete"""
+    data = framing.pack_frame(REQUEST, False) + framing.pack_frame({'cmd': 'queue'}, False)
+    buf = bytearray()
+    messages = []
+    for i in range(len(data)):
+        buf += data[i:i + 1]
+        parsed = framing.split_message(buf)
+        if parsed is not None:
+            messages.append(parsed)
+    assert messages == [(REQUEST, True, False), ({'cmd': 'queue'}, True, False)] and not buf
+
+
+def test_split_message_raises_at_eof():
+    """Bad bare JSON waits for more bytes, then raises once the caller reports EOF"""
+    for use_orjson in codecs():
+        with json_codec(use_orjson):
+            buf = bytearray(b'{"cmd": tru}')
+            assert framing.split_message(buf) is None
+            try:
+                framing.split_message(buf, eof=True)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("bad JSON was accepted")
+
+
+def test_json_fallback_matches_orjson():
+    """The stdlib path encodes and decodes to the same messages as orjson, dataclasses included"""
+    from mgpu_core.models.job_models import SimpleJob
+    job = SimpleJob('J1', 'tester', 'echo hi', 1, node_gpu_ids={'node001': [0]})
+    message = {'status': 'ok', 'queue': [job], 'running': [], 'gpus': {0: 'free'}}
+    expected = {'status': 'ok', 'queue': [job.to_dict()], 'running': [], 'gpus': {'0': 'free'}}
+    for use_orjson in codecs():
+        with json_codec(use_orjson):
+            frame = framing.pack_frame(message, False)
+            assert framing.split_frame(bytearray(frame)) == (expected, False)
+            assert framing.decode_json(framing.encode_json(REQUEST)) == REQUEST
+
+
+def main():
+    tests = {name: func for name, func in globals().items() if name.startswith('test_') and callable(func)}
+    failed = 0
+    for name, func in tests.items():
+        try:
+            func()
+            print(f"✓ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {name}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
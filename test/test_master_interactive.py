@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Interactive session tests for the modular master server.
+Runs MasterServer.handle_client over a socket pair (no nodes, no GPUs) and checks
+that an interactive client is answered in the codec it submitted with, whatever
+the server's configured default.
+"""
+import sys
+import socket
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from mgpu_core.network import framing
+from mgpu_server.master_server import MasterServer
+
+
+def recv_payload(sock) -> bytes:
+    """One raw frame payload, so the test can see which codec it went out in"""
+    size, = framing.HEADER.unpack(framing.recv_exact(sock, framing.HEADER.size))
+    return bytes(framing.recv_exact(sock, size))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out waiting for the master")
+        time.sleep(0.01)
+
+
+def run_session(binary: bool):
+    """Submit an interactive job in one codec with msgpack as the server default; return the payloads sent back"""
+    master = MasterServer()
+    scheduler = master.job_scheduler
+    client, server_end = socket.socketpair()
+    client.settimeout(10)
+    handler = threading.Thread(target=master.handle_client, args=(server_end, None), daemon=True)
+
+    saved = framing.USE_MSGPACK
+    framing.USE_MSGPACK = not binary
+    try:
+        handler.start()
+        client.sendall(framing.pack_frame({'cmd': 'submit', 'command': 'echo hi', 'interactive': True}, binary))
+        reply = recv_payload(client)
+        job_id = framing.decode(reply)['job_id']
+
+        # Stand in for the dispatcher and the node: start the job, stream a line, finish it
+        wait_for(lambda: scheduler.interactive_clients.get(job_id))
+        with scheduler.lock:
+            scheduler.running_jobs[job_id] = scheduler.pending_jobs.pop(job_id)
+        scheduler.handle_job_output({'job_id': job_id, 'data': 'hi\n', 'interactive': True})
+        master.handle_interactive_completion({'job_id': job_id, 'exit_code': 0})
+
+        payloads = [reply, recv_payload(client), recv_payload(client)]
+        handler.join(5)
+        assert client.recv(1) == b'', "client socket left open"
+        return job_id, payloads
+    finally:
+        framing.USE_MSGPACK = saved
+        client.close()
+
+
+def check_session(binary: bool):
+    job_id, payloads = run_session(binary)
+    assert [framing.is_msgpack(p) for p in payloads] == [binary] * 3, payloads
+    messages = [framing.decode(p) for p in payloads]
+    assert messages[1] == {'type': 'output', 'data': 'hi\n'}, messages
+    assert messages[2] == {'type': 'completion', 'job_id': job_id, 'exit_code': 0}, messages
+
+
+def test_json_client_gets_json():
+    """A JSON client's output and completion frames stay JSON when the master defaults to msgpack"""
+    if not framing.HAVE_MSGPACK:
+        return  # Without a msgpack package the server cannot default to it
+    check_session(False)
+
+
+def test_msgpack_client_gets_msgpack():
+    """A msgpack client's output and completion frames stay msgpack when the master defaults to JSON"""
+    if not framing.HAVE_MSGPACK:
+        return
+    check_session(True)
+
+
+def main():
+    tests = {name: func for name, func in globals().items() if name.startswith('test_') and callable(func)}
+    failed = 0
+    for name, func in tests.items():
+        try:
+            func()
+            print(f"✓ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {name}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Job start tests for the single-node scheduler.
+Drives Scheduler.try_run_jobs in-process (no server, no GPUs) and checks what an
+interactive client is told when its job is cancelled or fails while starting.
+"""
+import os
+import pwd
+import sys
+import socket
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import mgpu_scheduler_server as server
+from mgpu_core.network.framing import FrameStream
+
+CURRENT_USER = pwd.getpwuid(os.geteuid()).pw_name
+
+
+def run_pass(scheduler, spawn):
+    """One scheduling pass on a fake 20 GB GPU, with spawn_job replaced by spawn"""
+    saved = server.get_available_gpus, server.spawn_job
+    server.get_available_gpus = lambda: [20000]
+    server.spawn_job = spawn
+    try:
+        scheduler.try_run_jobs()
+    finally:
+        server.get_available_gpus, server.spawn_job = saved
+
+
+def client_messages(sock):
+    """Every message the scheduler sends the client, up to the close"""
+    sock.settimeout(10)
+    stream = FrameStream(sock)
+    messages = []
+    while True:
+        message = stream.recv()
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+def interactive_job(scheduler, cmd):
+    client, server_end = socket.socketpair()
+    job = server.Job(CURRENT_USER, 1, 100, cmd, client_socket=server_end, client_framed=True)
+    scheduler.submit_job(job)
+    return job, client
+
+
+def test_cancel_while_starting():
+    """A cancel that lands during spawn still ends the client's session"""
+    scheduler = server.Scheduler()
+    job, client = interactive_job(scheduler, 'sleep 30')
+    spawn_job = server.spawn_job
+
+    def spawn_then_cancel(job, gpu_idxs, **popen_kwargs):
+        proc = spawn_job(job, gpu_idxs, **popen_kwargs)
+        assert scheduler.cancel_job(job.id)
+        return proc
+
+    run_pass(scheduler, spawn_then_cancel)
+    messages = client_messages(client)
+    assert [m['type'] for m in messages] == ['completion'] and messages[0]['job_id'] == job.id, messages
+    assert messages[0]['exit_code'] != 0
+    assert job.id not in scheduler.running_jobs and job.id not in scheduler.jobs_by_id
+
+
+def test_spawn_failure():
+    """A command that can't be executed is reported with exit code 127"""
+    scheduler = server.Scheduler()
+    job, client = interactive_job(scheduler, ['/nonexistent/mgpu-test-binary', '--flag'])
+    run_pass(scheduler, server.spawn_job)
+    messages = client_messages(client)
+    assert [m['type'] for m in messages] == ['output', 'completion'], messages
+    assert messages[-1]['exit_code'] == 127
+    assert job.status == 'error'
+
+
+def main():
+    tests = {name: func for name, func in globals().items() if name.startswith('test_') and callable(func)}
+    failed = 0
+    for name, func in tests.items():
+        try:
+            func()
+            print(f"✓ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {name}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)